@@ -3,23 +3,36 @@ Mobile Shop Invoice Generator
 A Streamlit application for generating GST/CGST compliant invoices for mobile phone sales.
 """
 import streamlit as st
-import pandas as pd
 import datetime
 import os
 import base64
+import io
+import uuid
 from mobile_data import (
     get_all_brands, get_models_by_brand, 
-    search_phones, get_phone_details, 
-    update_stock
+    search_phones, get_stock, find_in_branches,
+    sell_stock, confirm_sale, cancel_sale, phone_sku, BRANCHES, DEFAULT_BRANCH
 )
-from invoice_generator import Invoice, InvoiceItem
-from pdf_generator import create_invoice_pdf, get_pdf_download_link
+from invoice_generator import Invoice, InvoiceItem, SELLER_STATE
+from validation import check_phone, check_gstin, check_imei, normalize_imei, parse_imeis
+from sales_rollups import get_sales_rollups
+from cart import Cart
+from stock_holds import get_stock_holds
+from artifact_store import get_artifact_store
+from product_cards import product_card_html, get_brand_logo_html
+from invoice_view import build_invoice_view, download_link_html
+from customer_directory import get_customer_directory
+from imei_registry import get_imei_registry
+from job_queue import get_job_queue, get_job_workers, invoice_jobs, render_key
 from utils import (
-    validate_phone_number, validate_gstin, 
+    validate_gstin, 
     validate_email, format_currency,
     state_code_from_gstin, get_state_name
 )
 
+# How often the invoice page checks whether the job workers have rendered its PDF
+PDF_POLL_SECONDS = 1
+
 # Set page configuration
 st.set_page_config(
     page_title="Mobile Shop Invoice Generator",
@@ -36,23 +49,6 @@ def load_css(css_file):
 
 load_css('' 'style.css')
 
-# Helper function for showing brand logos as colored badge
-def get_brand_logo_html(brand, width=120):
-    brand_colors = {
-        'samsung': '#1428a0',
-        'apple': '#000000',
-        'oppo': '#025e3b',
-        'vivo': '#415fff',
-        'redmi': '#ff6700',
-        'realme': '#ffc803'
-    }
-    
-    brand_lower = brand.lower()
-    color = brand_colors.get(brand_lower, '#0066ff')
-    text_color = '#ffffff' if brand_lower != 'realme' else '#000000'
-    
-    return f'<div style="background-color: {color}; color: {text_color}; width: {width}px; height: 40px; border-radius: 5px; display: flex; align-items: center; justify-content: center; font-weight: bold;">{brand.upper()}</div>'
-
 # Custom function for buttons with specific styling
 def styled_button(label, key, button_type="primary", on_click=None):
     col = st.container()
@@ -62,15 +58,198 @@ def styled_button(label, key, button_type="primary", on_click=None):
         st.markdown('</div>', unsafe_allow_html=True)
     return clicked
 
+# Stock is held per (branch, SKU), since each branch sells from its own stock
+def hold_key(sku):
+    return (st.session_state.branch, sku)
+
+def branch_stock(item):
+    return get_stock(item['brand'], item['model'], item['storage'], item['color'], st.session_state.branch)
+
+def available_to_sell(row):
+    """Units of a catalog row in stock at this branch and not held by any cart."""
+    sku = phone_sku(row['brand'], row['model'], row['storage'], row['color'])
+    return get_stock_holds().available(hold_key(sku), branch_stock(row))
+
+# Adding to the cart holds the units until checkout, removal or expiry.
+# Runs as a button callback, so the cards already show the new availability.
+def add_to_cart(row, quantity_key, notice_key):
+    cart = st.session_state.cart
+    quantity = st.session_state[quantity_key]
+    sku = phone_sku(row['brand'], row['model'], row['storage'], row['color'])
+    if get_stock_holds().hold(cart.cart_id, hold_key(sku), quantity, branch_stock(row)):
+        cart.add(row, quantity)
+        st.session_state[notice_key] = ("success", f"Added {quantity} {row['brand']} {row['model']} to cart!")
+    else:
+        st.session_state[notice_key] = ("error", f"Only {available_to_sell(row)} units of {row['brand']} {row['model']} are available")
+
+def remove_from_cart(sku):
+    cart = st.session_state.cart
+    get_stock_holds().release(cart.cart_id, hold_key(sku))
+    cart.remove(sku)
+    st.session_state.pop(imei_key(sku), None)
+
+def clear_cart():
+    get_stock_holds().release(st.session_state.cart.cart_id)
+    for item in st.session_state.cart:
+        st.session_state.pop(imei_key(item['sku']), None)
+    st.session_state.cart.clear()
+
+# IMEIs are captured per cart line at checkout, one per unit
+def imei_key(sku):
+    return f"imeis_{sku}"
+
+def cart_imeis(cart):
+    """Check the IMEIs entered for every cart line; returns ({sku: IMEIs}, error messages)."""
+    imeis_by_sku = {}
+    errors = []
+    seen = set()
+    registry = get_imei_registry()
+    for item in cart:
+        entries = parse_imeis(st.session_state.get(imei_key(item['sku'])))
+        name = f"{item['brand']} {item['model']} ({item['storage']}, {item['color']})"
+        if len(entries) != item['quantity']:
+            errors.append(f"Enter {item['quantity']} IMEI(s) for {name}; {len(entries)} entered")
+        imeis = []
+        for entry in entries:
+            imei_error = check_imei(entry)
+            if imei_error:
+                errors.append(imei_error)
+                continue
+            imei = normalize_imei(entry)
+            if imei in seen:
+                errors.append(f"IMEI {imei} is entered more than once")
+            seen.add(imei)
+            sale = registry.lookup(imei)
+            if sale:
+                errors.append(f"IMEI {imei} was already sold on invoice {sale['invoice_number']}")
+            imeis.append(imei)
+        imeis_by_sku[item['sku']] = imeis
+    return imeis_by_sku, errors
+
+def hold_cart_stock(cart):
+    """Make sure every cart line is still held, re-holding lines whose hold expired; returns error messages."""
+    holds = get_stock_holds()
+    errors = []
+    for item in cart:
+        key = hold_key(item['sku'])
+        missing = item['quantity'] - holds.held_for(cart.cart_id, key)
+        if missing > 0:
+            stock = branch_stock(item)
+            if not holds.hold(cart.cart_id, key, missing, stock):
+                errors.append(
+                    f"Only {holds.available(key, stock, cart.cart_id)} units of "
+                    f"{item['brand']} {item['model']} ({item['storage']}, {item['color']}) are available"
+                )
+    return errors
+
+# Fill the checkout form from the customer picked in the returning-customer lookup.
+# Runs as a widget callback, before the form widgets are created on the next rerun.
+def fill_customer():
+    customer = get_customer_directory().get(st.session_state.customer_match)
+    if customer:
+        for field in ("name", "phone", "address", "email", "gstin"):
+            st.session_state[field] = customer[field]
+
+# The invoice PDF lives in the shared artifact store; the session keeps its handle
+def store_invoice_pdf(pdf_buffer):
+    store = get_artifact_store()
+    store.release(st.session_state.invoice_pdf)
+    store.release(st.session_state.invoice_pdf_link)
+    st.session_state.invoice_pdf = store.put(st.session_state.session_id, pdf_buffer.getvalue())
+    st.session_state.invoice_pdf_link = None
+
+def rendered_invoice_pdf():
+    """
+    Return the current invoice's PDF from its render job.
+
+    Returns:
+    - PDF bytes, or None while the job workers have not rendered it yet.
+      If the job failed or is gone, the PDF is rendered here instead.
+    """
+    job = get_job_queue().get(render_key(st.session_state.invoice["invoice_number"]))
+    if job is not None and job["status"] == "done":
+        return job["result"]
+    if job is None or job["status"] == "failed":
+        from pdf_generator import create_invoice_pdf
+        return create_invoice_pdf(st.session_state.invoice).getvalue()
+    return None
+
+def invoice_pdf_bytes():
+    """Return the current invoice's PDF, fetching it again if the store evicted it."""
+    pdf_data = get_artifact_store().get(st.session_state.invoice_pdf)
+    if pdf_data is None:
+        pdf_data = rendered_invoice_pdf()
+        store_invoice_pdf(io.BytesIO(pdf_data))
+    return pdf_data
+
+def invoice_view():
+    """Return the invoice page's markup, built once per invoice number."""
+    view = st.session_state.invoice_view
+    if view is None or view["invoice_number"] != st.session_state.invoice["invoice_number"]:
+        view = st.session_state.invoice_view = build_invoice_view(st.session_state.invoice)
+    return view
+
+def invoice_receipt_pdf():
+    """Return the current invoice's 80mm counter receipt, rendered once per invoice number."""
+    receipt = st.session_state.invoice_receipt
+    number = st.session_state.invoice["invoice_number"]
+    if receipt is None or receipt[0] != number:
+        from receipt_generator import create_receipt_pdf
+        receipt = st.session_state.invoice_receipt = (number, create_receipt_pdf(st.session_state.invoice).getvalue())
+    return receipt[1]
+
+def invoice_download_html():
+    """Return the PDF download button; the PDF is base64-encoded once, not on every rerun."""
+    store = get_artifact_store()
+    link = store.get(st.session_state.invoice_pdf_link)
+    if link is None:
+        from pdf_generator import get_pdf_download_link
+        file_name = invoice_view()["file_name"]
+        link = download_link_html(get_pdf_download_link(io.BytesIO(invoice_pdf_bytes()), file_name), file_name).encode()
+        st.session_state.invoice_pdf_link = store.put(st.session_state.session_id, link)
+    return link.decode()
+
+def invoice_download():
+    """Show the PDF download button, or a notice while the job workers render the PDF."""
+    if st.session_state.invoice_pdf is None:
+        pdf_data = rendered_invoice_pdf()
+        if pdf_data is None:
+            st.markdown('<div style="text-align: center; color: #666;">Preparing the PDF...</div>', unsafe_allow_html=True)
+            return
+        store_invoice_pdf(io.BytesIO(pdf_data))
+        if st.session_state.invoice_pdf_polling:
+            # Rerun the whole page once so the fragment stops polling
+            st.session_state.invoice_pdf_polling = False
+            st.rerun()
+    st.markdown(invoice_download_html(), unsafe_allow_html=True)
+
 # Initialize session state
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+# The cart keeps its item count and totals up to date as lines change
 if 'cart' not in st.session_state:
-    st.session_state.cart = []
+    st.session_state.cart = Cart()
 if 'invoice' not in st.session_state:
     st.session_state.invoice = None
 if 'invoice_pdf' not in st.session_state:
     st.session_state.invoice_pdf = None
+# Download button markup, kept in the artifact store next to the PDF
+if 'invoice_pdf_link' not in st.session_state:
+    st.session_state.invoice_pdf_link = None
+if 'invoice_view' not in st.session_state:
+    st.session_state.invoice_view = None
+if 'invoice_pdf_polling' not in st.session_state:
+    st.session_state.invoice_pdf_polling = False
+# (invoice number, PDF bytes) of the 80mm counter receipt
+if 'invoice_receipt' not in st.session_state:
+    st.session_state.invoice_receipt = None
+
+# Background workers that render (and deliver) invoice PDFs, started once per process
+get_job_workers()
 if 'search_results' not in st.session_state:
     st.session_state.search_results = []
+if 'branch' not in st.session_state:
+    st.session_state.branch = DEFAULT_BRANCH
 
 # Logo and title
 st.markdown('<div style="background-color: #f8f9fa; padding: 20px; border-radius: 10px; margin-bottom: 20px;">', unsafe_allow_html=True)
@@ -84,6 +263,15 @@ st.markdown('</div>', unsafe_allow_html=True)
 
 # Sidebar for search and navigation
 with st.sidebar:
+    # The cart's holds belong to one branch, so the branch is fixed while the cart has items
+    st.selectbox(
+        "🏬 Store",
+        options=list(BRANCHES),
+        format_func=lambda branch: BRANCHES[branch],
+        key="branch",
+        disabled=bool(st.session_state.cart)
+    )
+    
     st.markdown('<div style="background-color: #f0f2f6; padding: 10px; border-radius: 10px; margin-bottom: 15px;">', unsafe_allow_html=True)
     st.markdown('<h3 style="color: #0066ff; margin-bottom: 10px;">📱 Product Search</h3>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
@@ -96,7 +284,7 @@ with st.sidebar:
         st.markdown('</div>', unsafe_allow_html=True)
         
         if search_query:
-            st.session_state.search_results = search_phones(search_query)
+            st.session_state.search_results = search_phones(search_query, st.session_state.branch)
             
             if st.session_state.search_results:
                 st.markdown(f'<div class="badge badge-success">Found {len(st.session_state.search_results)} results</div>', unsafe_allow_html=True)
@@ -122,11 +310,10 @@ with st.sidebar:
         selected_brand = st.selectbox("Select Brand:", all_brands, label_visibility="collapsed")
         st.markdown('</div>', unsafe_allow_html=True)
         
-        if selected_brand:
-            models = get_models_by_brand(selected_brand)
-            st.session_state.search_results = [
-                {**model, "brand": selected_brand} for model in models
-            ]
+        # A search query takes precedence over the brand list
+        if selected_brand and not search_query:
+            models = get_models_by_brand(selected_brand, st.session_state.branch)
+            st.session_state.search_results = models
             st.markdown(f'<div class="badge badge-primary">{len(models)} {selected_brand} models available</div>', unsafe_allow_html=True)
     
     # Cart summary in sidebar
@@ -135,21 +322,21 @@ with st.sidebar:
     st.markdown('</div>', unsafe_allow_html=True)
     
     if st.session_state.cart:
-        total_amount = sum(item['quantity'] * item['price'] for item in st.session_state.cart)
+        cart = st.session_state.cart
         
         st.markdown('<div class="metric-container">', unsafe_allow_html=True)
         col1, col2 = st.columns(2)
         with col1:
             st.markdown('<div class="metric-label">Items</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-value">{len(st.session_state.cart)}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="metric-value">{cart.item_count}</div>', unsafe_allow_html=True)
         with col2:
             st.markdown('<div class="metric-label">Total</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-value">{format_currency(total_amount)}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="metric-value">{format_currency(cart.grand_total)}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown('<div class="danger-button" style="margin-top: 10px;">', unsafe_allow_html=True)
         if st.button("Clear Cart 🗑️"):
-            st.session_state.cart = []
+            clear_cart()
             st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
     else:
@@ -179,6 +366,12 @@ with st.sidebar:
             else:
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
+    
+    st.markdown('<div class="light-button">', unsafe_allow_html=True)
+    if st.button("📊 Sales Dashboard"):
+        st.session_state.page = "dashboard"
+        st.rerun()
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # Main content
 if 'page' not in st.session_state:
@@ -189,23 +382,26 @@ if st.session_state.page == "products":
     
     # Display search results or browse results
     if st.session_state.search_results:
-        # Convert to DataFrame for better display
-        df = pd.DataFrame(st.session_state.search_results)
-        
         # Display sorting options
         st.markdown('<div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px; margin-bottom: 20px;">', unsafe_allow_html=True)
         sort_col1, sort_col2 = st.columns([3, 1])
         with sort_col1:
             st.markdown('<span style="color: #666; font-size: 0.9rem;">Sort products by:</span>', unsafe_allow_html=True)
         with sort_col2:
+            # Search results arrive best match first, so keep that order unless asked otherwise
+            sort_options = ["Price: Low to High", "Price: High to Low", "Brand", "Model", "Storage"]
+            if search_query:
+                sort_options.insert(0, "Relevance")
             sort_option = st.selectbox(
                 "Sort by", 
-                ["Price: Low to High", "Price: High to Low", "Brand", "Model", "Storage"],
+                sort_options,
                 label_visibility="collapsed"
             )
         
         # Sort the results based on selection
-        if sort_option == "Price: Low to High":
+        if sort_option == "Relevance":
+            pass
+        elif sort_option == "Price: Low to High":
             st.session_state.search_results = sorted(st.session_state.search_results, key=lambda x: x['price'])
         elif sort_option == "Price: High to Low":
             st.session_state.search_results = sorted(st.session_state.search_results, key=lambda x: x['price'], reverse=True)
@@ -228,101 +424,45 @@ if st.session_state.page == "products":
             row_idx = i // cols_per_row
             
             with rows[row_idx][col_idx]:
-                # Card container
-                st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                
-                # Header with brand logo and model
-                st.markdown(
-                    f'<div style="display: flex; align-items: center; margin-bottom: 10px;">'
-                    f'<div style="flex: 0 0 80px; text-align: center;">{get_brand_logo_html(row["brand"], width=60)}</div>'
-                    f'<div style="flex-grow: 1;"><h3 style="margin: 0; color: #333;">{row["model"]}</h3>'
-                    f'<div style="font-size: 0.8rem; color: #666;">HSN: {row["hsn_code"]}</div></div>'
-                    f'</div>', 
-                    unsafe_allow_html=True
-                )
-                
-                # Product details
-                col1, col2 = st.columns([1, 1])
-                
-                with col1:
-                    st.markdown(
-                        f'<div class="badge badge-primary">{row["storage"]}</div> '
-                        f'<div class="badge badge-success">{row["color"]}</div>',
-                        unsafe_allow_html=True
-                    )
-                
-                with col2:
-                    st.markdown(
-                        f'<div style="text-align: right; font-size: 1.2rem; font-weight: bold; color: #0066ff;">'
-                        f'{format_currency(row["price"])}</div>',
-                        unsafe_allow_html=True
-                    )
-                
-                # Description
-                st.markdown(
-                    f'<div style="margin: 10px 0; font-size: 0.9rem; color: #444;">{row["description"]}</div>',
-                    unsafe_allow_html=True
-                )
-                
-                # Stock information
-                stock_color = "#4CAF50" if row["stock"] > 5 else "#ff9800" if row["stock"] > 0 else "#f44336"
-                st.markdown(
-                    f'<div style="font-size: 0.8rem; margin-bottom: 10px;">'
-                    f'<span style="color: {stock_color}; font-weight: bold;">● </span>'
-                    f'<span style="color: #666;">Stock: {row["stock"]} units</span></div>',
-                    unsafe_allow_html=True
-                )
+                # Card markup in one element; static parts are cached per SKU
+                available = available_to_sell(row)
+                other_stores = []
+                if available < 1:
+                    other_stores = [
+                        (BRANCHES[entry["branch"]], entry["stock"])
+                        for entry in find_in_branches(row['brand'], row['model'], row['storage'], row['color'])
+                        if entry["branch"] != st.session_state.branch
+                    ]
+                st.markdown(product_card_html(row, available, other_stores), unsafe_allow_html=True)
                 
                 # Add to cart section
                 quantity_col, button_col = st.columns([1, 2])
                 
                 with quantity_col:
-                    quantity = st.number_input(
+                    st.number_input(
                         "Qty", 
                         min_value=1, 
-                        max_value=row['stock'], 
+                        max_value=max(available, 1), 
                         value=1,
-                        key=f"qty_{i}"
+                        key=f"qty_{i}",
+                        disabled=available < 1
                     )
                 
                 with button_col:
                     st.markdown('<div class="secondary-button">', unsafe_allow_html=True)
-                    add_button = st.button("Add to Cart 🛒", key=f"add_{i}")
+                    st.button(
+                        "Add to Cart 🛒",
+                        key=f"add_{i}",
+                        disabled=available < 1,
+                        on_click=add_to_cart,
+                        args=(row, f"qty_{i}", f"added_{i}")
+                    )
                     st.markdown('</div>', unsafe_allow_html=True)
                     
-                    if add_button:
-                        # Create a new item for the cart
-                        cart_item = {
-                            'brand': row['brand'],
-                            'model': row['model'],
-                            'storage': row['storage'],
-                            'color': row['color'],
-                            'price': row['price'],
-                            'hsn_code': row['hsn_code'],
-                            'quantity': quantity,
-                            'description': row['description']
-                        }
-                        
-                        # Check if this item is already in cart
-                        existing_item = None
-                        for j, item in enumerate(st.session_state.cart):
-                            if (item['brand'] == cart_item['brand'] and
-                                item['model'] == cart_item['model'] and
-                                item['storage'] == cart_item['storage'] and
-                                item['color'] == cart_item['color']):
-                                existing_item = j
-                                break
-                        
-                        if existing_item is not None:
-                            # Update existing item
-                            st.session_state.cart[existing_item]['quantity'] += quantity
-                        else:
-                            # Add new item
-                            st.session_state.cart.append(cart_item)
-                        
-                        st.success(f"Added {quantity} {row['brand']} {row['model']} to cart!")
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+                    notice = st.session_state.pop(f"added_{i}", None)
+                    if notice:
+                        kind, message = notice
+                        (st.success if kind == "success" else st.error)(message)
     else:
         # Empty state with brand logos
         st.markdown('<div style="text-align: center; padding: 40px; background-color: #f9f9f9; border-radius: 10px;">', unsafe_allow_html=True)
@@ -369,11 +509,9 @@ elif st.session_state.page == "checkout":
         st.markdown('<div class="section-container" style="background-color: white; margin-bottom: 30px;">', unsafe_allow_html=True)
         st.markdown('<h3 style="margin-bottom: 15px;">Items in Your Cart</h3>', unsafe_allow_html=True)
         
-        cart_df = pd.DataFrame(st.session_state.cart)
-        cart_df['Amount'] = cart_df['price'] * cart_df['quantity']
-        
         # Custom cart display with item cards instead of table
-        for i, item in enumerate(st.session_state.cart):
+        cart = st.session_state.cart
+        for i, item in enumerate(cart):
             col1, col2, col3 = st.columns([3, 2, 1])
             
             with col1:
@@ -398,23 +536,26 @@ elif st.session_state.page == "checkout":
                 )
             
             with col3:
-                amount = item["price"] * item["quantity"]
                 st.markdown(
                     f'<div style="text-align: right; font-weight: bold;">'
-                    f'{format_currency(amount)}'
+                    f'{format_currency(item["amount"])}'
                     f'</div>',
                     unsafe_allow_html=True
                 )
+                st.button("Remove", key=f"remove_{item['sku']}", on_click=remove_from_cart, args=(item['sku'],))
+            
+            st.text_area(
+                f"IMEI of each unit ({item['quantity']})",
+                key=imei_key(item['sku']),
+                placeholder="Scan or type one 15-digit IMEI per line"
+            )
             
-            if i < len(st.session_state.cart) - 1:
+            if i < len(cart) - 1:
                 st.markdown('<hr style="margin: 10px 0; border-color: #f0f0f0;">', unsafe_allow_html=True)
         
-        # Total calculation
-        subtotal = cart_df['Amount'].sum()
-        gst_rate = 18
-        sgst_rate = cgst_rate = gst_rate / 2
-        sgst_amount = cgst_amount = (subtotal * sgst_rate) / 100
-        total = subtotal + (sgst_amount + cgst_amount)
+        # Totals at the rates for the place of supply of the GSTIN entered below
+        entered_gstin = st.session_state.get("gstin", "")
+        cart.set_place_of_supply(state_code_from_gstin(entered_gstin) if validate_gstin(entered_gstin) else SELLER_STATE)
         
         st.markdown('<div style="margin-top: 20px; border-top: 1px solid #ddd; padding-top: 15px;">', unsafe_allow_html=True)
         col1, col2 = st.columns([4, 2])
@@ -423,31 +564,24 @@ elif st.session_state.page == "checkout":
             st.markdown(
                 f'<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">'
                 f'<span style="color: #666;">Subtotal:</span>'
-                f'<span>{format_currency(subtotal)}</span>'
+                f'<span>{format_currency(cart.subtotal)}</span>'
                 f'</div>',
                 unsafe_allow_html=True
             )
             
-            st.markdown(
-                f'<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">'
-                f'<span style="color: #666;">SGST ({int(sgst_rate)}%):</span>'
-                f'<span>{format_currency(sgst_amount)}</span>'
-                f'</div>',
-                unsafe_allow_html=True
-            )
-            
-            st.markdown(
-                f'<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">'
-                f'<span style="color: #666;">CGST ({int(cgst_rate)}%):</span>'
-                f'<span>{format_currency(cgst_amount)}</span>'
-                f'</div>',
-                unsafe_allow_html=True
-            )
+            for (label, percent), amount in cart.tax_amounts.items():
+                st.markdown(
+                    f'<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">'
+                    f'<span style="color: #666;">{label} ({percent}%):</span>'
+                    f'<span>{format_currency(amount)}</span>'
+                    f'</div>',
+                    unsafe_allow_html=True
+                )
             
             st.markdown(
                 f'<div style="display: flex; justify-content: space-between; font-weight: bold; font-size: 1.1rem; margin-top: 10px; padding-top: 10px; border-top: 1px dashed #ddd;">'
                 f'<span>Total:</span>'
-                f'<span style="color: #0066ff;">{format_currency(total)}</span>'
+                f'<span style="color: #0066ff;">{format_currency(cart.grand_total)}</span>'
                 f'</div>',
                 unsafe_allow_html=True
             )
@@ -458,6 +592,27 @@ elif st.session_state.page == "checkout":
         st.markdown('<div class="section-container" style="background-color: white;">', unsafe_allow_html=True)
         st.markdown('<h3 style="margin-bottom: 20px;">Customer Information</h3>', unsafe_allow_html=True)
         
+        lookup = st.text_input(
+            "Returning customer",
+            key="customer_lookup",
+            placeholder="Type the first digits of the phone number or the name"
+        )
+        matches = get_customer_directory().search(lookup)
+        if matches:
+            st.selectbox(
+                "Matching customers",
+                options=[customer["phone"] for customer in matches],
+                format_func=lambda phone: next(
+                    f"{customer['name']} · {phone}" for customer in matches if customer["phone"] == phone
+                ),
+                index=None,
+                placeholder="Pick a customer to fill in their details",
+                key="customer_match",
+                on_change=fill_customer
+            )
+        elif lookup:
+            st.caption("No saved customer matches; fill in the details below.")
+        
         col1, col2 = st.columns(2)
         
         with col1:
@@ -490,8 +645,9 @@ elif st.session_state.page == "checkout":
             if not customer_name:
                 errors.append("Customer name is required")
             
-            if not customer_phone or not validate_phone_number(customer_phone):
-                errors.append("Valid phone number is required (10 digits)")
+            phone_error = check_phone(customer_phone)
+            if phone_error:
+                errors.append(phone_error)
             
             if not customer_address:
                 errors.append("Customer address is required")
@@ -499,8 +655,15 @@ elif st.session_state.page == "checkout":
             if customer_email and not validate_email(customer_email):
                 errors.append("Please provide a valid email address")
             
-            if customer_gstin and not validate_gstin(customer_gstin):
-                errors.append("Please provide a valid GSTIN (15 characters)")
+            gstin_error = check_gstin(customer_gstin) if customer_gstin else None
+            if gstin_error:
+                errors.append(gstin_error)
+            
+            imeis_by_sku, imei_errors = cart_imeis(cart)
+            errors.extend(imei_errors)
+            
+            if not errors:
+                errors.extend(hold_cart_stock(cart))
             
             if errors:
                 st.markdown('<div style="background-color: #ffebee; padding: 15px; border-radius: 10px; margin-top: 20px;">', unsafe_allow_html=True)
@@ -525,11 +688,11 @@ elif st.session_state.page == "checkout":
                     customer_address=customer_address,
                     customer_phone=customer_phone,
                     customer_email=customer_email,
-                    customer_gstin=customer_gstin
+                    customer_gstin=customer_gstin.strip().upper()
                 )
                 
                 # Add items to invoice
-                for item in st.session_state.cart:
+                for item in cart:
                     invoice_item = InvoiceItem(
                         brand=item['brand'],
                         model=item['model'],
@@ -537,25 +700,46 @@ elif st.session_state.page == "checkout":
                         color=item['color'],
                         price=item['price'],
                         hsn_code=item['hsn_code'],
-                        quantity=item['quantity']
+                        quantity=item['quantity'],
+                        imeis=imeis_by_sku[item['sku']]
                     )
                     invoice.add_item(invoice_item)
-                    
-                    # Update stock
-                    update_stock(
-                        item['brand'], 
-                        item['model'], 
-                        item['storage'], 
-                        item['color'], 
-                        item['quantity']
+                invoice_data = invoice.to_dict()
+                
+                # The holds keep other sessions of this app off the units, and the stock is
+                # checked again as it is taken: every line or none. Stock and holds are both
+                # per process, so this does not guard against sales made by the HTTP service
+                sale = [(item['brand'], item['model'], item['storage'], item['color'], item['quantity'])
+                        for item in cart]
+                # The sale stays pending until its jobs are queued, so a crash in between
+                # puts the stock back when the journal is next opened
+                short = sell_stock(sale, st.session_state.branch, ref=invoice.invoice_number, pending=True)
+                if short is not None:
+                    progress_placeholder.error(
+                        f"Only {get_stock(*short[:4], st.session_state.branch)} units of "
+                        f"{short[0]} {short[1]} are left in stock; please update the cart"
                     )
+                    st.stop()
                 
-                # Store invoice in session state
-                st.session_state.invoice = invoice.to_dict()
+                # Another counter may have sold one of the units meanwhile. The PDF,
+                # which the job workers render (and deliver), is queued only if the
+                # IMEIs register, and the sale is undone if it cannot be queued
+                try:
+                    with get_job_queue().enqueue_with(invoice_jobs(invoice_data)):
+                        get_imei_registry().register_invoice(invoice_data, st.session_state.branch)
+                except Exception as e:
+                    cancel_sale(sale, st.session_state.branch, ref=invoice.invoice_number)
+                    if not isinstance(e, ValueError):
+                        raise
+                    progress_placeholder.error(str(e))
+                    st.stop()
+                confirm_sale(invoice.invoice_number, st.session_state.branch)
+                get_stock_holds().release(cart.cart_id)
                 
-                # Generate PDF
-                pdf_buffer = create_invoice_pdf(st.session_state.invoice)
-                st.session_state.invoice_pdf = pdf_buffer
+                # Store invoice in session state
+                st.session_state.invoice = invoice_data
+                get_sales_rollups().record_invoice(invoice)
+                get_customer_directory().record_invoice(st.session_state.invoice)
                 
                 # Change page to invoice view
                 st.session_state.page = "invoice"
@@ -580,209 +764,25 @@ elif st.session_state.page == "invoice":
     if st.session_state.invoice:
         st.markdown('<h2 style="color: #0066ff; margin-bottom: 20px;">📄 Invoice Generated</h2>', unsafe_allow_html=True)
         
-        # Step indicator
-        st.markdown(
-            '<div style="display: flex; margin-bottom: 30px; background-color: #f8f9fa; padding: 15px; border-radius: 10px;">'
-            '<div style="flex: 1; text-align: center; position: relative;">'
-            '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">1</div>'
-            '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Cart</div>'
-            '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; right: 0; width: 50%;"></div>'
-            '</div>'
-            '<div style="flex: 1; text-align: center; position: relative;">'
-            '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">2</div>'
-            '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Information</div>'
-            '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; left: 0; width: 50%;"></div>'
-            '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; right: 0; width: 50%;"></div>'
-            '</div>'
-            '<div style="flex: 1; text-align: center; position: relative;">'
-            '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">3</div>'
-            '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Invoice</div>'
-            '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; left: 0; width: 50%;"></div>'
-            '</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        invoice_data = st.session_state.invoice
-        
-        # Success message
-        st.markdown(
-            '<div style="background-color: #e7f6e7; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 20px;">'
-            '<div style="color: #4CAF50; font-size: 24px; margin-bottom: 10px;">✓</div>'
-            '<div style="font-size: 1.2rem; font-weight: bold; color: #4CAF50; margin-bottom: 5px;">Invoice Generated Successfully</div>'
-            f'<div style="font-size: 0.9rem; color: #666;">Invoice #{invoice_data["invoice_number"]}</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Invoice container
-        st.markdown('<div class="section-container" style="background-color: white; padding: 25px; border: 1px solid #ddd;">', unsafe_allow_html=True)
-        
-        # Invoice header
-        st.markdown(
-            '<div style="display: flex; justify-content: space-between; margin-bottom: 20px;">'
-            '<div>'
-            '<h1 style="color: #333; margin: 0; font-size: 24px;">TAX INVOICE</h1>'
-            f'<div style="color: #666; font-size: 0.9rem; margin-top: 5px;">Invoice #{invoice_data["invoice_number"]}</div>'
-            '</div>'
-            '<div style="text-align: right;">'
-            f'<div style="font-size: 0.9rem; color: #666;">Date: {invoice_data["date"]}</div>'
-            f'<div style="font-size: 0.9rem; color: #666;">Time: {invoice_data["time"]}</div>'
-            '</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Seller and customer information
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown(
-                '<div style="background-color: #f9f9f9; padding: 15px; border-radius: 5px; height: 100%;">'
-                '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Seller Information</h3>'
-                f'<div style="font-weight: bold; margin-bottom: 5px;">{invoice_data["seller_name"]}</div>'
-                f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">GSTIN: {invoice_data["seller_gstin"]}</div>'
-                f'<div style="font-size: 0.9rem; white-space: pre-line; color: #666;">{invoice_data["seller_address"]}</div>'
-                '</div>',
-                unsafe_allow_html=True
-            )
-        
-        with col2:
-            st.markdown(
-                '<div style="background-color: #f9f9f9; padding: 15px; border-radius: 5px; height: 100%;">'
-                '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Customer Information</h3>'
-                f'<div style="font-weight: bold; margin-bottom: 5px;">{invoice_data["customer_name"]}</div>'
-                f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">Phone: {invoice_data["customer_phone"]}</div>'
-                + (f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">Email: {invoice_data["customer_email"]}</div>' if invoice_data.get("customer_email") else '') +
-                f'<div style="font-size: 0.9rem; white-space: pre-line; color: #666;">{invoice_data["customer_address"]}</div>'
-                + (f'<div style="font-size: 0.9rem; margin-top: 5px; color: #666;">GSTIN: {invoice_data["customer_gstin"]}</div>' if invoice_data.get("customer_gstin") else '') +
-                '</div>',
-                unsafe_allow_html=True
-            )
-        
-        # Items table
-        st.markdown('<h3 style="font-size: 1.1rem; margin: 20px 0 15px 0; color: #333;">Purchased Items</h3>', unsafe_allow_html=True)
-        
-        # Custom styled table header
-        st.markdown(
-            '<div style="display: flex; background-color: #f3f4f6; padding: 10px; border-top: 1px solid #ddd; border-bottom: 1px solid #ddd; font-weight: bold; font-size: 0.9rem;">'
-            '<div style="flex: 3;">Description</div>'
-            '<div style="flex: 1; text-align: center;">HSN</div>'
-            '<div style="flex: 1; text-align: center;">Qty</div>'
-            '<div style="flex: 1; text-align: right;">Rate</div>'
-            '<div style="flex: 1; text-align: right;">Amount</div>'
-            '<div style="flex: 1; text-align: right;">SGST (9%)</div>'
-            '<div style="flex: 1; text-align: right;">CGST (9%)</div>'
-            '<div style="flex: 1; text-align: right;">Total</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Table rows
-        for i, item in enumerate(invoice_data['items']):
-            bg_color = '#ffffff' if i % 2 == 0 else '#f9f9f9'
-            st.markdown(
-                f'<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem; background-color: {bg_color};">'
-                f'<div style="flex: 3;">{item["description"]}</div>'
-                f'<div style="flex: 1; text-align: center;">{item["hsn_code"]}</div>'
-                f'<div style="flex: 1; text-align: center;">{item["quantity"]}</div>'
-                f'<div style="flex: 1; text-align: right;">{format_currency(item["price"])}</div>'
-                f'<div style="flex: 1; text-align: right;">{format_currency(item["amount"])}</div>'
-                f'<div style="flex: 1; text-align: right;">{format_currency(item["sgst"])}</div>'
-                f'<div style="flex: 1; text-align: right;">{format_currency(item["cgst"])}</div>'
-                f'<div style="flex: 1; text-align: right;">{format_currency(item["total"])}</div>'
-                f'</div>',
-                unsafe_allow_html=True
-            )
-        
-        # Totals section
-        st.markdown(
-            '<div style="display: flex; margin-top: 20px;">'
-            '<div style="flex: 6;"></div>'
-            '<div style="flex: 4;">'
-            '<div style="border: 1px solid #ddd; border-radius: 5px; overflow: hidden;">'
-            
-            '<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem;">'
-            '<div style="flex: 1; color: #666;">Subtotal:</div>'
-            f'<div style="flex: 1; text-align: right;">{invoice_data["sub_total_formatted"]}</div>'
-            '</div>'
-            
-            '<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem;">'
-            '<div style="flex: 1; color: #666;">SGST (9%):</div>'
-            f'<div style="flex: 1; text-align: right;">{invoice_data["total_sgst_formatted"]}</div>'
-            '</div>'
-            
-            '<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem;">'
-            '<div style="flex: 1; color: #666;">CGST (9%):</div>'
-            f'<div style="flex: 1; text-align: right;">{invoice_data["total_cgst_formatted"]}</div>'
-            '</div>'
-            
-            '<div style="display: flex; padding: 12px; background-color: #f9f9f9; font-weight: bold; font-size: 1rem;">'
-            '<div style="flex: 1;">Grand Total:</div>'
-            f'<div style="flex: 1; text-align: right; color: #0066ff;">{invoice_data["grand_total_formatted"]}</div>'
-            '</div>'
-            
-            '</div>'
-            '</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Amount in words
-        st.markdown(
-            '<div style="margin-top: 15px; font-size: 0.9rem; font-style: italic; color: #666;">'
-            f'Amount in Words: {invoice_data["grand_total_words"]}'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Terms and conditions
-        st.markdown(
-            '<div style="margin-top: 30px; padding-top: 15px; border-top: 1px solid #eee;">'
-            '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Terms & Conditions</h3>'
-            '<ul style="font-size: 0.85rem; color: #666; margin: 0; padding-left: 20px;">'
-            '<li>Goods once sold will not be taken back or exchanged.</li>'
-            '<li>All disputes are subject to local jurisdiction only.</li>'
-            '<li>Warranty as per manufacturer\'s terms and conditions only.</li>'
-            '</ul>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        # Invoice footer
-        st.markdown(
-            '<div style="margin-top: 30px; display: flex; justify-content: space-between;">'
-            '<div style="font-size: 0.85rem; color: #666;">'
-            'Thank you for your business!'
-            '</div>'
-            '<div style="font-size: 0.85rem; color: #666; text-align: right;">'
-            f'For {invoice_data["seller_name"]}<br>'
-            '<div style="margin-top: 20px;">Authorized Signatory</div>'
-            '</div>'
-            '</div>',
-            unsafe_allow_html=True
-        )
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+        # The invoice cannot change any more, so its markup is built once and reused on reruns
+        view = invoice_view()
+        st.markdown(view["summary"], unsafe_allow_html=True)
+        st.markdown(view["body"], unsafe_allow_html=True)
         
         # Actions section
         st.markdown('<div style="display: flex; justify-content: center; margin-top: 30px; gap: 20px;">', unsafe_allow_html=True)
         
-        # PDF download
-        if st.session_state.invoice_pdf:
-            pdf_href = get_pdf_download_link(
-                st.session_state.invoice_pdf,
-                f"Invoice_{invoice_data['invoice_number']}.pdf"
-            )
-            
-            st.markdown(
-                f'<a href="{pdf_href}" download="Invoice_{invoice_data["invoice_number"]}.pdf" '
-                f'style="display: inline-flex; align-items: center; padding: 12px 25px; color: white; background-color: #0066ff; '
-                f'text-decoration: none; border-radius: 5px; font-weight: bold; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">'
-                f'<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" style="margin-right: 8px;"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"></path><polyline points="7 10 12 15 17 10"></polyline><line x1="12" y1="15" x2="12" y2="3"></line></svg>'
-                f'Download PDF</a>', 
-                unsafe_allow_html=True
-            )
+        # PDF download; until the PDF is rendered, only this part reruns to check on it
+        st.session_state.invoice_pdf_polling = st.session_state.invoice_pdf is None
+        st.fragment(invoice_download, run_every=PDF_POLL_SECONDS if st.session_state.invoice_pdf_polling else None)()
+        
+        # Counter receipt for 80mm thermal printers, drawn here as it takes a few milliseconds
+        st.download_button(
+            "Download 80mm Receipt 🧾",
+            data=invoice_receipt_pdf(),
+            file_name=f"receipt_{st.session_state.invoice['invoice_number']}.pdf",
+            mime="application/pdf",
+        )
         
         col1, col2 = st.columns(2)
         
@@ -790,9 +790,14 @@ elif st.session_state.page == "invoice":
             st.markdown('<div class="primary-button" style="width: 100%;">', unsafe_allow_html=True)
             if st.button("Create New Invoice 📄"):
                 # Reset session state
-                st.session_state.cart = []
+                clear_cart()
                 st.session_state.invoice = None
+                get_artifact_store().release(st.session_state.invoice_pdf)
+                get_artifact_store().release(st.session_state.invoice_pdf_link)
                 st.session_state.invoice_pdf = None
+                st.session_state.invoice_pdf_link = None
+                st.session_state.invoice_view = None
+                st.session_state.invoice_receipt = None
                 st.session_state.page = "products"
                 st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
@@ -822,6 +827,64 @@ elif st.session_state.page == "invoice":
             st.session_state.page = "products"
             st.rerun()
 
+elif st.session_state.page == "dashboard":
+    st.markdown('<h2 style="color: #0066ff; margin-bottom: 20px;">📊 Sales Dashboard</h2>', unsafe_allow_html=True)
+    
+    # Rollups are updated as invoices are generated, so this only reads a few buckets
+    rollups = get_sales_rollups()
+    summary = rollups.summary()
+    
+    if summary["invoices"]:
+        metric_cols = st.columns(4)
+        for col, (label, value) in zip(metric_cols, [
+            ("Invoices", summary["invoices"]),
+            ("Units Sold", summary["quantity"]),
+            ("Sales (excl. tax)", format_currency(summary["sales"])),
+            ("Tax Collected", format_currency(summary["tax"])),
+        ]):
+            with col:
+                st.markdown(
+                    f'<div class="metric-container">'
+                    f'<div class="metric-label">{label}</div>'
+                    f'<div class="metric-value">{value}</div>'
+                    f'</div>',
+                    unsafe_allow_html=True
+                )
+        
+        st.markdown(
+            '<div style="font-size: 0.9rem; color: #666; margin: 10px 0 20px 0;">'
+            f'SGST {format_currency(summary["sgst_collected"])} · '
+            f'CGST {format_currency(summary["cgst_collected"])} · '
+            f'IGST {format_currency(summary["igst_collected"])}'
+            '</div>',
+            unsafe_allow_html=True
+        )
+        
+        col1, col2 = st.columns(2)
+        for col, dimension, title in ((col1, "brand", "Top Brands"), (col2, "model", "Top Models")):
+            with col:
+                st.markdown(f'<h3 style="font-size: 1.1rem; margin-bottom: 10px;">{title}</h3>', unsafe_allow_html=True)
+                st.table([
+                    {dimension.title(): row["key"], "Units": row["quantity"], "Sales": format_currency(row["sales"])}
+                    for row in rollups.top(dimension)
+                ])
+        
+        daily = rollups.daily()[-30:]
+        st.markdown('<h3 style="font-size: 1.1rem; margin: 20px 0 10px 0;">Daily Sales (last 30 days with sales)</h3>', unsafe_allow_html=True)
+        st.bar_chart({"Day": [row["key"] for row in daily], "Sales": [row["sales"] for row in daily]}, x="Day", y="Sales")
+        
+        hourly = rollups.hourly()
+        st.markdown('<h3 style="font-size: 1.1rem; margin: 20px 0 10px 0;">Sales by Hour of Day</h3>', unsafe_allow_html=True)
+        st.bar_chart({"Hour": [row["key"] for row in hourly], "Sales": [row["sales"] for row in hourly]}, x="Hour", y="Sales")
+    else:
+        st.markdown(
+            '<div style="text-align: center; padding: 50px; background-color: #f9f9f9; border-radius: 10px;">'
+            '<div style="font-size: 64px; color: #ccc; margin-bottom: 20px;">📊</div>'
+            '<h3 style="color: #666;">No sales recorded yet</h3>'
+            '</div>',
+            unsafe_allow_html=True
+        )
+
 # Footer
 st.markdown('<div class="footer">', unsafe_allow_html=True)
 st.markdown(
@@ -0,0 +1,175 @@
+"""
+Bounded store for large per-session artifacts such as invoice PDFs.
+Sessions keep a small handle instead of the bytes. The store keeps recently used
+artifacts in memory within a per-session and a global budget, and spills the least
+recently used ones to temporary files. Spilled files are bounded too; when the disk
+budget is exceeded the oldest are deleted, and callers regenerate them on a miss.
+Server memory therefore stays bounded however many sessions are open.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+
+MB = 1024 * 1024
+DEFAULT_MEMORY_BUDGET = 64 * MB
+DEFAULT_SESSION_BUDGET = 4 * MB
+DEFAULT_DISK_BUDGET = 1024 * MB
+
+
+class ArtifactStore:
+    """
+    Artifacts by handle, in memory or spilled to disk.
+
+    `memory` and `disk` are OrderedDicts in least-recently-used order, shared
+    by all sessions, so the global LRU is the front of `memory`. Each session's
+    in-memory bytes are also counted, so one busy tab cannot take the whole
+    memory budget.
+    """
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, session_budget=DEFAULT_SESSION_BUDGET,
+                 disk_budget=DEFAULT_DISK_BUDGET, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.session_budget = session_budget
+        self.disk_budget = disk_budget
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="invoice-artifacts-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()    # handle -> (session_id, data)
+        self.disk = OrderedDict()      # handle -> (session_id, size)
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.session_bytes = {}        # session_id -> bytes held in memory
+        self.spills = 0
+
+    def put(self, session_id, data):
+        """
+        Store an artifact for a session.
+
+        Parameters:
+        - session_id: Identifier of the owning session
+        - data: Artifact bytes
+
+        Returns:
+        - Handle to fetch or release the artifact with
+        """
+        handle = uuid.uuid4().hex
+        with self.lock:
+            self.memory[handle] = (session_id, data)
+            self.memory_bytes += len(data)
+            self.session_bytes[session_id] = self.session_bytes.get(session_id, 0) + len(data)
+            self._enforce(session_id)
+        return handle
+
+    def get(self, handle):
+        """Return the bytes of an artifact, or None when it is unknown or was evicted."""
+        if not handle:
+            return None
+        with self.lock:
+            entry = self.memory.get(handle)
+            if entry is not None:
+                self.memory.move_to_end(handle)
+                return entry[1]
+            if handle not in self.disk:
+                return None
+            self.disk.move_to_end(handle)
+            # Spilled artifacts stay on disk; reading a file back does not grow memory
+            with open(self._path(handle), "rb") as f:
+                return f.read()
+
+    def release(self, handle):
+        """Forget an artifact, e.g. when the session replaces it."""
+        with self.lock:
+            self._drop_memory(handle)
+            self._drop_disk(handle)
+
+    def release_session(self, session_id):
+        """Forget every artifact of a session."""
+        with self.lock:
+            for table in (self.memory, self.disk):
+                for handle in [handle for handle, entry in table.items() if entry[0] == session_id]:
+                    self._drop_memory(handle)
+                    self._drop_disk(handle)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "memory_artifacts": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_artifacts": len(self.disk),
+                "disk_bytes": self.disk_bytes,
+                "sessions": len(self.session_bytes),
+                "spills": self.spills,
+            }
+
+    def close(self):
+        """Delete every artifact and the spill directory."""
+        with self.lock:
+            self.memory.clear()
+            self.disk.clear()
+            self.memory_bytes = self.disk_bytes = 0
+            self.session_bytes.clear()
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _enforce(self, session_id):
+        # The session's own least recently used artifacts go first...
+        if self.session_bytes.get(session_id, 0) > self.session_budget:
+            for handle in [handle for handle, entry in self.memory.items() if entry[0] == session_id]:
+                if self.session_bytes.get(session_id, 0) <= self.session_budget:
+                    break
+                self._spill(handle)
+        # ...then the least recently used across all sessions
+        while self.memory_bytes > self.memory_budget:
+            self._spill(next(iter(self.memory)))
+        while self.disk_bytes > self.disk_budget:
+            self._drop_disk(next(iter(self.disk)))
+
+    def _spill(self, handle):
+        session_id, data = self.memory[handle]
+        with open(self._path(handle), "wb") as f:
+            f.write(data)
+        self._drop_memory(handle)
+        self.disk[handle] = (session_id, len(data))
+        self.disk_bytes += len(data)
+        self.spills += 1
+
+    def _drop_memory(self, handle):
+        entry = self.memory.pop(handle, None)
+        if entry is None:
+            return
+        session_id, data = entry
+        self.memory_bytes -= len(data)
+        self.session_bytes[session_id] -= len(data)
+        if not self.session_bytes[session_id]:
+            del self.session_bytes[session_id]
+
+    def _drop_disk(self, handle):
+        entry = self.disk.pop(handle, None)
+        if entry is None:
+            return
+        self.disk_bytes -= entry[1]
+        try:
+            os.remove(self._path(handle))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, handle):
+        return os.path.join(self.spill_dir, handle)
+
+
+@lru_cache(maxsize=None)
+def get_artifact_store():
+    """
+    Return the process-wide artifact store shared by all sessions.
+
+    ARTIFACT_MEMORY_MB, ARTIFACT_SESSION_MB and ARTIFACT_DISK_MB override the
+    budgets; ARTIFACT_SPILL_DIR sets where spilled artifacts are written.
+    """
+    return ArtifactStore(
+        memory_budget=int(float(os.environ.get("ARTIFACT_MEMORY_MB", DEFAULT_MEMORY_BUDGET / MB)) * MB),
+        session_budget=int(float(os.environ.get("ARTIFACT_SESSION_MB", DEFAULT_SESSION_BUDGET / MB)) * MB),
+        disk_budget=int(float(os.environ.get("ARTIFACT_DISK_MB", DEFAULT_DISK_BUDGET / MB)) * MB),
+        spill_dir=os.environ.get("ARTIFACT_SPILL_DIR"),
+    )
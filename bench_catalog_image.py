@@ -0,0 +1,151 @@
+"""
+Catalog load benchmark for multi-process deployments.
+Builds a synthetic catalog, then starts several worker processes that each load it,
+either as a private Python dict (parsed from JSON) or by mapping the binary catalog image.
+Reports the load time and the RSS and PSS each worker adds once all are running. PSS
+divides shared pages between the processes that map them, so it shows what each worker
+really costs.
+
+Linux only (reads /proc). Run with:
+    python bench_catalog_image.py [--skus 50000] [--workers 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from catalog_image import CatalogImage, build_catalog_image
+
+STORAGES = ["64GB", "128GB", "256GB", "512GB", "1TB"]
+COLORS = ["Black", "White", "Blue", "Green", "Silver", "Gold", "Purple", "Red"]
+
+
+def synthetic_catalog(skus):
+    """Expand the real catalog into about `skus` variants, keeping its brands and descriptions."""
+    from mobile_data import MOBILE_DATABASE
+
+    database = {brand: [] for brand in MOBILE_DATABASE}
+    base = [(brand, phone) for brand, models in MOBILE_DATABASE.items() for phone in models]
+    for i in range(skus):
+        brand, phone = base[i % len(base)]
+        generation = i // (len(base) * len(STORAGES) * len(COLORS))
+        database[brand].append(dict(
+            phone,
+            model=f"{phone['model']} {generation}" if generation else phone["model"],
+            storage=STORAGES[i // len(base) % len(STORAGES)],
+            color=COLORS[i // (len(base) * len(STORAGES)) % len(COLORS)],
+            price=phone["price"] + i % 1000,
+        ))
+    return database
+
+
+def memory_kb(pid="self"):
+    """Return (RSS, PSS) of a process in kB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def child(mode, path, sample_skus):
+    """Load the catalog, do some lookups, report, and stay alive until stdin closes."""
+    baseline = memory_kb()
+    start = time.perf_counter()
+    if mode == "dict":
+        with open(path, encoding="utf-8") as f:
+            database = json.load(f)
+        by_sku = {
+            f"{brand}|{phone['model']}|{phone['storage']}|{phone['color']}": dict(phone, brand=brand)
+            for brand, models in database.items() for phone in models
+        }
+        lookup = by_sku.get
+        search = lambda query: [row for row in by_sku.values() if query in row["description"].lower()]
+    else:
+        image = CatalogImage(path)
+        lookup = image.get
+        search = image.search
+    load_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({"baseline": baseline, "load_ms": load_ms}), flush=True)
+
+    # Lookups are timed one worker at a time, when the parent says so
+    sys.stdin.readline()
+    # Time the second pass, after the first has faulted in the pages it touches
+    for sku in sample_skus:
+        lookup(sku)
+    start = time.perf_counter()
+    for sku in sample_skus:
+        lookup(sku)
+    lookup_us = (time.perf_counter() - start) * 1e6 / len(sample_skus)
+    search(sample_skus[0].split("|")[1].lower())
+    print(json.dumps({"lookup_us": lookup_us}), flush=True)
+    sys.stdin.read()
+
+
+def run_workers(mode, path, workers, sample_skus):
+    """Start workers, wait until all have loaded, and measure what each one added."""
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--child", mode, path, "--samples", json.dumps(sample_skus)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    reports = [json.loads(proc.stdout.readline()) for proc in procs]
+    for proc, report in zip(procs, reports):
+        proc.stdin.write("go\n")
+        proc.stdin.flush()
+        report.update(json.loads(proc.stdout.readline()))
+    # Measure once every worker has the catalog loaded, so shared pages are split between them
+    rows = []
+    for proc, report in zip(procs, reports):
+        rss, pss = memory_kb(proc.pid)
+        rows.append((report["load_ms"], report["lookup_us"], rss - report["baseline"][0], pss - report["baseline"][1]))
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return [statistics.mean(column) for column in zip(*rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dict and mmap catalog loading across worker processes.")
+    parser.add_argument("--skus", type=int, default=50000, help="Number of catalog variants")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--samples", default="[]", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], json.loads(args.samples))
+        return
+
+    database = synthetic_catalog(args.skus)
+    sample_skus = [
+        f"{brand}|{phone['model']}|{phone['storage']}|{phone['color']}"
+        for brand, models in database.items() for phone in models[::max(1, args.skus // 200)]
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "catalog.json")
+        image_path = os.path.join(tmp, "catalog.img")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(database, f)
+        start = time.perf_counter()
+        build_catalog_image(database, image_path)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"{args.skus} SKUs: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, "
+              f"image {os.path.getsize(image_path) / 1e6:.1f} MB (built in {build_ms:.0f} ms)")
+        print(f"{args.workers} workers, mean per worker:\n")
+        print(f"{'Catalog':<12} {'load ms':>9} {'lookup us':>10} {'RSS MB':>8} {'PSS MB':>8}")
+        for mode, path in (("dict", json_path), ("image", image_path)):
+            load_ms, lookup_us, rss_kb, pss_kb = run_workers(mode, path, args.workers, sample_skus)
+            print(f"{mode:<12} {load_ms:>9.1f} {lookup_us:>10.2f} {rss_kb / 1024:>8.1f} {pss_kb / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
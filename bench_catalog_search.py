@@ -0,0 +1,70 @@
+"""
+Catalog search benchmark.
+Builds the ranked search index over a synthetic catalog and times queries with and
+without typos, next to the old substring scan over every entry.
+
+Run with:
+    python bench_catalog_search.py [--skus 50000] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+from bench_catalog_image import synthetic_catalog
+from catalog_search import CatalogSearchIndex
+
+QUERIES = [
+    "galaxy s23", "galxy s23", "iphone 15", "iphne 15", "redmi note", "redmy note 13",
+    "samsung", "vivo blue", "amoled", "snapdragon 8", "200mp camera", "s23 ultra 2",
+]
+
+
+def substring_scan(entries, query):
+    """The search that the index replaces: case-insensitive substring match, catalog order."""
+    query = query.lower()
+    return [
+        position for position, entry in enumerate(entries)
+        if (query in entry["brand"].lower() or query in entry["model"].lower() or
+            query in entry["description"].lower() or query in entry["color"].lower())
+    ]
+
+
+def time_query(search, query, repeat):
+    """Return the median time of one query in ms."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time ranked catalog search against a substring scan.")
+    parser.add_argument("--skus", type=int, default=50000, help="Number of catalog variants")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    args = parser.parse_args()
+
+    database = synthetic_catalog(args.skus)
+    entries = [dict(phone, brand=brand) for brand, models in database.items() for phone in models]
+    start = time.perf_counter()
+    index = CatalogSearchIndex(entries)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(entries)} SKUs, {len(index.docs)} distinct texts, {len(index.terms)} words; "
+          f"index built in {build_ms:.0f} ms\n")
+
+    print(f"{'Query':<16} {'index ms':>9} {'hits':>5}  {'scan ms':>8} {'hits':>6}  top result")
+    index_times = []
+    for query in QUERIES:
+        positions = index.search(query)
+        index_ms = time_query(index.search, query, args.repeat)
+        scan_ms = time_query(lambda q: substring_scan(entries, q), query, max(1, args.repeat // 10))
+        index_times.append(index_ms)
+        top = entries[positions[0]] if positions else None
+        print(f"{query:<16} {index_ms:>9.2f} {len(positions):>5}  {scan_ms:>8.1f} {len(substring_scan(entries, query)):>6}  "
+              + (f"{top['brand']} {top['model']}" if top else "-"))
+    print(f"\nIndex: median {statistics.median(index_times):.2f} ms, max {max(index_times):.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Shared helpers for the benchmark scripts.
+Builds realistic invoice dictionaries from the catalog without touching stock.
+"""
+import random
+import time
+
+from mobile_data import MOBILE_DATABASE
+from invoice_generator import Invoice, InvoiceItem
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Meera"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Iyer", "Singh", "Nair", "Gupta", "Das", "Khan", "Joshi"]
+CITIES = ["Bengaluru - 560001", "Mysuru - 570001", "Hubballi - 580020", "Mangaluru - 575001"]
+
+
+def sample_invoices(count, min_lines=1, max_lines=5, seed=42):
+    """
+    Generate invoice dictionaries shaped like Invoice.to_dict() output.
+
+    Parameters:
+    - count: Number of invoices to generate
+    - min_lines, max_lines: Range for the number of line items per invoice
+    - seed: Random seed, so runs are comparable
+
+    Returns:
+    - List of invoice dictionaries
+    """
+    rng = random.Random(seed)
+    phones = [(brand, phone) for brand, models in MOBILE_DATABASE.items() for phone in models]
+    invoices = []
+    for _ in range(count):
+        invoice = Invoice(
+            customer_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            customer_address=f"{rng.randint(1, 999)}, {rng.choice(['MG Road', 'Brigade Road', 'Church Street'])}, {rng.choice(CITIES)}",
+            customer_phone=f"9{rng.randint(100000000, 999999999)}",
+            customer_email=None
+        )
+        for brand, phone in rng.sample(phones, rng.randint(min_lines, max_lines)):
+            invoice.add_item(InvoiceItem(
+                brand=brand,
+                model=phone["model"],
+                storage=phone["storage"],
+                color=phone["color"],
+                price=phone["price"],
+                hsn_code=phone["hsn_code"],
+                quantity=rng.randint(1, 3)
+            ))
+        invoices.append(invoice.to_dict())
+    return invoices
+
+
+def time_per_call(func, items, repeat=1):
+    """Return the mean wall time in milliseconds of func(item) over all items."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) * 1000 / (len(items) * repeat)
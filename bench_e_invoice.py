@@ -0,0 +1,69 @@
+"""
+e-Invoice benchmark.
+Times invoice PDFs with and without the IRN and signed QR code, the QR encoder next to
+ReportLab's own (which searches all eight mask patterns), and the batch API's
+throughput per number of worker processes.
+
+Run with:
+    python bench_e_invoice.py [--count 100] [--batch 2000]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("E_INVOICE_SIGNING_KEY", "bench-signing-key")
+
+from reportlab.graphics.barcode.qrencoder import QRCode, QR8bitByte
+
+from bench_common import sample_invoices, time_per_call
+from pdf_generator import create_invoice_pdf
+import e_invoice
+
+BUYER_GSTIN = "29AABCU9603R1ZM"
+
+
+def reportlab_qr(text):
+    """The encoder QrCodeWidget uses: best of eight masks, polynomial Reed-Solomon."""
+    qr = QRCode(None, e_invoice.QR_ERROR_CORRECTION)
+    qr.addData(QR8bitByte(text))
+    qr.make()
+    return qr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time e-invoice QR codes in PDF rendering and in batches.")
+    parser.add_argument("--count", type=int, default=100, help="Sample invoices per line count")
+    parser.add_argument("--batch", type=int, default=2000, help="Invoices for the batch API")
+    args = parser.parse_args()
+
+    print(f"{'Lines':>5} {'B2C ms':>7} {'B2B ms':>7} {'B2B cached':>11} {'QR ms':>6} {'QR share':>9}")
+    for lines in (1, 3, 5):
+        b2c = sample_invoices(args.count, min_lines=lines, max_lines=lines)
+        b2b = [dict(invoice, customer_gstin=BUYER_GSTIN) for invoice in b2c]
+        create_invoice_pdf(b2b[0])
+        e_invoice.qr_modules.cache_clear()
+        e_invoice._qr_pdf_path.cache_clear()
+        plain_ms = time_per_call(create_invoice_pdf, b2c)
+        qr_ms = time_per_call(lambda invoice: e_invoice.qr_modules(e_invoice.e_invoice_details(invoice)["signed_qr"]), b2b)
+        e_invoice.qr_modules.cache_clear()
+        b2b_ms = time_per_call(create_invoice_pdf, b2b)
+        cached_ms = time_per_call(create_invoice_pdf, b2b)
+        print(f"{lines:>5} {plain_ms:>7.2f} {b2b_ms:>7.2f} {cached_ms:>11.2f} {qr_ms:>6.2f} {qr_ms / b2b_ms:>9.0%}")
+
+    tokens = [e_invoice.e_invoice_details(invoice)["signed_qr"] for invoice in b2b[:20]]
+    count, _ = e_invoice.qr_modules(tokens[0])
+    encoder_ms = time_per_call(e_invoice.qr_modules.__wrapped__, tokens)
+    reportlab_ms = time_per_call(reportlab_qr, tokens)
+    print(f"\nSigned QR: {len(tokens[0])} characters, {count}x{count} modules; "
+          f"encode {encoder_ms:.2f} ms, ReportLab {reportlab_ms:.1f} ms")
+
+    invoices = [dict(invoice, customer_gstin=BUYER_GSTIN) for invoice in sample_invoices(args.batch)]
+    print(f"\n{'Workers':>7} {'invoices/s':>11}")
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        done = sum(1 for _ in e_invoice.e_invoice_batch(invoices, workers))
+        print(f"{workers:>7} {done / (time.perf_counter() - start):>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+IMEI registry benchmark.
+Registers synthetic invoices of two-unit lines into a fresh registry and, as it grows,
+times lookups of units sold and of units that were never sold. Lookup time should stay
+flat however many units are registered.
+
+Run with:
+    python bench_imei_registry.py [--units 1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from imei_registry import ImeiRegistry
+from validation import imei_check_digit
+
+
+def synthetic_imei(n, tac="35"):
+    """Return the n-th of a sequence of distinct IMEIs, scattered like real serial numbers."""
+    body = f"{tac}{n * 982451653 % 10 ** 12:012d}"
+    return body + imei_check_digit(body)
+
+
+def time_lookups(registry, imeis, repeat=3):
+    """Return the median time of one lookup in microseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for imei in imeis:
+            registry.lookup(imei)
+        times.append((time.perf_counter() - start) * 1e6 / len(imeis))
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time IMEI lookups as the registry grows.")
+    parser.add_argument("--units", type=int, default=1000000, help="Units to register")
+    parser.add_argument("--samples", type=int, default=2000, help="Lookups per measurement")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    checkpoints = sorted({min(args.units, 10 ** power) for power in range(4, 8)})
+    sold = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Synthetic data; each invoice is made durable when it is written in production
+        registry = ImeiRegistry(tmp, durable=False)
+        print(f"{'Units':>10} {'register/s':>11} {'hit us':>8} {'miss us':>8} {'index MB':>9}")
+        invoice = 0
+        start = time.perf_counter()
+        for checkpoint in checkpoints:
+            registered = len(sold)
+            while len(sold) < checkpoint:
+                invoice += 1
+                imeis = [synthetic_imei(len(sold)), synthetic_imei(len(sold) + 1)]
+                registry.register_invoice({
+                    "invoice_number": f"INV-{invoice:08d}",
+                    "date": "19-10-2026",
+                    "items": [{"brand": "Samsung", "model": "Galaxy S23", "storage": "128GB",
+                               "color": "Green", "imeis": imeis}],
+                })
+                sold.extend(imeis)
+            rate = (len(sold) - registered) / (time.perf_counter() - start)
+            hits = rng.sample(sold, min(args.samples, len(sold)))
+            # Units from another type allocation code were never sold here
+            misses = [synthetic_imei(rng.randrange(10 ** 12), tac="86") for _ in range(args.samples)]
+            index_mb = os.path.getsize(os.path.join(tmp, "index.bin")) / 1e6
+            print(f"{len(sold):>10} {rate:>11.0f} {time_lookups(registry, hits):>8.1f} "
+                  f"{time_lookups(registry, misses):>8.1f} {index_mb:>9.1f}")
+            start = time.perf_counter()
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Import-time report for the invoice generator modules.
+Runs each import in a fresh interpreter with `python -X importtime` and summarises
+the parsed output, so cold-start regressions from heavy dependencies are easy to spot.
+
+Run with:
+    python bench_import_time.py [module ...] [--runs 5] [--top 10]
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+# Modules loaded when app.py starts, followed by the ones it now loads lazily
+DEFAULT_MODULES = [
+    "streamlit",
+    "utils",
+    "mobile_data",
+    "invoice_generator",
+    "pdf_generator",
+    "pandas",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(output):
+    """
+    Parse the stderr produced by `-X importtime`.
+
+    Parameters:
+    - output: Text written to stderr by the interpreter
+
+    Returns:
+    - List of (module, self_us, cumulative_us, depth) tuples in import order
+    """
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure_import(module, runs=5):
+    """
+    Import a module in fresh interpreters and collect timings.
+
+    Returns:
+    - Dictionary with the median total import time (ms) and the entries of the median run
+    """
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+        entries = parse_importtime(proc.stderr)
+        # Interpreter startup (site, encodings) is reported too; only count the module itself
+        total_us = sum(entry[2] for entry in entries if entry[3] == 0 and entry[0] == module)
+        samples.append((total_us, entries))
+
+    samples.sort(key=lambda sample: sample[0])
+    total_us, entries = samples[len(samples) // 2]
+    return {
+        "module": module,
+        "total_ms": total_us / 1000,
+        "spread_ms": statistics.pstdev(sample[0] for sample in samples) / 1000,
+        "entries": entries,
+    }
+
+
+def slowest_dependencies(module, entries, top=10):
+    """Return the slowest packages imported directly by a module, by cumulative time."""
+    totals = {}
+    inside = False
+    # Children of an import are printed before it, one indentation level deeper
+    for name, _, cumulative_us, depth in reversed(entries):
+        if depth == 0:
+            inside = name == module
+        elif inside and depth == 1:
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0) + cumulative_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold import times for the app's modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=5, help="Slowest dependencies to list per module")
+    args = parser.parse_args()
+
+    print(f"{'Module':<20} {'Import (ms)':>12} {'± (ms)':>8}")
+    print("-" * 42)
+    reports = [measure_import(module, args.runs) for module in args.modules]
+    for report in reports:
+        print(f"{report['module']:<20} {report['total_ms']:>12.1f} {report['spread_ms']:>8.1f}")
+
+    for report in reports:
+        print(f"\nSlowest dependencies of {report['module']}:")
+        for package, cumulative_us in slowest_dependencies(report["module"], report["entries"], args.top):
+            print(f"  {package:<30} {cumulative_us / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
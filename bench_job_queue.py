@@ -0,0 +1,60 @@
+"""
+Job queue benchmark.
+Compares what checkout pays per invoice, enqueueing its render on a durable queue,
+with rendering the PDF inline, then times worker pools draining the backlog a burst
+of checkouts leaves behind.
+
+Run with:
+    python bench_job_queue.py [--count 300]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench_common import sample_invoices, time_per_call
+from job_queue import JobQueue, JobWorkers, render_invoice
+
+
+def drain(queue, workers, processes):
+    """Return the seconds workers take to finish every queued job."""
+    start = time.perf_counter()
+    pool = JobWorkers(queue, workers, processes)
+    while queue.counts().get("queued") or queue.counts().get("running"):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time checkout enqueueing against inline PDF rendering.")
+    parser.add_argument("--count", type=int, default=300, help="Invoices per measurement")
+    args = parser.parse_args()
+
+    invoices = sample_invoices(args.count)
+    render_invoice(invoices[0])
+    render_ms = time_per_call(render_invoice, invoices)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Checkout step':<36} {'ms/invoice':>10}")
+        print(f"{'Render PDF inline':<36} {render_ms:>10.2f}")
+        for durable in (True, False):
+            queue = JobQueue(os.path.join(tmp, f"jobs-{durable}.db"), durable=durable)
+            enqueue_ms = time_per_call(lambda invoice: queue.enqueue("render", invoice), invoices)
+            label = "Enqueue render (synchronous=FULL)" if durable else "Enqueue render (synchronous=NORMAL)"
+            print(f"{label:<36} {enqueue_ms:>10.2f}")
+            queue.close()
+
+        print(f"\n{'Workers':>7} {'Executor':>9} {'invoices/s':>11}")
+        for workers in sorted({1, os.cpu_count() or 1}):
+            for processes in (False, True):
+                queue = JobQueue(os.path.join(tmp, f"drain-{workers}-{processes}.db"))
+                queue.enqueue_many([("render", invoice, None, None) for invoice in invoices])
+                seconds = drain(queue, workers, workers if processes else 0)
+                print(f"{workers:>7} {'process' if processes else 'thread':>9} {len(invoices) / seconds:>11.0f}")
+                queue.close()
+
+
+if __name__ == "__main__":
+    main()
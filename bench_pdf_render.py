@@ -0,0 +1,48 @@
+"""
+Render-time benchmark for the invoice PDF layouts.
+Compares the fixed canvas layout used for typical invoices with the flowable layout
+it falls back to, per number of line items, and reports which path each size takes.
+
+Run with:
+    python bench_pdf_render.py [--count 100]
+"""
+import argparse
+from io import BytesIO
+
+from bench_common import sample_invoices, time_per_call
+from pdf_fonts import get_invoice_fonts
+import pdf_generator
+
+
+def render_flowable(invoice_data):
+    """Render an invoice through the platypus layout only."""
+    fonts = get_invoice_fonts()
+    buffer = BytesIO()
+    content = pdf_generator._invoice_content(invoice_data, fonts)
+    pdf_generator._invoice_doc(buffer, fonts, False).build(pdf_generator._invoice_flowables(content, fonts))
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed-layout and flowable PDF render times.")
+    parser.add_argument("--count", type=int, default=100, help="Sample invoices per line count")
+    args = parser.parse_args()
+
+    fonts = get_invoice_fonts()
+    print(f"{'Lines':>5} {'Fixed path':>11} {'Auto (ms)':>10} {'Flowable (ms)':>14} {'Speed-up':>9}")
+    for lines in (1, 3, 5, 8, 12):
+        invoices = sample_invoices(args.count, min_lines=lines, max_lines=lines)
+        # Warm up fonts and style caches
+        pdf_generator.create_invoice_pdf(invoices[0])
+        render_flowable(invoices[0])
+
+        fixed = sum(pdf_generator._fixed_layout(pdf_generator._invoice_content(invoice, fonts), fonts) is not None
+                    for invoice in invoices)
+        auto_ms = time_per_call(pdf_generator.create_invoice_pdf, invoices)
+        flowable_ms = time_per_call(render_flowable, invoices)
+        print(f"{lines:>5} {fixed / len(invoices):>11.0%} {auto_ms:>10.2f} {flowable_ms:>14.2f} "
+              f"{flowable_ms / auto_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
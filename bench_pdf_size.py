@@ -0,0 +1,62 @@
+"""
+PDF size benchmark for invoice archiving.
+Renders sample invoices in the default and compact modes of create_invoice_pdf and
+reports bytes per invoice, render time and the time spent compressing streams.
+
+Run with:
+    python bench_pdf_size.py [--count 200]
+"""
+import argparse
+import re
+import time
+import zlib
+
+from bench_common import sample_invoices, time_per_call
+from pdf_generator import create_invoice_pdf
+
+STREAM = re.compile(rb"/Filter \[ /FlateDecode \] /Length (\d+)[^>]*>>\s*stream\r?\n")
+
+
+def compression_time_ms(pdf_bytes):
+    """Time needed to recompress every Flate stream in a PDF, in milliseconds."""
+    payloads = []
+    for match in STREAM.finditer(pdf_bytes):
+        start = match.end()
+        payloads.append(zlib.decompress(pdf_bytes[start:start + int(match.group(1))]))
+    start = time.perf_counter()
+    for payload in payloads:
+        zlib.compress(payload)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(invoices, compact):
+    # Warm up font registration and style caches so they don't skew the first sample
+    create_invoice_pdf(invoices[0], compact=compact)
+    pdfs = [create_invoice_pdf(invoice, compact=compact).getvalue() for invoice in invoices]
+    return {
+        "bytes": sum(len(pdf) for pdf in pdfs) / len(pdfs),
+        "render_ms": time_per_call(lambda invoice: create_invoice_pdf(invoice, compact=compact), invoices),
+        "compress_ms": sum(compression_time_ms(pdf) for pdf in pdfs) / len(pdfs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF size and render time per invoice.")
+    parser.add_argument("--count", type=int, default=200, help="Number of sample invoices")
+    args = parser.parse_args()
+
+    invoices = sample_invoices(args.count)
+    results = {"default": measure(invoices, False), "compact": measure(invoices, True)}
+
+    print(f"{args.count} invoices, 1-5 lines each")
+    print(f"{'Mode':<10} {'Bytes/invoice':>14} {'Render (ms)':>12} {'Compress (ms)':>14}")
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['bytes']:>14,.0f} {result['render_ms']:>12.2f} {result['compress_ms']:>14.2f}")
+
+    saved = 1 - results["compact"]["bytes"] / results["default"]["bytes"]
+    print(f"\nCompact mode saves {saved:.0%} per invoice "
+          f"({(results['default']['bytes'] - results['compact']['bytes']) * 100_000 / 1024 ** 2:,.0f} MB per 100,000 invoices)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Receipt benchmark for counter sales.
+Times the ESC/POS and narrow-roll PDF receipt renderers against the A4 invoice PDF.
+tests/test_receipt_generator.py checks that receipts print the same totals.
+
+Run with:
+    python bench_receipt.py [--count 200]
+"""
+import argparse
+
+from bench_common import sample_invoices, time_per_call
+from pdf_generator import create_invoice_pdf
+from receipt_generator import create_receipt_escpos, create_receipt_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time receipt rendering against the A4 invoice.")
+    parser.add_argument("--count", type=int, default=200, help="Number of sample invoices")
+    args = parser.parse_args()
+
+    invoices = sample_invoices(args.count)
+
+    # Warm up fonts and styles
+    create_invoice_pdf(invoices[0])
+    create_receipt_pdf(invoices[0])
+
+    print(f"{'Renderer':<22} {'ms/receipt':>10}")
+    for name, renderer in [
+        ("A4 invoice PDF", create_invoice_pdf),
+        ("80mm receipt PDF", create_receipt_pdf),
+        ("ESC/POS bytes", create_receipt_escpos),
+    ]:
+        print(f"{name:<22} {time_per_call(renderer, invoices):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Customer validation benchmark.
+Builds a synthetic customer master file with repeat customers and a share of mistyped
+GSTINs and phone numbers, then times batch validation with a cold and a warm cache.
+
+Run with:
+    python bench_validation.py [--count 100000]
+"""
+import argparse
+import random
+import time
+
+from utils import STATE_CODES
+from validation import GSTIN_CHARSET, gstin_check_digit, validate_customers, check_gstin, normalize_phone
+
+
+def random_gstin(rng):
+    """Return a GSTIN with a valid layout, state code and check digit."""
+    body = (
+        rng.choice(list(STATE_CODES))
+        + "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=5))
+        + "".join(rng.choices("0123456789", k=4))
+        + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        + rng.choice(GSTIN_CHARSET[1:])
+        + "Z"
+    )
+    return body + gstin_check_digit(body)
+
+
+def sample_customers(count, distinct=0.3, typos=0.05, seed=1):
+    """
+    Build customer records in which about `distinct` of them are unique.
+
+    Parameters:
+    - count: Number of records
+    - distinct: Share of records that are distinct customers
+    - typos: Share of distinct customers with a mistyped GSTIN or phone number
+
+    Returns:
+    - List of customer dictionaries with 'phone' and 'gstin' keys
+    """
+    rng = random.Random(seed)
+    customers = []
+    for _ in range(max(1, int(count * distinct))):
+        phone = rng.choice("6789") + "".join(rng.choices("0123456789", k=9))
+        gstin = random_gstin(rng) if rng.random() < 0.4 else ""
+        if rng.random() < typos:
+            if gstin:
+                gstin = gstin[:14] + rng.choice(GSTIN_CHARSET.replace(gstin[14], ""))
+            else:
+                phone = rng.choice("012345") + phone[1:]
+        customers.append({"phone": phone, "gstin": gstin})
+    return [rng.choice(customers) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time batch validation of customer records.")
+    parser.add_argument("--count", type=int, default=100000, help="Number of customer records")
+    args = parser.parse_args()
+
+    customers = sample_customers(args.count)
+    for label in ("cold cache", "warm cache"):
+        if label == "cold cache":
+            check_gstin.cache_clear()
+            normalize_phone.cache_clear()
+        start = time.perf_counter()
+        results = validate_customers(customers)
+        elapsed = time.perf_counter() - start
+        invalid = sum(1 for errors in results if errors)
+        print(f"{label:<11} {len(customers) / elapsed:>12,.0f} records/s  ({invalid} invalid)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Bulk re-render of historical invoices, e.g. after a template change or for an audit.
+Reads Invoice.to_dict() records from a JSON Lines export, renders them on a pool of
+worker processes and writes either one ZIP of PDFs or merged PDFs per month.
+Finished work is kept on disk next to a manifest of the job's inputs, so an
+interrupted job resumes where it stopped and a changed job never reuses it.
+
+Run with:
+    python bulk_render.py invoices.jsonl reprint.zip --from 01-04-2024 --to 31-03-2025
+    python bulk_render.py invoices.jsonl reprints/ --monthly --workers 8 [--volume-size 500]
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Invoices per task: large enough that pickling a chunk is cheap next to rendering it
+CHUNK_SIZE = 50
+# Invoices per merged PDF in monthly mode; larger months are split into volumes
+# that render in parallel
+VOLUME_SIZE = 500
+DATE_FORMAT = "%d-%m-%Y"
+
+
+def read_invoices(path, start=None, end=None):
+    """
+    Stream invoice dictionaries from a JSON Lines export.
+
+    Parameters:
+    - path: File with one Invoice.to_dict() record per line
+    - start, end: Optional datetime.date bounds (inclusive) on the invoice date
+
+    Returns:
+    - Generator of invoice dictionaries in file order; only one line is held at a time
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            invoice_data = json.loads(line)
+            date = invoice_date(invoice_data)
+            if (start and date < start) or (end and date > end):
+                continue
+            yield invoice_data
+
+
+def invoice_date(invoice_data):
+    """Return the date of an invoice dictionary as a datetime.date."""
+    return datetime.datetime.strptime(invoice_data["date"], DATE_FORMAT).date()
+
+
+def invoice_month(invoice_data):
+    """Return the 'YYYY-MM' month an invoice belongs to."""
+    return invoice_date(invoice_data).strftime("%Y-%m")
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` consecutive items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _render_zip_part(invoices, part_path, compact):
+    """Worker: render a chunk of invoices into a small ZIP, published atomically."""
+    from pdf_generator import create_invoice_pdf
+    tmp_path = part_path + ".tmp"
+    # The PDFs are already compressed, so storing them keeps the archive cheap to write
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as part:
+        for invoice_data in invoices:
+            part.writestr(f"{invoice_data['invoice_number']}.pdf",
+                          create_invoice_pdf(invoice_data, compact=compact).getvalue())
+    os.replace(tmp_path, part_path)
+    return len(invoices)
+
+
+def _render_volume(invoices, pdf_path, compact):
+    """Worker: render a volume of one month's invoices into a single merged PDF."""
+    from pdf_generator import create_invoices_pdf
+    tmp_path = pdf_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(create_invoices_pdf(invoices, compact=compact).getvalue())
+    os.replace(tmp_path, pdf_path)
+    return len(invoices)
+
+
+def _run_pool(tasks, workers=None, progress=None):
+    """
+    Run (function, *args) tasks on a process pool.
+
+    Tasks are pulled from the iterable only as workers free up, so the input is
+    never read far ahead of the rendering.
+
+    Returns:
+    - Sum of the task results (invoices rendered)
+    """
+    workers = workers or os.cpu_count() or 1
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for func, *args in tasks:
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rendered += future.result()
+                if progress:
+                    progress(rendered)
+            pending.add(executor.submit(func, *args))
+        for future in pending:
+            rendered += future.result()
+    if progress:
+        progress(rendered)
+    return rendered
+
+
+def input_description(path, start=None, end=None):
+    """
+    Describe the input of a bulk job for its manifest.
+
+    The export's size and modification time are included, so a job rerun after
+    the export was rewritten does not reuse output rendered from the old one.
+
+    Returns:
+    - JSON-serialisable dictionary
+    """
+    stat = os.stat(path)
+    return {
+        "input": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "from": start and start.isoformat(),
+        "to": end and end.isoformat(),
+    }
+
+
+def _check_manifest(manifest_path, manifest):
+    """Record a job's manifest, or check that existing output belongs to the same job."""
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f) != manifest:
+                raise ValueError(f"{os.path.dirname(manifest_path)} belongs to a different job; "
+                                 "remove it or rerun with the same arguments")
+    else:
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+
+def render_zip(invoices, output, workers=None, chunk_size=CHUNK_SIZE, compact=False, job=None, progress=None):
+    """
+    Render invoices into one ZIP archive holding <invoice number>.pdf files.
+
+    Each chunk is rendered by a worker into its own part file under
+    `<output>.parts/`. Parts that already exist are skipped, so rerunning an
+    interrupted job with the same input and arguments only renders what is
+    missing. The parts are then streamed into the final archive.
+
+    Parameters:
+    - invoices: Iterable of invoice dictionaries, in a repeatable order
+    - output: Path of the ZIP file to write
+    - workers: Number of rendering processes (default: one per CPU)
+    - chunk_size: Invoices per task
+    - compact: Render the smaller archival PDFs
+    - job: JSON-serialisable description of the job; a rerun must match it to reuse parts
+    - progress: Optional callable receiving the number of invoices rendered so far
+
+    Returns:
+    - Number of invoices rendered in this run
+    """
+    parts_dir = output + ".parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    _check_manifest(os.path.join(parts_dir, "job.json"), {"job": job, "chunk_size": chunk_size, "compact": compact})
+
+    part_paths = []
+
+    def tasks():
+        for index, chunk in enumerate(chunked(invoices, chunk_size)):
+            part_path = os.path.join(parts_dir, f"{index:06d}.zip")
+            part_paths.append(part_path)
+            if not os.path.exists(part_path):
+                yield _render_zip_part, chunk, part_path, compact
+
+    rendered = _run_pool(tasks(), workers, progress)
+
+    tmp_path = output + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for part_path in part_paths:
+            with zipfile.ZipFile(part_path) as part:
+                for info in part.infolist():
+                    with part.open(info) as src, archive.open(info.filename, "w") as dst:
+                        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, output)
+    shutil.rmtree(parts_dir)
+    return rendered
+
+
+def render_monthly(invoices, output_dir, workers=None, volume_size=VOLUME_SIZE, compact=False, job=None,
+                   progress=None):
+    """
+    Render invoices into merged PDFs per month, named YYYY-MM-NNN.pdf.
+
+    Each month is split into volumes of up to `volume_size` invoices, and each
+    volume is one task, so a busy month renders on every worker. Volumes that
+    already exist are skipped, which makes an interrupted job resumable;
+    output_dir/job.json records the job they were rendered for, and a rerun
+    with a different job is refused rather than mixing in stale PDFs.
+    Exports are in date order; each month must appear as one contiguous run.
+
+    Parameters:
+    - invoices: Iterable of invoice dictionaries in date order
+    - output_dir: Directory for the monthly PDFs
+    - workers: Number of rendering processes (default: one per CPU)
+    - volume_size: Invoices per merged PDF
+    - compact: Render the smaller archival PDFs
+    - job: JSON-serialisable description of the job; a rerun must match it to reuse volumes
+    - progress: Optional callable receiving the number of invoices rendered so far
+
+    Returns:
+    - Number of invoices rendered in this run
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    _check_manifest(os.path.join(output_dir, "job.json"),
+                    {"job": job, "volume_size": volume_size, "compact": compact})
+    seen = set()
+
+    def tasks():
+        for month, group in itertools.groupby(invoices, key=invoice_month):
+            if month in seen:
+                raise ValueError(f"Invoices for {month} are not contiguous; sort the export by date")
+            seen.add(month)
+            for index, volume in enumerate(chunked(group, volume_size), 1):
+                pdf_path = os.path.join(output_dir, f"{month}-{index:03d}.pdf")
+                if not os.path.exists(pdf_path):
+                    yield _render_volume, volume, pdf_path, compact
+
+    return _run_pool(tasks(), workers, progress)
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, DATE_FORMAT).date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render historical invoices in bulk.")
+    parser.add_argument("input", help="JSON Lines export of invoice records")
+    parser.add_argument("output", help="ZIP file to write, or a directory with --monthly")
+    parser.add_argument("--from", dest="start", type=_parse_date, help="First invoice date (DD-MM-YYYY)")
+    parser.add_argument("--to", dest="end", type=_parse_date, help="Last invoice date (DD-MM-YYYY)")
+    parser.add_argument("--monthly", action="store_true", help="Write one merged PDF per month")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Invoices per task in ZIP mode")
+    parser.add_argument("--volume-size", type=int, default=VOLUME_SIZE,
+                        help="Invoices per merged PDF with --monthly")
+    parser.add_argument("--compact", action="store_true", help="Render the smaller archival PDFs")
+    args = parser.parse_args()
+
+    invoices = read_invoices(args.input, args.start, args.end)
+    job = input_description(args.input, args.start, args.end)
+    progress = lambda count: print(f"\rRendered {count} invoices", end="", flush=True)
+    if args.monthly:
+        rendered = render_monthly(invoices, args.output, args.workers, args.volume_size, args.compact, job, progress)
+    else:
+        rendered = render_zip(invoices, args.output, args.workers, args.chunk_size, args.compact, job, progress)
+    print(f"\nDone: {rendered} invoices rendered into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Shopping cart for the mobile shop invoice generator.
+Cart lines are keyed by SKU, and the unit count, subtotal, taxes and grand total are
+updated as lines are added or removed, so pages read them instead of recomputing.
+"""
+import uuid
+
+from mobile_data import phone_sku
+from tax_rules import get_tax_rate
+from invoice_generator import SELLER_STATE
+
+TAX_LABELS = ("SGST", "CGST", "IGST")
+
+
+class Cart:
+    """
+    Cart lines keyed by SKU with running totals.
+
+    Each line is a dictionary with the brand, model, storage, color, price,
+    hsn_code, description, quantity and amount of one phone variant. Taxes
+    are kept per (label, percent) for the cart's place of supply. The
+    cart_id identifies the cart's stock holds.
+    """
+    def __init__(self, seller_state=SELLER_STATE, place_of_supply=None):
+        self.cart_id = uuid.uuid4().hex
+        self.seller_state = seller_state
+        self.place_of_supply = place_of_supply or seller_state
+        self.lines = {}
+        self.item_count = 0
+        self.subtotal = 0
+        self.tax_amounts = {}
+        self.tax_total = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax_total
+
+    def add(self, phone, quantity=1):
+        """
+        Add units of a phone to the cart.
+
+        Parameters:
+        - phone: Catalog row with 'brand' (e.g. a search result)
+        - quantity: Number of units to add
+
+        Returns:
+        - The SKU of the cart line
+        """
+        sku = phone_sku(phone["brand"], phone["model"], phone["storage"], phone["color"])
+        line = self.lines.get(sku)
+        if line is None:
+            line = self.lines[sku] = {
+                "sku": sku,
+                "brand": phone["brand"],
+                "model": phone["model"],
+                "storage": phone["storage"],
+                "color": phone["color"],
+                "price": phone["price"],
+                "hsn_code": phone["hsn_code"],
+                "description": phone["description"],
+                "quantity": 0,
+                "amount": 0,
+            }
+        self._change(line, quantity)
+        return sku
+
+    def remove(self, sku, quantity=None):
+        """Remove some or (by default) all units of a cart line."""
+        line = self.lines.get(sku)
+        if line is None:
+            return
+        self._change(line, -min(quantity or line["quantity"], line["quantity"]))
+
+    def clear(self):
+        self.lines = {}
+        self.item_count = 0
+        self.subtotal = 0
+        self.tax_amounts = {}
+        self.tax_total = 0
+
+    def set_place_of_supply(self, place_of_supply):
+        """Re-rate the cart for a new place of supply; a no-op when it has not changed."""
+        if place_of_supply == self.place_of_supply:
+            return
+        self.place_of_supply = place_of_supply
+        self.tax_amounts = {}
+        self.tax_total = 0
+        for line in self.lines.values():
+            self._add_tax(line, line["amount"])
+
+    def _change(self, line, quantity):
+        amount = line["price"] * quantity
+        line["quantity"] += quantity
+        line["amount"] += amount
+        self.item_count += quantity
+        self.subtotal += amount
+        self._add_tax(line, amount)
+        if line["quantity"] <= 0:
+            del self.lines[line["sku"]]
+        if not self.lines:
+            # Start the next cart from exact zeros rather than accumulated rounding error
+            self.clear()
+
+    def _add_tax(self, line, amount):
+        rates = get_tax_rate(line["hsn_code"], self.seller_state, self.place_of_supply)
+        for label, percent in zip(TAX_LABELS, rates):
+            if percent:
+                tax = amount * percent / 100
+                total = self.tax_amounts.get((label, percent), 0) + tax
+                if round(total, 6):
+                    self.tax_amounts[label, percent] = total
+                else:
+                    # The last line at this rate was removed
+                    self.tax_amounts.pop((label, percent), None)
+                self.tax_total += tax
@@ -0,0 +1,243 @@
+"""
+Packed binary image of the phone catalog, shared between processes with mmap.
+A build step compiles MOBILE_DATABASE into one file of fixed-width records, a string
+table, a hash index on SKU, a brand table and a search block. Each worker process opens
+the file with mmap instead of building its own Python copy of the catalog: the OS shares
+the pages between processes, and opening the image parses nothing.
+
+Stock is not part of the image; it is kept per branch by mobile_data.
+
+Build the image with:
+    python catalog_image.py catalog.img
+and point the app at it with CATALOG_IMAGE_PATH=catalog.img.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from bisect import bisect_right
+from functools import lru_cache
+
+MAGIC = b"MCAT"
+VERSION = 1
+
+# magic, version, reserved, record count, then section offsets and sizes
+HEADER = struct.Struct("<4sHH10I")
+
+# String fields of a record, each stored as (offset, length) into the string table
+RECORD_FIELDS = ("brand", "model", "storage", "color", "hsn_code", "description", "sku")
+RECORD = struct.Struct("<" + "IH" * len(RECORD_FIELDS) + "d")
+
+# Brand name (offset, length), first record, record count
+BRAND = struct.Struct("<IHII")
+
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+def _sku_hash(sku_bytes):
+    return zlib.crc32(sku_bytes)
+
+
+def _search_text(brand, phone):
+    """Lower-case searchable fields of a record, separated so a query cannot match across fields."""
+    return "\0".join((brand, phone["model"], phone["description"], phone["color"])).lower() + "\n"
+
+
+def build_catalog_image(database, path):
+    """
+    Compile a catalog into a binary image file.
+
+    The file is written next to the target and renamed over it, so processes
+    that still have the old image mapped keep a consistent view.
+
+    Parameters:
+    - database: Catalog as {brand: [phone rows]}, e.g. MOBILE_DATABASE
+    - path: Image file to write
+
+    Returns:
+    - Number of records written
+    """
+    if sys.byteorder != "little":
+        raise ValueError("Catalog images are little-endian; build them on a little-endian machine")
+    strings = bytearray()
+    string_refs = {}
+
+    def ref(text):
+        data = text.encode("utf-8")
+        if data not in string_refs:
+            string_refs[data] = (len(strings), len(data))
+            strings.extend(data)
+        return string_refs[data]
+
+    records = bytearray()
+    brands = bytearray()
+    haystack = bytearray()
+    starts = []
+    skus = []
+    for brand, models in database.items():
+        brands.extend(BRAND.pack(*ref(brand), len(starts), len(models)))
+        for phone in models:
+            sku = f"{brand}|{phone['model']}|{phone['storage']}|{phone['color']}"
+            values = dict(phone, brand=brand, sku=sku)
+            fields = []
+            for field in RECORD_FIELDS:
+                fields.extend(ref(values[field]))
+            records.extend(RECORD.pack(*fields, phone["price"]))
+            starts.append(len(haystack))
+            haystack.extend(_search_text(brand, phone).encode("utf-8"))
+            skus.append(sku.encode("utf-8"))
+
+    # Open-addressing hash table of record numbers, at most half full
+    slots = 1
+    while slots < 2 * len(skus):
+        slots *= 2
+    table = [EMPTY_SLOT] * slots
+    for index, sku in enumerate(skus):
+        slot = _sku_hash(sku) & (slots - 1)
+        while table[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = index
+
+    sections = []
+    offset = HEADER.size
+    for block in (strings, records, struct.pack(f"<{slots}I", *table), brands, haystack,
+                  struct.pack(f"<{len(starts)}I", *starts)):
+        offset = _align(offset)
+        sections.append((offset, block))
+        offset += len(block)
+
+    (strings_off, _), (records_off, _), (sku_off, _), (brands_off, _), (hay_off, _), (starts_off, _) = sections
+    header = HEADER.pack(
+        MAGIC, VERSION, 0, len(starts),
+        strings_off, records_off, sku_off, slots, brands_off, len(database), hay_off, len(haystack), starts_off
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for section_off, block in sections:
+            f.write(b"\0" * (section_off - f.tell()))
+            f.write(block)
+    os.replace(tmp_path, path)
+    return len(starts)
+
+
+class CatalogImage:
+    """
+    Read-only view of a catalog image.
+
+    Records are decoded on demand from the mapped file; lookups return the
+    same row dictionaries as mobile_data (with 'brand', without stock).
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.count, self.strings_off, self.records_off, sku_off, self.sku_slots,
+         brands_off, brand_count, self.hay_off, hay_len, starts_off) = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} catalog image")
+        if sys.byteorder != "little":
+            raise ValueError("Catalog images are little-endian")
+        view = memoryview(self.mm)
+        self.sku_table = view[sku_off:sku_off + 4 * self.sku_slots].cast("I")
+        self.starts = view[starts_off:starts_off + 4 * self.count].cast("I")
+        self.hay_end = self.hay_off + hay_len
+        self.brands = {}
+        for i in range(brand_count):
+            name_off, name_len, first, count = BRAND.unpack_from(self.mm, brands_off + i * BRAND.size)
+            self.brands[self._string(name_off, name_len)] = (first, count)
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        """Decode record number `index` into a catalog row dictionary."""
+        values = RECORD.unpack_from(self.mm, self.records_off + index * RECORD.size)
+        row = {field: self._string(values[2 * i], values[2 * i + 1]) for i, field in enumerate(RECORD_FIELDS[:-1])}
+        row["price"] = values[-1]
+        return row
+
+    def find(self, sku):
+        """Return the record number of a SKU, or None."""
+        sku_bytes = sku.encode("utf-8")
+        mask = self.sku_slots - 1
+        slot = _sku_hash(sku_bytes) & mask
+        sku_field = 2 * RECORD_FIELDS.index("sku")
+        while True:
+            index = self.sku_table[slot]
+            if index == EMPTY_SLOT:
+                return None
+            values = RECORD.unpack_from(self.mm, self.records_off + index * RECORD.size)
+            offset, length = values[sku_field], values[sku_field + 1]
+            start = self.strings_off + offset
+            if length == len(sku_bytes) and self.mm[start:start + length] == sku_bytes:
+                return index
+            slot = (slot + 1) & mask
+
+    def get(self, sku):
+        """Return the catalog row of a SKU, or None."""
+        index = self.find(sku)
+        return None if index is None else self.record(index)
+
+    def brand_names(self):
+        return list(self.brands)
+
+    def brand_records(self, brand):
+        """Return the catalog rows of one brand, in catalog order."""
+        first, count = self.brands.get(brand, (0, 0))
+        return [self.record(index) for index in range(first, first + count)]
+
+    def search(self, query):
+        """
+        Find rows whose brand, model, description or color contains the query.
+
+        Plain substring matching over the mapped search block; the app's
+        ranked, typo-tolerant search is catalog_search.
+        """
+        needle = query.lower().encode("utf-8")
+        indexes = []
+        position = self.mm.find(needle, self.hay_off, self.hay_end)
+        while position != -1:
+            index = bisect_right(self.starts, position - self.hay_off) - 1
+            indexes.append(index)
+            # Continue after this record, which has matched already
+            if index + 1 >= self.count:
+                break
+            position = self.mm.find(needle, self.hay_off + self.starts[index + 1], self.hay_end)
+        return [self.record(index) for index in indexes]
+
+    def close(self):
+        self.sku_table.release()
+        self.starts.release()
+        self.mm.close()
+
+    def _string(self, offset, length):
+        start = self.strings_off + offset
+        return self.mm[start:start + length].decode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def get_catalog_image():
+    """Return the catalog image named by CATALOG_IMAGE_PATH, or None when it is not set."""
+    path = os.environ.get("CATALOG_IMAGE_PATH")
+    return CatalogImage(path) if path else None
+
+
+def main():
+    from mobile_data import MOBILE_DATABASE
+
+    parser = argparse.ArgumentParser(description="Compile the phone catalog into a binary image.")
+    parser.add_argument("output", help="Image file to write")
+    args = parser.parse_args()
+    count = build_catalog_image(MOBILE_DATABASE, args.output)
+    print(f"Wrote {count} records to {args.output} ({os.path.getsize(args.output):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
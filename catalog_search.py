@@ -0,0 +1,211 @@
+"""
+Typo-tolerant, ranked search over the phone catalog.
+Catalog text is split into words. Each distinct word gets a posting list of the catalog
+entries it appears in, weighted by field so that a match in the model name counts more
+than one in the description. A query word is matched to catalog words exactly, as a
+prefix, or within a small edit distance; candidates for the edit distance check come
+from a trigram index over the vocabulary, so "galxy" finds "galaxy" without comparing
+it to every word. Words with digits ("s23", "128gb") are never matched by edit distance,
+since one edit there names a different phone. The last query word may be unfinished, so
+it is matched as a prefix at any length ("galaxy s"). Entries must match every query
+word; only the best `limit` of them are collected, with a heap.
+
+"128gb" is also indexed as its unit "gb", and "pro+" as "+", so those can be searched
+on their own. Variants with the same text in every field are indexed once.
+"""
+import heapq
+import re
+from bisect import bisect_left
+
+# Weight of a match in each searchable field
+FIELD_WEIGHTS = {"model": 3.0, "brand": 2.0, "storage": 1.5, "color": 1.5, "description": 1.0}
+
+DEFAULT_LIMIT = 24
+
+# Score of a prefix match ("gal" for "galaxy") relative to an exact one, before length scaling
+PREFIX_SCORE = 0.5
+
+_WORD = re.compile(r"[a-z0-9]+\+?|\+")
+_UNIT = re.compile(r"[0-9]+([a-z]+)\+?")
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def _index_words(text):
+    """Words of catalog text, plus the unit of "128gb" and the "+" of "pro+"."""
+    for word in _words(text):
+        yield word
+        unit = _UNIT.fullmatch(word)
+        if unit:
+            yield unit.group(1)
+        if len(word) > 1 and word.endswith("+"):
+            yield "+"
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(word):
+    """Typos tolerated in a query word: none for short words or ones with digits, more for long ones."""
+    if len(word) <= 3 or any(c.isdigit() for c in word):
+        return 0
+    return 1 if len(word) <= 6 else 2
+
+
+def edit_distance(a, b, limit):
+    """
+    Return the optimal string alignment distance between two words, or limit + 1
+    once it is certain to exceed `limit`.
+
+    Insertions, deletions, substitutions and swaps of adjacent letters each count as one edit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class CatalogSearchIndex:
+    """
+    Inverted index over catalog entries.
+
+    Entries are given in catalog order as dictionaries with 'brand', 'model',
+    'description' and 'color'; search returns their positions in that order,
+    so the caller maps them back to rows (list items or catalog image records).
+    """
+    def __init__(self, entries):
+        self.docs = []                 # doc id -> positions of the entries sharing its text
+        self.model_lengths = []        # doc id -> number of words in the model name
+        self.terms = {}                # word -> term id
+        self.postings = []             # term id -> {doc id: field weight}
+        doc_ids = {}
+        for position, entry in enumerate(entries):
+            text = tuple(entry[field] for field in FIELD_WEIGHTS)
+            doc = doc_ids.get(text)
+            if doc is not None:
+                self.docs[doc].append(position)
+                continue
+            doc = doc_ids[text] = len(self.docs)
+            self.docs.append([position])
+            self.model_lengths.append(len(_words(entry["model"])))
+            for field, weight in FIELD_WEIGHTS.items():
+                for word in _index_words(entry[field]):
+                    term = self.terms.get(word)
+                    if term is None:
+                        term = self.terms[word] = len(self.postings)
+                        self.postings.append({})
+                    postings = self.postings[term]
+                    if postings.get(doc, 0) < weight:
+                        postings[doc] = weight
+
+        self.vocabulary = sorted(self.terms)
+        self.trigrams = {}
+        for word, term in self.terms.items():
+            for gram in _trigrams(word):
+                self.trigrams.setdefault(gram, []).append(term)
+        self.words = [None] * len(self.terms)
+        for word, term in self.terms.items():
+            self.words[term] = word
+
+    def __len__(self):
+        return sum(len(positions) for positions in self.docs)
+
+    def expand(self, word, last=False):
+        """
+        Return the catalog words a query word matches.
+
+        Parameters:
+        - word: Lowercase query word
+        - last: The word is the last of the query and may still be being typed,
+          so it is matched as a prefix however short it is
+
+        Returns:
+        - Dictionary of term id -> similarity, 1.0 for an exact match
+        """
+        matches = {}
+        term = self.terms.get(word)
+        if term is not None:
+            matches[term] = 1.0
+        # Words the query is a prefix of, so results appear while typing
+        if last or len(word) >= 2:
+            i = bisect_left(self.vocabulary, word)
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(word):
+                other = self.vocabulary[i]
+                if other != word:
+                    matches[self.terms[other]] = PREFIX_SCORE + PREFIX_SCORE * len(word) / len(other)
+                i += 1
+        # Words within the edit limit; by the q-gram lemma they share enough trigrams
+        limit = _max_edits(word)
+        if limit:
+            grams = _trigrams(word)
+            shared = {}
+            for gram in grams:
+                for term in self.trigrams.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            needed = max(1, len(grams) - 3 * limit)
+            for term, count in shared.items():
+                if count < needed or term in matches:
+                    continue
+                other = self.words[term]
+                distance = edit_distance(word, other, limit)
+                if distance <= limit:
+                    matches[term] = 1.0 - distance / (max(len(word), len(other)) + 1)
+        return matches
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Rank catalog entries for a query.
+
+        Parameters:
+        - query: Free text, e.g. "galxy s23", "iphne 15 blue" or "redmi n"
+        - limit: Maximum number of entries to return
+
+        Returns:
+        - Positions of the best matching entries, best first
+        """
+        words = _words(query)
+        if not words or limit <= 0:
+            return []
+        last = words[-1]
+        per_word = []
+        for word in dict.fromkeys(words):
+            scores = {}
+            for term, similarity in self.expand(word, last=word == last).items():
+                for doc, weight in self.postings[term].items():
+                    score = similarity * weight
+                    if scores.get(doc, 0) < score:
+                        scores[doc] = score
+            if not scores:
+                return []
+            per_word.append(scores)
+
+        # Every word must match; start from the rarest
+        per_word.sort(key=len)
+        totals = dict(per_word[0])
+        for scores in per_word[1:]:
+            totals = {doc: total + scores[doc] for doc, total in totals.items() if doc in scores}
+            if not totals:
+                return []
+
+        # Ties go to the shorter model name, then to catalog order
+        model_lengths = self.model_lengths
+        best = heapq.nlargest(limit, totals, key=lambda doc: (totals[doc], -model_lengths[doc], -doc))
+        positions = []
+        for doc in best:
+            positions.extend(self.docs[doc])
+        return positions[:limit]
@@ -0,0 +1,331 @@
+"""
+Customer directory for the mobile shop invoice generator.
+Remembers the details of every customer billed, keyed by mobile number, so checkout can
+fill in a returning customer's name, address, email and GSTIN from the first few digits
+of their phone number or the first letters of their name.
+
+Lookups use sorted (key, phone) indexes searched with bisect, so a prefix query costs
+O(log n + matches) however many customers are stored. The directory is persisted as an
+append-only JSON Lines file; the latest record for a phone number wins on load. Every
+process using the same file appends under an exclusive file lock and reads the lines
+others appended before each lookup, so the app and the HTTP service see each other's
+customers.
+
+Build the directory from an invoice export with:
+    python customer_directory.py invoices.jsonl --directory customers.jsonl
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+from validation import normalize_phone
+
+CUSTOMER_FIELDS = ("name", "phone", "address", "email", "gstin")
+# Used by get_customer_directory() when CUSTOMER_DIRECTORY_PATH is not set
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "customers.jsonl")
+# Catching up with more appended records than this rebuilds the indexes instead of inserting each
+REBUILD_THRESHOLD = 256
+
+# Highest code point, used to bound a prefix range in the sorted indexes
+_PREFIX_END = "\U0010ffff"
+
+
+def _name_keys(name):
+    """Return the name index keys of a customer: the full name and the name from each later word."""
+    words = name.lower().split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+def _prefix_range(index, prefix, limit):
+    """Return up to `limit` phones whose index key starts with `prefix`."""
+    start = bisect_left(index, (prefix,))
+    end = bisect_left(index, (prefix + _PREFIX_END,), start)
+    return [phone for _, phone in index[start:min(end, start + limit)]]
+
+
+class CustomerDirectory:
+    """
+    Customer records with prefix lookup on phone number and name.
+
+    Records are dictionaries with the keys in CUSTOMER_FIELDS. The phone index
+    holds one (phone, phone) entry per customer; the name index holds one
+    (key, phone) entry per word of the name, so "kum" finds "Ravi Kumar".
+
+    With a path, the file is read up to its last complete line and then
+    followed: each call first applies the records other processes appended
+    since, and reloads it in full when a compaction has replaced it.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.customers = {}
+        self.phone_index = []
+        self.name_index = []
+        # Identity of the file read so far and the byte offset after its last complete line
+        self._file_id = None
+        self._offset = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._refresh()
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return len(self.customers)
+
+    def get(self, phone):
+        """Return the record of a mobile number, or None when the customer is unknown."""
+        phone = normalize_phone(phone)
+        with self.lock:
+            self._refresh()
+            customer = self.customers.get(phone)
+            return dict(customer) if customer else None
+
+    def upsert(self, customer):
+        """
+        Add a customer or update their details.
+
+        Parameters:
+        - customer: Dictionary with 'name', 'phone' and optional 'address', 'email', 'gstin'
+
+        Returns:
+        - The stored record, or None when the phone number is not a valid mobile number
+        """
+        record = self._record(customer)
+        if record is None:
+            return None
+        with self.lock, self._locked_file() as f:
+            self._refresh()
+            if self._put(record):
+                self._append(f, [record])
+            return dict(record)
+
+    def record_invoice(self, invoice_data):
+        """Add or update the customer of an Invoice.to_dict() record."""
+        return self.upsert(_invoice_customer(invoice_data))
+
+    def import_customers(self, customers):
+        """
+        Add or update many customers at once, e.g. from an invoice export.
+
+        The indexes are rebuilt once at the end instead of being updated per
+        record, so a large import takes O(n log n) rather than O(n^2).
+
+        Parameters:
+        - customers: Iterable of customer dictionaries; later records win
+
+        Returns:
+        - Tuple of (records stored or updated, records skipped for an invalid phone)
+        """
+        changed = {}
+        skipped = 0
+        with self.lock, self._locked_file() as f:
+            self._refresh()
+            for customer in customers:
+                record = self._record(customer)
+                if record is None:
+                    skipped += 1
+                elif self.customers.get(record["phone"]) != record:
+                    self.customers[record["phone"]] = changed[record["phone"]] = record
+            self._rebuild_indexes()
+            if changed:
+                self._append(f, changed.values())
+        return len(changed), skipped
+
+    def search(self, query, limit=8):
+        """
+        Find customers whose phone number or name starts with the query.
+
+        Parameters:
+        - query: Leading digits of a phone number, or the start of a name or of a word in it
+        - limit: Maximum number of results
+
+        Returns:
+        - List of customer records, phone matches first
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        digits = query.translate(str.maketrans("", "", " -+()"))
+        with self.lock:
+            self._refresh()
+            if digits.isdigit():
+                # Accept a typed +91 or 0 prefix
+                for prefix in ("91", "0"):
+                    if digits.startswith(prefix) and len(digits) > len(prefix) and digits[len(prefix)] in "6789":
+                        digits = digits[len(prefix):]
+                        break
+                phones = _prefix_range(self.phone_index, digits, limit)
+            else:
+                phones = list(dict.fromkeys(_prefix_range(self.name_index, query.lower(), limit * 4)))[:limit]
+            return [dict(self.customers[phone]) for phone in phones]
+
+    def _record(self, customer):
+        phone = normalize_phone(customer.get("phone"))
+        if phone is None:
+            return None
+        record = {field: (customer.get(field) or "").strip() for field in CUSTOMER_FIELDS}
+        record["phone"] = phone
+        record["gstin"] = record["gstin"].upper()
+        return record
+
+    def _put(self, record):
+        """Store a record and update the indexes; returns False when nothing changed."""
+        phone = record["phone"]
+        old = self.customers.get(phone)
+        if old == record:
+            return False
+        if old is None:
+            insort(self.phone_index, (phone, phone))
+            old_keys = set()
+        else:
+            old_keys = _name_keys(old["name"])
+        new_keys = _name_keys(record["name"])
+        for key in old_keys - new_keys:
+            del self.name_index[bisect_left(self.name_index, (key, phone))]
+        for key in new_keys - old_keys:
+            insort(self.name_index, (key, phone))
+        self.customers[phone] = record
+        return True
+
+    def _refresh(self):
+        """Apply the records appended to the file since the last call; call with self.lock held."""
+        if not self.path:
+            return
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            file_id = (stat.st_dev, stat.st_ino)
+            reload = file_id != self._file_id or stat.st_size < self._offset
+            if not reload and stat.st_size == self._offset:
+                return
+            if reload:
+                self.customers = {}
+                self._file_id, self._offset = file_id, 0
+            f.seek(self._offset)
+            data = f.read()
+        # A line without its newline is still being written, or was torn by a crash
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn line that a later append was written after
+                continue
+        if reload or len(records) > REBUILD_THRESHOLD:
+            for record in records:
+                self.customers[record["phone"]] = record
+            self._rebuild_indexes()
+        else:
+            for record in records:
+                self._put(record)
+
+    @contextlib.contextmanager
+    def _locked_file(self):
+        """
+        Open the file for appending under an exclusive lock; yields None without a path.
+
+        A compaction may replace the file while this waits for the lock, so the
+        open file is checked to still be the one at the path.
+        """
+        if not self.path:
+            yield None
+            return
+        while True:
+            f = open(self.path, "ab")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            stat = os.fstat(f.fileno())
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current and (current.st_dev, current.st_ino) == (stat.st_dev, stat.st_ino):
+                break
+            f.close()
+        try:
+            yield f
+        finally:
+            # Closing the file releases the lock
+            f.close()
+
+    def _append(self, f, records):
+        """Append records under the lock held by _locked_file; call after _refresh."""
+        if f is None:
+            return
+        data = b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+        if os.fstat(f.fileno()).st_size > self._offset:
+            # Keep a torn last line left by a crashed writer apart from these records
+            data = b"\n" + data
+        f.write(data)
+        f.flush()
+        self._offset = os.fstat(f.fileno()).st_size
+
+    def _rebuild_indexes(self):
+        # Sorting once is much faster than inserting hundreds of thousands of entries
+        self.phone_index = sorted((phone, phone) for phone in self.customers)
+        self.name_index = sorted(
+            (key, phone) for phone, record in self.customers.items() for key in _name_keys(record["name"])
+        )
+
+    def compact(self):
+        """Rewrite the directory file with one line per customer."""
+        if not self.path:
+            return
+        # Holding the old file's lock keeps other writers from appending to it
+        # until it has been replaced
+        with self.lock, self._locked_file():
+            self._refresh()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for record in self.customers.values():
+                    f.write(json.dumps(record).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+                stat = os.fstat(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file_id, self._offset = (stat.st_dev, stat.st_ino), stat.st_size
+
+
+def _invoice_customer(invoice_data):
+    return {field: invoice_data.get(f"customer_{field}") for field in CUSTOMER_FIELDS}
+
+
+@lru_cache(maxsize=None)
+def get_customer_directory():
+    """
+    Return the process-wide customer directory.
+
+    The app and the HTTP service share it through one JSON Lines file,
+    CUSTOMER_DIRECTORY_PATH or data/customers.jsonl next to this module.
+    """
+    return CustomerDirectory(os.environ.get("CUSTOMER_DIRECTORY_PATH") or DEFAULT_PATH)
+
+
+def main():
+    from bulk_render import read_invoices
+
+    parser = argparse.ArgumentParser(description="Build the customer directory from an invoice export.")
+    parser.add_argument("input", help="JSON Lines export of invoice records")
+    parser.add_argument("--directory", required=True, help="Customer directory file to update")
+    args = parser.parse_args()
+
+    directory = CustomerDirectory(args.directory)
+    before = len(directory)
+    changed, skipped = directory.import_customers(_invoice_customer(invoice_data) for invoice_data in read_invoices(args.input))
+    directory.compact()
+    print(f"{len(directory)} customers ({len(directory) - before} new, {changed} added or updated), "
+          f"{skipped} invoices without a valid mobile number")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+e-Invoice details for B2B invoices: the IRN and the signed QR code printed on the PDF.
+The IRN (invoice reference number) is the SHA-256 hash of the seller GSTIN, financial
+year, document type and invoice number, as the invoice registration portal computes it.
+The QR code carries the key invoice fields and the IRN as a JWS token signed with a
+local HMAC-SHA256 key (E_INVOICE_SIGNING_KEY), so a scan can be checked against the key.
+
+The QR is drawn as one vector path, a rectangle per run of dark modules in a row.
+ReportLab's own encoder takes ten times as long as laying out the whole invoice, so
+encoding here uses table-driven Reed-Solomon arithmetic, per-version module layouts
+and a fixed mask pattern (every mask is valid; scanners read it from the format bits).
+Encoded codes are cached by payload, so re-rendering an invoice does not encode again.
+
+Export the e-invoice details of an invoice export with:
+    python e_invoice.py invoices.jsonl e-invoices.jsonl --workers 4
+"""
+import argparse
+import base64
+import datetime
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from reportlab.graphics.barcode.qrencoder import (
+    QRCode, QRErrorCorrectLevel, QRRSBlock, EXP_TABLE, LOG_TABLE
+)
+
+DOC_TYPE = "INV"
+
+# B2B invoices with a grand total above this carry an IRN and QR code
+DEFAULT_THRESHOLD = 0.0
+
+QR_ERROR_CORRECTION = QRErrorCorrectLevel.M
+QR_MASK_PATTERN = 0
+QR_QUIET_ZONE = 4
+QR_CACHE_SIZE = 1024
+
+# Invoices per worker task in e_invoice_batch
+CHUNK_SIZE = 50
+
+_DARK_RUN = re.compile(rb"\x01+")
+
+_JWS_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=").decode()
+
+
+def financial_year(date):
+    """Return the Indian financial year ("2026-27") of an invoice date in DD-MM-YYYY form."""
+    day = datetime.datetime.strptime(date, "%d-%m-%Y")
+    start = day.year if day.month >= 4 else day.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def compute_irn(invoice_data):
+    """Return the 64-character IRN of an invoice dictionary."""
+    canonical = f"{invoice_data['seller_gstin']}{financial_year(invoice_data['date'])}{DOC_TYPE}{invoice_data['invoice_number']}"
+    return hashlib.sha256(canonical.upper().encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_signing_key():
+    """Return the QR signing key from E_INVOICE_SIGNING_KEY, or None when it is not set."""
+    key = os.environ.get("E_INVOICE_SIGNING_KEY")
+    return key.encode("utf-8") if key else None
+
+
+def needs_e_invoice(invoice_data, threshold=None):
+    """B2B invoices (buyer has a GSTIN) above the threshold need an IRN."""
+    if threshold is None:
+        threshold = float(os.environ.get("E_INVOICE_THRESHOLD", DEFAULT_THRESHOLD))
+    return bool(invoice_data.get("customer_gstin")) and invoice_data["grand_total"] > threshold
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def sign_qr_payload(payload, key):
+    """Return `payload` as a compact JWS token signed with HMAC-SHA256."""
+    body = f"{_JWS_HEADER}.{_b64(json.dumps(payload, separators=(',', ':')).encode('utf-8'))}"
+    signature = hmac.new(key, body.encode("ascii"), hashlib.sha256).digest()
+    return f"{body}.{_b64(signature)}"
+
+
+def verify_signed_qr(token, key):
+    """
+    Check a scanned QR token against the signing key.
+
+    Returns:
+    - The signed fields, or None when the token was not signed with `key`
+    """
+    try:
+        header, payload, signature = token.split(".")
+    except ValueError:
+        return None
+    expected = hmac.new(key, f"{header}.{payload}".encode("ascii"), hashlib.sha256).digest()
+    if not hmac.compare_digest(_b64(expected), signature):
+        return None
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+def e_invoice_details(invoice_data, key=None):
+    """
+    Compute the e-invoice details of an invoice.
+
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+    - key: Signing key (default: get_signing_key())
+
+    Returns:
+    - Dictionary with 'irn' and 'signed_qr', or None when the invoice does
+      not need one or no signing key is configured
+    """
+    key = key or get_signing_key()
+    if key is None or not needs_e_invoice(invoice_data):
+        return None
+    irn = compute_irn(invoice_data)
+    items = invoice_data["items"]
+    main_item = max(items, key=lambda item: item["amount"])
+    payload = {
+        "SellerGstin": invoice_data["seller_gstin"],
+        "BuyerGstin": invoice_data["customer_gstin"],
+        "DocNo": invoice_data["invoice_number"],
+        "DocTyp": DOC_TYPE,
+        "DocDt": invoice_data["date"].replace("-", "/"),
+        "TotInvVal": round(invoice_data["grand_total"], 2),
+        "ItemCnt": len(items),
+        "MainHsnCode": main_item["hsn_code"],
+        "Irn": irn,
+        "IrnDt": f"{invoice_data['date']} {invoice_data['time']}",
+    }
+    return {"irn": irn, "signed_qr": sign_qr_payload(payload, key)}
+
+
+@lru_cache(maxsize=None)
+def _rs_table(ec_count):
+    """
+    Reed-Solomon products for blocks with `ec_count` error correction codewords.
+
+    Returns:
+    - Row per GF(256) factor: the factor times each generator polynomial
+      coefficient after the leading 1
+    """
+    poly = [1]
+    for i in range(ec_count):
+        # Multiply by (x - a^i); coefficients run from the highest power down
+        product = poly + [0]
+        for j, coefficient in enumerate(poly):
+            if coefficient:
+                product[j + 1] ^= EXP_TABLE[(LOG_TABLE[coefficient] + i) % 255]
+        poly = product
+    logs = [LOG_TABLE[coefficient] for coefficient in poly[1:]]
+    return [[0] * ec_count] + [
+        [EXP_TABLE[(log + LOG_TABLE[factor]) % 255] for log in logs] for factor in range(1, 256)
+    ]
+
+
+def _rs_remainder(data, ec_count):
+    """Error correction codewords of one block: the remainder of data * x^n by the generator."""
+    table = _rs_table(ec_count)
+    remainder = [0] * ec_count
+    for byte in data:
+        factor = byte ^ remainder[0]
+        remainder = [a ^ b for a, b in zip(remainder[1:] + [0], table[factor])]
+    return remainder
+
+
+@lru_cache(maxsize=None)
+def _rs_blocks(version):
+    return [(block.dataCount, block.totalCount - block.dataCount)
+            for block in QRRSBlock.getRSBlocks(version, QR_ERROR_CORRECTION)]
+
+
+def _qr_codewords(data):
+    """
+    Encode bytes in byte mode at the smallest version that holds them.
+
+    Returns:
+    - Tuple of (version, data and error correction codewords interleaved as the
+      QR standard places them)
+    """
+    for version in range(1, 41):
+        capacity = sum(data_count for data_count, _ in _rs_blocks(version)) * 8
+        length_bits = 8 if version < 10 else 16
+        if 4 + length_bits + 8 * len(data) <= capacity:
+            break
+    else:
+        raise ValueError("QR payload is too long")
+    # Mode indicator, character count, data, then up to four terminator bits and byte padding
+    bits = 4 + length_bits + 8 * len(data)
+    value = (((0b0100 << length_bits) | len(data)) << 8 * len(data)) | int.from_bytes(data, "big")
+    terminator = min(4, capacity - bits) + (-(bits + min(4, capacity - bits)) % 8)
+    value <<= terminator
+    bits += terminator
+    padding = bytes(itertools.islice(itertools.cycle((QRCode.PAD0, QRCode.PAD1)), (capacity - bits) // 8))
+    codewords = value.to_bytes(bits // 8, "big") + padding
+
+    data_blocks, ec_blocks = [], []
+    offset = 0
+    for data_count, ec_count in _rs_blocks(version):
+        block = codewords[offset:offset + data_count]
+        offset += data_count
+        data_blocks.append(block)
+        ec_blocks.append(_rs_remainder(block, ec_count))
+    return version, [
+        codeword for group in itertools.chain(itertools.zip_longest(*data_blocks), itertools.zip_longest(*ec_blocks))
+        for codeword in group if codeword is not None
+    ]
+
+
+@lru_cache(maxsize=None)
+def _qr_layout(version):
+    """
+    Function patterns of a QR version and where its data bits go.
+
+    Returns:
+    - Tuple of (module rows with every data bit 0 and the mask applied,
+      (column, row) of each data bit in order)
+    """
+    qr = QRCode(version, QR_ERROR_CORRECTION)
+    qr.dataCache = [0] * sum(data_count + ec_count for data_count, ec_count in _rs_blocks(version))
+    qr.makeImpl(False, QR_MASK_PATTERN)
+    return qr.modules, qr.dataPosIterator()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_modules(text):
+    """
+    Encode text as a QR code.
+
+    Returns:
+    - Tuple of (modules per side, tuple of (row, first column, length) runs of dark modules)
+    """
+    version, codewords = _qr_codewords(text.encode("utf-8"))
+    template, positions = _qr_layout(version)
+    modules = [bytearray(row) for row in template]
+    # A set data bit inverts the masked module
+    bits = bin(int.from_bytes(bytes(codewords), "big"))[2:].zfill(8 * len(codewords))
+    for (col, row), bit in zip(positions, bits):
+        if bit == "1":
+            modules[row][col] ^= 1
+    runs = tuple(
+        (r, match.start(), match.end() - match.start())
+        for r, row in enumerate(modules) for match in _DARK_RUN.finditer(row)
+    )
+    return len(modules), runs
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _qr_pdf_path(text):
+    """PDF operators filling the dark modules, in module units from the bottom-left corner."""
+    count, runs = qr_modules(text)
+    return count, " ".join(f"{c} {count - 1 - r} {length} 1 re" for r, c, length in runs) + " f"
+
+
+def draw_qr(canvas, x, y, size, text):
+    """Draw text as a vector QR code, with its quiet zone, in the square at (x, y) of side `size`."""
+    count, path = _qr_pdf_path(text)
+    box = size / (count + 2 * QR_QUIET_ZONE)
+    canvas.saveState()
+    # One path in whole module units; the transform scales it onto the page
+    canvas.transform(box, 0, 0, box, x + QR_QUIET_ZONE * box, y + QR_QUIET_ZONE * box)
+    canvas.setFillColorRGB(0, 0, 0)
+    canvas.addLiteral(path)
+    canvas.restoreState()
+
+
+def qr_svg(text, box=4):
+    """Return text as a QR code in SVG, one path of dark module runs."""
+    count, runs = qr_modules(text)
+    side = (count + 2 * QR_QUIET_ZONE) * box
+    path = "".join(
+        f"M{(c + QR_QUIET_ZONE) * box} {(r + QR_QUIET_ZONE) * box}h{length * box}v{box}h-{length * box}z"
+        for r, c, length in runs
+    )
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{side}" height="{side}" viewBox="0 0 {side} {side}">'
+            f'<rect width="{side}" height="{side}" fill="#fff"/><path d="{path}" fill="#000"/></svg>')
+
+
+def _e_invoice_chunk(invoices, key):
+    """Worker: e-invoice details and QR code SVGs of a chunk of invoices."""
+    results = []
+    for invoice_data in invoices:
+        details = e_invoice_details(invoice_data, key)
+        if details is not None:
+            details = dict(details, invoice_number=invoice_data["invoice_number"], qr_svg=qr_svg(details["signed_qr"]))
+        results.append(details)
+    return results
+
+
+def e_invoice_batch(invoices, workers=None, chunk_size=CHUNK_SIZE, key=None):
+    """
+    Compute the e-invoice details of many invoices on a pool of worker processes.
+
+    Parameters:
+    - invoices: Iterable of invoice dictionaries
+    - workers: Number of processes (default: one per CPU)
+    - chunk_size: Invoices per task
+    - key: Signing key (default: get_signing_key())
+
+    Returns:
+    - Generator of details in input order: dictionaries with 'invoice_number',
+      'irn', 'signed_qr' and 'qr_svg', or None for invoices that need no IRN
+    """
+    from bulk_render import chunked
+
+    key = key or get_signing_key()
+    if key is None:
+        raise ValueError("Set E_INVOICE_SIGNING_KEY to sign e-invoice QR codes")
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = (executor.submit(_e_invoice_chunk, chunk, key) for chunk in chunked(invoices, chunk_size))
+        # Keep a bounded number of chunks in flight so a large export is not read all at once
+        pending = list(itertools.islice(futures, 2 * workers))
+        while pending:
+            yield from pending.pop(0).result()
+            pending.extend(itertools.islice(futures, 1))
+
+
+def main():
+    from bulk_render import read_invoices
+
+    parser = argparse.ArgumentParser(description="Compute IRNs and signed QR codes for an invoice export.")
+    parser.add_argument("input", help="JSON Lines export of invoice records")
+    parser.add_argument("output", help="JSON Lines file of e-invoice details to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    if get_signing_key() is None:
+        parser.error("set E_INVOICE_SIGNING_KEY to the QR signing key")
+
+    count = 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        for details in e_invoice_batch(read_invoices(args.input), args.workers):
+            if details is not None:
+                out.write(json.dumps(details) + "\n")
+                count += 1
+    print(f"Wrote e-invoice details of {count} invoices to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+GSTR-1 export for the mobile shop invoice generator.
+Streams over stored invoice records once and writes GSTR-1 style JSON: B2B invoices
+grouped by customer GSTIN, large inter-state B2C invoices grouped by place of supply,
+other B2C sales aggregated by place of supply and rate, and an HSN-wise summary. Memory use does not grow with the number of invoices.
+
+Run with:
+    python gstr1_export.py invoices.jsonl gstr1-032025.json --period 03-2025
+"""
+import argparse
+import calendar
+import datetime
+import itertools
+import json
+import re
+import sqlite3
+
+from utils import state_code_from_gstin, get_state_name
+
+# GST unit quantity code for phones
+UQC_PIECES = "PCS"
+
+# Inter-state B2C invoices above this value are reported one by one (B2CL)
+# instead of in the B2CS totals; the limit fell from Rs. 2.5 lakh to Rs. 1 lakh
+# for supplies from August 2024. (first date, limit), newest first.
+B2CL_LIMITS = [(datetime.date(2024, 8, 1), 100000), (datetime.date.min, 250000)]
+
+PERIOD_PATTERN = re.compile(r"(0[1-9]|1[0-2])(\d{4})")
+
+
+def _round(amount):
+    return round(amount, 2)
+
+
+def _line_rate(item):
+    return item["sgst_rate"] + item["cgst_rate"] + item.get("igst_rate", 0)
+
+
+def _line_taxes(item):
+    return item.get("igst", 0), item["cgst"], item["sgst"]
+
+
+def _add(totals, key, item):
+    """Add an invoice line's quantity, taxable value and taxes to a bucket."""
+    bucket = totals.get(key)
+    if bucket is None:
+        bucket = totals[key] = [0, 0.0, 0.0, 0.0, 0.0]
+    igst, cgst, sgst = _line_taxes(item)
+    bucket[0] += item["quantity"]
+    bucket[1] += item["amount"]
+    bucket[2] += igst
+    bucket[3] += cgst
+    bucket[4] += sgst
+
+
+def place_of_supply(invoice_data):
+    """
+    Return the state code of the place of supply of an invoice.
+
+    Registered buyers are billed to the state in their GSTIN. Walk-in
+    customers take delivery at the counter, so the supply is in the seller's state.
+    """
+    if invoice_data.get("place_of_supply"):
+        return invoice_data["place_of_supply"]
+    if invoice_data.get("customer_gstin"):
+        return state_code_from_gstin(invoice_data["customer_gstin"])
+    return state_code_from_gstin(invoice_data["seller_gstin"])
+
+
+def parse_period(period):
+    """
+    Parse a GSTR-1 return period.
+
+    Parameters:
+    - period: Return period as 'MMYYYY'
+
+    Returns:
+    - (first day, last day) of the period as datetime.date
+
+    Raises:
+    - ValueError: If the period is not a month in that form
+    """
+    match = PERIOD_PATTERN.fullmatch(period)
+    if not match:
+        raise ValueError(f"Return period must be MMYYYY, e.g. 032025, not {period!r}")
+    month, year = int(match.group(1)), int(match.group(2))
+    if year < 1:
+        raise ValueError(f"Return period has no valid year: {period!r}")
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def b2cl_limit(date):
+    """Return the invoice value above which an inter-state B2C invoice dated date is reported in B2CL."""
+    return next(limit for first_day, limit in B2CL_LIMITS if date >= first_day)
+
+
+def _by_rate(invoice_data):
+    """Total an invoice's lines per tax rate, sorted by rate."""
+    by_rate = {}
+    for item in invoice_data["items"]:
+        _add(by_rate, _line_rate(item), item)
+    return sorted(by_rate.items())
+
+
+def _b2b_record(invoice_data, pos):
+    """Build the GSTR-1 'inv' entry for a B2B invoice, with lines grouped by rate."""
+    return {
+        "inum": invoice_data["invoice_number"],
+        "idt": invoice_data["date"],
+        "val": _round(invoice_data["grand_total"]),
+        "pos": pos,
+        "rchrg": "N",
+        "inv_typ": "R",
+        "itms": [
+            {"num": i + 1, "itm_det": {
+                "rt": rate, "txval": _round(txval),
+                "iamt": _round(igst), "camt": _round(cgst), "samt": _round(sgst), "csamt": 0
+            }}
+            for i, (rate, (_, txval, igst, cgst, sgst)) in enumerate(_by_rate(invoice_data))
+        ],
+    }
+
+
+def _b2cl_record(invoice_data):
+    """Build the GSTR-1 'inv' entry for a large inter-state B2C invoice, with lines grouped by rate."""
+    return {
+        "inum": invoice_data["invoice_number"],
+        "idt": invoice_data["date"],
+        "val": _round(invoice_data["grand_total"]),
+        "itms": [
+            {"num": i + 1, "itm_det": {"rt": rate, "txval": _round(txval), "iamt": _round(igst), "csamt": 0}}
+            for i, (rate, (_, txval, igst, _, _)) in enumerate(_by_rate(invoice_data))
+        ],
+    }
+
+
+def _write_groups(out, rows, key):
+    """Write spilled records, sorted by group, as a JSON list of {key: group, "inv": [...]} entries."""
+    out.write("[")
+    for i, (group_key, group) in enumerate(itertools.groupby(rows, key=lambda row: row[0])):
+        out.write(f'{", " if i else ""}{{{json.dumps(key)}: {json.dumps(group_key)}, "inv": [')
+        for j, (_, record) in enumerate(group):
+            out.write(f'{", " if j else ""}{record}')
+        out.write("]}")
+    out.write("]")
+
+
+def export_gstr1(invoices, out, seller_gstin, period):
+    """
+    Write a GSTR-1 JSON document for a return period.
+
+    B2B and B2CL invoices are spilled to a temporary on-disk SQLite table and
+    read back sorted by customer GSTIN or place of supply, so they can be
+    grouped without holding them in memory; B2CS and HSN totals are kept per
+    bucket. Only invoices whose date falls in the period are included.
+
+    Parameters:
+    - invoices: Iterable of Invoice.to_dict() records, e.g. streamed from an export
+    - out: Text file object the JSON is written to
+    - seller_gstin: GSTIN of the filing business
+    - period: Return period as 'MMYYYY'
+
+    Returns:
+    - Summary dictionary with invoice counts, totals, and HSN totals per
+      (HSN, rate, state) for reconciliation
+
+    Raises:
+    - ValueError: If the period is malformed
+    """
+    first_day, last_day = parse_period(period)
+    seller_state = state_code_from_gstin(seller_gstin)
+
+    b2cs = {}   # (supply type, place of supply, rate) -> totals
+    hsn = {}    # (HSN, rate, place of supply) -> totals
+    counts = {"invoices": 0, "b2b": 0, "b2c": 0, "b2cl": 0, "skipped": 0}
+    taxable_value = tax = 0.0
+
+    # An empty path gives a private temporary database on disk
+    spill = sqlite3.connect("")
+    try:
+        # section is 'b2b' (grouped by customer GSTIN) or 'b2cl' (by place of supply)
+        spill.execute("CREATE TABLE invoices (section TEXT, grp TEXT, seq INTEGER, record TEXT)")
+        for seq, invoice_data in enumerate(invoices):
+            date = datetime.datetime.strptime(invoice_data["date"], "%d-%m-%Y").date()
+            if not first_day <= date <= last_day:
+                counts["skipped"] += 1
+                continue
+            counts["invoices"] += 1
+            pos = place_of_supply(invoice_data)
+            supply_type = "INTRA" if pos == seller_state else "INTER"
+            b2b = bool(invoice_data.get("customer_gstin"))
+            b2cl = not b2b and supply_type == "INTER" and invoice_data["grand_total"] > b2cl_limit(date)
+
+            for item in invoice_data["items"]:
+                rate = _line_rate(item)
+                _add(hsn, (item["hsn_code"], rate, pos), item)
+                if not b2b and not b2cl:
+                    _add(b2cs, (supply_type, pos, rate), item)
+                taxable_value += item["amount"]
+                tax += sum(_line_taxes(item))
+
+            if b2b:
+                counts["b2b"] += 1
+                spill.execute("INSERT INTO invoices VALUES ('b2b', ?, ?, ?)", (
+                    invoice_data["customer_gstin"], seq, json.dumps(_b2b_record(invoice_data, pos))
+                ))
+            else:
+                counts["b2c"] += 1
+            if b2cl:
+                counts["b2cl"] += 1
+                spill.execute("INSERT INTO invoices VALUES ('b2cl', ?, ?, ?)", (
+                    pos, seq, json.dumps(_b2cl_record(invoice_data))
+                ))
+
+        out.write("{")
+        out.write(f'"gstin": {json.dumps(seller_gstin)}, "fp": {json.dumps(period)}, "b2b": ')
+        _write_groups(out, spill.execute(
+            "SELECT grp, record FROM invoices WHERE section = 'b2b' ORDER BY grp, seq"
+        ), "ctin")
+        out.write(', "b2cl": ')
+        _write_groups(out, spill.execute(
+            "SELECT grp, record FROM invoices WHERE section = 'b2cl' ORDER BY grp, seq"
+        ), "pos")
+        out.write(", ")
+    finally:
+        spill.close()
+
+    out.write('"b2cs": ')
+    json.dump([
+        {"sply_ty": supply_type, "pos": pos, "typ": "OE", "rt": rate, "txval": _round(txval),
+         "iamt": _round(igst), "camt": _round(cgst), "samt": _round(sgst), "csamt": 0}
+        for (supply_type, pos, rate), (_, txval, igst, cgst, sgst) in sorted(b2cs.items())
+    ], out)
+
+    # The return's HSN table is per (HSN, rate); the per-state split is kept for the summary
+    hsn_by_rate = {}
+    for (hsn_code, rate, _), totals in hsn.items():
+        bucket = hsn_by_rate.setdefault((hsn_code, rate), [0, 0.0, 0.0, 0.0, 0.0])
+        for i, value in enumerate(totals):
+            bucket[i] += value
+    out.write(', "hsn": {"data": ')
+    json.dump([
+        {"num": i + 1, "hsn_sc": hsn_code, "uqc": UQC_PIECES, "qty": qty, "rt": rate,
+         "txval": _round(txval), "iamt": _round(igst), "camt": _round(cgst), "samt": _round(sgst), "csamt": 0}
+        for i, ((hsn_code, rate), (qty, txval, igst, cgst, sgst)) in enumerate(sorted(hsn_by_rate.items()))
+    ], out)
+    out.write("}}")
+
+    return dict(counts, taxable_value=_round(taxable_value), tax=_round(tax), hsn_by_state=[
+        {"hsn_code": hsn_code, "rate": rate, "state_code": pos, "state": get_state_name(pos),
+         "quantity": qty, "taxable_value": _round(txval), "tax": _round(igst + cgst + sgst)}
+        for (hsn_code, rate, pos), (qty, txval, igst, cgst, sgst) in sorted(hsn.items())
+    ])
+
+
+def main():
+    from bulk_render import read_invoices
+
+    parser = argparse.ArgumentParser(description="Export GSTR-1 JSON from an invoice export.")
+    parser.add_argument("input", help="JSON Lines export of invoice records")
+    parser.add_argument("output", help="GSTR-1 JSON file to write")
+    parser.add_argument("--period", required=True, help="Return period as MM-YYYY")
+    parser.add_argument("--gstin", default=None, help="Seller GSTIN (default: from the first invoice)")
+    args = parser.parse_args()
+
+    period = args.period.replace("-", "")
+    try:
+        parse_period(period)
+    except ValueError:
+        parser.error(f"--period must be MM-YYYY, e.g. 03-2025, not {args.period!r}")
+
+    seller_gstin = args.gstin
+    invoices = read_invoices(args.input)
+    if seller_gstin is None:
+        first = next(invoices, None)
+        if first is None:
+            parser.error("The export contains no invoices")
+        seller_gstin = first["seller_gstin"]
+        invoices = itertools.chain([first], invoices)
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        summary = export_gstr1(invoices, out, seller_gstin, period)
+
+    print(f"{summary['invoices']} invoices ({summary['b2b']} B2B, {summary['b2c']} B2C, "
+          f"{summary['b2cl']} of them B2CL) for {args.period}, "
+          f"{summary['skipped']} outside the period")
+    print(f"Taxable value {summary['taxable_value']:,.2f}, tax {summary['tax']:,.2f}")
+    for row in summary["hsn_by_state"]:
+        print(f"  HSN {row['hsn_code']} @ {row['rate']}% in {row['state']}: "
+              f"{row['quantity']} units, {row['taxable_value']:,.2f} + {row['tax']:,.2f} tax")
+
+
+if __name__ == "__main__":
+    main()
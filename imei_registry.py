@@ -0,0 +1,396 @@
+"""
+Registry of the handsets sold, by IMEI.
+Warranty and theft queries arrive with an IMEI; the registry answers which invoice and
+line sold that unit. Sales are appended to a JSON Lines file, and a hash index file maps
+each IMEI to the position of its record. The index is an open-addressing table of
+fixed-width slots that is memory-mapped, so a lookup is one probe sequence and one read
+however many units have been sold, and opening the registry reads nothing up front.
+The table doubles when it is half full.
+
+Layout of a registry directory:
+    units.jsonl     one record per unit sold, in sale order
+    index.bin       header, then slots of (IMEI + 1, record offset); 0 marks an empty slot
+
+The records are the source of truth: a missing or damaged index is rebuilt from them,
+and records written after the index was last updated are indexed on open.
+
+Several processes (the app and the HTTP service) can share a registry directory. Writes
+take an exclusive flock on the directory and lookups a shared one. The index is mapped
+shared, so slots written by another process are seen at once; when another process
+has grown or rebuilt the index, which replaces the file, it is mapped again.
+
+Look units up with:
+    python imei_registry.py registry-dir 490154203237518
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+
+from validation import normalize_imei
+
+MAGIC = b"IMEI"
+VERSION = 1
+
+# magic, version, flags, slot count, used slots, bytes of units.jsonl indexed
+HEADER = struct.Struct("<4sHHQQQ")
+# Flag set on an index file just before a new one is renamed over it, so other
+# processes know to map the file again without checking the path on every call
+RETIRED = 1
+SLOT = struct.Struct("<QQ")
+
+INITIAL_SLOTS = 1024
+UNITS_FILE = "units.jsonl"
+INDEX_FILE = "index.bin"
+# Used by get_imei_registry() when IMEI_REGISTRY_DIR is not set
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "imei")
+
+_MASK64 = (1 << 64) - 1
+
+
+def _slot_of(key, slots):
+    # Fibonacci hashing spreads consecutive IMEIs (one box of handsets) across the table
+    return ((key * 0x9E3779B97F4A7C15) & _MASK64) >> (64 - (slots.bit_length() - 1))
+
+
+class ImeiRegistry:
+    """
+    IMEI to invoice line index backed by a records file and a mapped hash table.
+
+    With no directory the registry lives in memory, like the other stores
+    when their path is not configured.
+    """
+    def __init__(self, directory=None, durable=True):
+        self.directory = directory
+        self.durable = durable
+        self.lock = threading.Lock()
+        self.memory = {} if directory is None else None
+        self.index = None
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.units_path = os.path.join(directory, UNITS_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock_fd = os.open(directory, os.O_RDONLY)
+        self.units = open(self.units_path, "a+b")
+        with self._locked(exclusive=True):
+            self._truncate_partial_record()
+            self._open_index()
+
+    def lookup(self, imei):
+        """
+        Find the sale of a unit.
+
+        Parameters:
+        - imei: IMEI as entered (separators are ignored)
+
+        Returns:
+        - Dictionary with 'imei', 'invoice_number', 'line', 'sku', 'date' and
+          'branch', or None when the unit was not sold here
+        """
+        digits = normalize_imei(imei)
+        if digits is None:
+            return None
+        with self._locked(exclusive=False):
+            if self.memory is not None:
+                return self.memory.get(digits)
+            offset = self._find(int(digits) + 1)[1]
+            if offset is None:
+                return None
+            return json.loads(self._read_record(offset))
+
+    def sold(self, imeis):
+        """Return the IMEIs among `imeis` that are already registered."""
+        return [imei for imei in imeis if self.lookup(imei) is not None]
+
+    def register_invoice(self, invoice_data, branch=None):
+        """
+        Register every unit of an invoice.
+
+        Nothing is written if any of the invoice's IMEIs is already registered
+        or appears on two lines.
+
+        Parameters:
+        - invoice_data: Dictionary from Invoice.to_dict(), lines with 'imeis'
+        - branch: Branch that sold the units
+
+        Returns:
+        - Number of units registered
+        """
+        records = []
+        for line, item in enumerate(invoice_data["items"], start=1):
+            for imei in item.get("imeis") or ():
+                records.append({
+                    "imei": normalize_imei(imei) or imei,
+                    "invoice_number": invoice_data["invoice_number"],
+                    "line": line,
+                    "sku": f"{item['brand']}|{item['model']}|{item['storage']}|{item['color']}",
+                    "date": invoice_data["date"],
+                    "branch": branch,
+                })
+        imeis = [record["imei"] for record in records]
+        if len(set(imeis)) != len(imeis):
+            raise ValueError("An IMEI appears more than once on the invoice")
+        with self._locked(exclusive=True):
+            if self.memory is None:
+                # Bring in what a writer that crashed mid-sale left behind
+                self._truncate_partial_record()
+                self._catch_up()
+                taken = [imei for imei in imeis if self._find(int(imei) + 1)[1] is not None]
+            else:
+                taken = [imei for imei in imeis if imei in self.memory]
+            if taken:
+                raise ValueError(f"IMEI already sold: {', '.join(taken)}")
+            if self.memory is not None:
+                self.memory.update((record["imei"], record) for record in records)
+                return len(records)
+            self.units.seek(0, os.SEEK_END)
+            offsets = []
+            for record in records:
+                offsets.append(self.units.tell())
+                self.units.write((json.dumps(record) + "\n").encode("utf-8"))
+            self.units.flush()
+            if self.durable:
+                os.fsync(self.units.fileno())
+            # The records are durable now; the index can always be brought up to date from them
+            for record, offset in zip(records, offsets):
+                self._insert(int(record["imei"]) + 1, offset)
+            self._write_header(self.units.tell())
+        return len(records)
+
+    def __len__(self):
+        with self._locked(exclusive=False):
+            if self.memory is not None:
+                return len(self.memory)
+            return self.used
+
+    def rebuild(self):
+        """Rebuild the index from the records file, e.g. after the index was lost."""
+        with self._locked(exclusive=True):
+            self._new_index()
+
+    def close(self):
+        if self.memory is not None:
+            return
+        self._close_index()
+        self.units.close()
+        os.close(self.lock_fd)
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        """
+        Hold the thread lock and, on disk, the directory lock, following any
+        index file another process has put in place of the mapped one.
+        """
+        with self.lock:
+            if self.memory is not None:
+                yield
+                return
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if self.index is not None:
+                    self._refresh(exclusive)
+                yield
+            finally:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def _refresh(self, exclusive):
+        _, _, flags, self.slots, self.used, self.indexed = HEADER.unpack_from(self.index)
+        if flags & RETIRED:
+            if os.stat(self.index_path).st_ino != self.index_ino:
+                self._close_index()
+                self._map_index()
+            elif exclusive:
+                # The writer that retired this file stopped before replacing it
+                self._write_header(self.indexed)
+
+    def _read_record(self, offset):
+        # Read with pread rather than through the file's buffer, which may still
+        # hold bytes from before another process truncated and appended
+        data = b""
+        while True:
+            chunk = os.pread(self.units.fileno(), 4096, offset + len(data))
+            newline = chunk.find(b"\n")
+            if newline != -1 or not chunk:
+                return data + chunk[:newline + 1]
+            data += chunk
+
+    def _truncate_partial_record(self):
+        # A crash can leave a partly written last record; it was never indexed or confirmed
+        size = self.units.seek(0, os.SEEK_END)
+        if not size:
+            return
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            self.units.seek(position - step)
+            chunk = self.units.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            self.units.truncate(position)
+
+    def _open_index(self):
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) >= HEADER.size:
+            self._map_index()
+            magic, version, flags, slots, _, indexed = HEADER.unpack_from(self.index)
+            units_size = self.units.seek(0, os.SEEK_END)
+            if (magic == MAGIC and version == VERSION and len(self.index) == HEADER.size + slots * SLOT.size
+                    and indexed <= units_size):
+                if flags & RETIRED:
+                    # The writer that retired this file stopped before replacing it
+                    self._write_header(indexed)
+                self._catch_up()
+                return
+            self._retire_index()
+        self._new_index()
+
+    def _catch_up(self):
+        """Index the records written after the index was last updated."""
+        if self.indexed < self.units.seek(0, os.SEEK_END):
+            # Interrupted while indexing: slots may be ahead of the header's count
+            self.used = sum(
+                1 for slot in range(self.slots)
+                if SLOT.unpack_from(self.index, HEADER.size + slot * SLOT.size)[0]
+            )
+            self._index_records(self.indexed)
+
+    def _new_index(self):
+        """
+        Index every record into a new table, written beside the old one and
+        renamed over it, so other processes never see the file they have
+        mapped truncated.
+        """
+        tmp_path = self.index_path + ".tmp"
+        self._create_index(tmp_path, INITIAL_SLOTS)
+        self._retire_index()
+        os.replace(tmp_path, self.index_path)
+        self._map_index()
+        self._index_records(0)
+
+    def _create_index(self, path, slots, indexed=0):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, slots, 0, indexed))
+            f.truncate(HEADER.size + slots * SLOT.size)
+
+    def _map_index(self):
+        self.index_file = open(self.index_path, "r+b")
+        self.index_ino = os.fstat(self.index_file.fileno()).st_ino
+        self.index = mmap.mmap(self.index_file.fileno(), 0)
+        _, _, _, self.slots, self.used, self.indexed = HEADER.unpack_from(self.index)
+
+    def _close_index(self):
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+            self.index = None
+
+    def _index_records(self, start):
+        """Index the records from byte `start` of the records file to its end."""
+        self.units.seek(start)
+        offset = start
+        for line in self.units:
+            self._insert(int(json.loads(line)["imei"]) + 1, offset)
+            offset += len(line)
+        self._write_header(offset)
+
+    def _find(self, key):
+        """Return (slot, record offset) for a key, or (free slot, None)."""
+        mask = self.slots - 1
+        slot = _slot_of(key, self.slots)
+        while True:
+            stored, offset = SLOT.unpack_from(self.index, HEADER.size + slot * SLOT.size)
+            if stored == 0:
+                return slot, None
+            if stored == key:
+                return slot, offset
+            slot = (slot + 1) & mask
+
+    def _insert(self, key, offset):
+        if 2 * (self.used + 1) > self.slots:
+            self._grow()
+        slot, existing = self._find(key)
+        # Re-indexing records after a crash finds some of them already in place
+        if existing is None:
+            self.used += 1
+        SLOT.pack_into(self.index, HEADER.size + slot * SLOT.size, key, offset)
+
+    def _grow(self):
+        """Move every entry into a table twice the size, written beside the old one and renamed over it."""
+        entries = [
+            SLOT.unpack_from(self.index, HEADER.size + slot * SLOT.size) for slot in range(self.slots)
+        ]
+        slots = self.slots * 2
+        tmp_path = self.index_path + ".tmp"
+        self._create_index(tmp_path, slots, self.indexed)
+        with open(tmp_path, "r+b") as f:
+            table = mmap.mmap(f.fileno(), 0)
+            mask = slots - 1
+            used = 0
+            for key, offset in entries:
+                if key == 0:
+                    continue
+                slot = _slot_of(key, slots)
+                while SLOT.unpack_from(table, HEADER.size + slot * SLOT.size)[0]:
+                    slot = (slot + 1) & mask
+                SLOT.pack_into(table, HEADER.size + slot * SLOT.size, key, offset)
+                used += 1
+            HEADER.pack_into(table, 0, MAGIC, VERSION, 0, slots, used, self.indexed)
+            table.close()
+        self._retire_index()
+        os.replace(tmp_path, self.index_path)
+        self._map_index()
+
+    def _retire_index(self):
+        """Flag the mapped index as about to be replaced, then unmap it."""
+        if self.index is not None:
+            HEADER.pack_into(self.index, 0, MAGIC, VERSION, RETIRED, self.slots, self.used, self.indexed)
+            self._close_index()
+
+    def _write_header(self, indexed):
+        self.indexed = indexed
+        HEADER.pack_into(self.index, 0, MAGIC, VERSION, 0, self.slots, self.used, indexed)
+
+
+@lru_cache(maxsize=None)
+def get_imei_registry():
+    """
+    Return the process-wide IMEI registry.
+
+    The app and the HTTP service share it through one directory,
+    IMEI_REGISTRY_DIR or data/imei next to this module.
+    """
+    return ImeiRegistry(os.environ.get("IMEI_REGISTRY_DIR") or DEFAULT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up sold handsets by IMEI.")
+    parser.add_argument("directory", help="IMEI registry directory")
+    parser.add_argument("imeis", nargs="*", help="IMEIs to look up")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the unit records")
+    args = parser.parse_args()
+
+    registry = ImeiRegistry(args.directory)
+    if args.rebuild:
+        registry.rebuild()
+        print(f"Indexed {len(registry)} units")
+    for imei in args.imeis:
+        record = registry.lookup(imei)
+        if record is None:
+            print(f"{imei}  not sold here")
+        else:
+            print(f"{record['imei']}  invoice {record['invoice_number']} line {record['line']}  "
+                  f"{record['date']}  {record['sku']}  {record['branch'] or ''}")
+    registry.close()
+
+
+if __name__ == "__main__":
+    main()
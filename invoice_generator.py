@@ -3,11 +3,16 @@ Module for generating invoices for the mobile shop.
 Handles tax calculations and invoice item management.
 """
 import datetime
-from utils import calculate_gst, format_currency, generate_invoice_number, generate_hsn_code
+from utils import format_currency, generate_invoice_number, generate_hsn_code, state_code_from_gstin
+from tax_rules import get_tax_rate
+
+SELLER_GSTIN = "29AABCT1332L1ZA"  # Sample GSTIN
+SELLER_STATE = state_code_from_gstin(SELLER_GSTIN)
 
 class InvoiceItem:
     """Represents a single item in an invoice."""
-    def __init__(self, brand, model, storage, color, price, hsn_code, quantity=1):
+    def __init__(self, brand, model, storage, color, price, hsn_code, quantity=1,
+                 seller_state=SELLER_STATE, place_of_supply=None, imeis=None):
         self.brand = brand
         self.model = model
         self.storage = storage
@@ -15,13 +20,18 @@ class InvoiceItem:
         self.price = price  # Price per unit (before tax)
         self.quantity = quantity
         self.hsn_code = hsn_code or generate_hsn_code()
-        
-        # Calculate taxes
-        self.sgst_rate = 9  # 9% SGST
-        self.cgst_rate = 9  # 9% CGST
+        self.imeis = list(imeis or [])  # IMEI of each unit sold on this line
         
         self.amount = self.price * self.quantity
-        self.sgst, self.cgst, self.total = calculate_gst(self.amount, self.sgst_rate + self.cgst_rate)
+        self.apply_tax(seller_state, place_of_supply or seller_state)
+    
+    def apply_tax(self, seller_state, place_of_supply):
+        """Set tax rates and amounts for a supply from seller_state to place_of_supply."""
+        self.sgst_rate, self.cgst_rate, self.igst_rate = get_tax_rate(self.hsn_code, seller_state, place_of_supply)
+        self.sgst = self.amount * self.sgst_rate / 100
+        self.cgst = self.amount * self.cgst_rate / 100
+        self.igst = self.amount * self.igst_rate / 100
+        self.total = self.amount + self.sgst + self.cgst + self.igst
     
     def get_description(self):
         """Return a detailed description of the item."""
@@ -38,11 +48,14 @@ class InvoiceItem:
             "hsn_code": self.hsn_code,
             "price": self.price,
             "quantity": self.quantity,
+            "imeis": list(self.imeis),
             "amount": self.amount,
             "sgst_rate": self.sgst_rate,
             "cgst_rate": self.cgst_rate,
+            "igst_rate": self.igst_rate,
             "sgst": self.sgst,
             "cgst": self.cgst,
+            "igst": self.igst,
             "total": self.total
         }
 
@@ -64,23 +77,31 @@ class Invoice:
         self.seller_address = "123, Tech Park, Main Street, Bangalore - 560001, Karnataka"
         self.seller_phone = "9876543210"
         self.seller_email = "info@mobiletech.com"
-        self.seller_gstin = "29AABCT1332L1ZB"  # Sample GSTIN
+        self.seller_gstin = SELLER_GSTIN
+        
+        # Registered buyers are billed to their own state; walk-in sales are local
+        self.seller_state = state_code_from_gstin(self.seller_gstin)
+        self.place_of_supply = state_code_from_gstin(customer_gstin) if customer_gstin else self.seller_state
         
         # Items and calculations
         self.items = []
         self.sub_total = 0
         self.total_sgst = 0
         self.total_cgst = 0
+        self.total_igst = 0
         self.grand_total = 0
     
     def add_item(self, invoice_item):
         """Add an item to the invoice and update totals."""
+        # Taxes depend on where the invoice's supply takes place
+        invoice_item.apply_tax(self.seller_state, self.place_of_supply)
         self.items.append(invoice_item)
         
         # Update totals
         self.sub_total += invoice_item.amount
         self.total_sgst += invoice_item.sgst
         self.total_cgst += invoice_item.cgst
+        self.total_igst += invoice_item.igst
         self.grand_total += invoice_item.total
     
     def to_dict(self):
@@ -101,22 +122,47 @@ class Invoice:
             "seller_phone": self.seller_phone,
             "seller_email": self.seller_email,
             "seller_gstin": self.seller_gstin,
+            "place_of_supply": self.place_of_supply,
             
             "items": [item.to_dict() for item in self.items],
             
             "sub_total": self.sub_total,
             "total_sgst": self.total_sgst,
             "total_cgst": self.total_cgst,
+            "total_igst": self.total_igst,
             "grand_total": self.grand_total,
             
             # Formatted currency values
             "sub_total_formatted": format_currency(self.sub_total),
             "total_sgst_formatted": format_currency(self.total_sgst),
             "total_cgst_formatted": format_currency(self.total_cgst),
+            "total_igst_formatted": format_currency(self.total_igst),
             "grand_total_formatted": format_currency(self.grand_total),
             "grand_total_words": number_to_words(int(self.grand_total))
         }
 
+def tax_columns(invoice_data):
+    """
+    Return the tax columns an invoice shows.
+    
+    Inter-state invoices carry IGST; all others carry SGST and CGST. A label
+    includes the rate when every line is taxed at the same rate.
+    
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+    
+    Returns:
+    - List of (label, item key, invoice total key) tuples
+    """
+    items = invoice_data["items"]
+    kinds = ("igst",) if any(item.get("igst_rate") for item in items) else ("sgst", "cgst")
+    columns = []
+    for kind in kinds:
+        rates = {item[f"{kind}_rate"] for item in items}
+        label = f"{kind.upper()} {rates.pop()}%" if len(rates) == 1 else kind.upper()
+        columns.append((label, kind, f"total_{kind}"))
+    return columns
+
 
 def number_to_words(number):
     """Convert a number to words for the invoice."""
@@ -0,0 +1,447 @@
+"""
+Local HTTP/JSON service for the mobile shop invoice generator.
+Lets POS terminals and the e-commerce backend search the catalog, check stock,
+create invoices and fetch invoice PDFs and counter receipts without going through
+the Streamlit app.
+Invoice PDFs are rendered by the job queue's workers, so creating an invoice only
+commits the sale and queues its render.
+
+Run with:
+    python invoice_service.py --host 127.0.0.1 --port 8765 --workers 4
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from mobile_data import (
+    search_phones, get_phone_details, sell_stock, confirm_sale, cancel_sale, phone_sku,
+    find_in_branches, locate_phone, BRANCHES, DEFAULT_BRANCH
+)
+from invoice_generator import Invoice, InvoiceItem
+from sales_rollups import get_sales_rollups
+from customer_directory import get_customer_directory
+from stock_holds import get_stock_holds
+from imei_registry import get_imei_registry
+from job_queue import get_job_queue, invoice_jobs, render_key, JobWorkers
+from receipt_generator import create_receipt_escpos, create_receipt_pdf
+from utils import validate_email
+from validation import check_phone, check_gstin, check_imei, normalize_imei
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 100
+ITEM_FIELDS = ("brand", "model", "storage", "color")
+CUSTOMER_FIELDS = ("name", "phone", "address", "email", "gstin")
+PDF_WAIT_SECONDS = 30
+
+
+class ServiceError(Exception):
+    """An error that is reported to the client with an HTTP status code."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class InvoiceService:
+    """Business operations exposed over HTTP, built on the existing modules."""
+    def __init__(self, queue=None):
+        self.queue = queue or get_job_queue()
+        # mobile_data keeps this process's stock in a dict shared by the request threads
+        self.stock_lock = threading.Lock()
+
+    def search(self, query, branch=None):
+        if not query:
+            raise ServiceError(400, "Query parameter 'q' is required")
+        return {"results": search_phones(query, _branch(branch))}
+
+    def search_customers(self, query):
+        if not query:
+            raise ServiceError(400, "Query parameter 'q' is required")
+        return {"results": get_customer_directory().search(query)}
+
+    def check_stock(self, item):
+        item = _item(item)
+        branch = _branch(item.get("branch"))
+        phone = self._find_phone(item, branch)
+        quantity = _quantity(item.get("quantity", 1))
+        available = _available(item, phone, branch)
+        return {
+            "brand": item["brand"],
+            "model": item["model"],
+            "storage": item["storage"],
+            "color": item["color"],
+            "branch": branch,
+            "stock": available,
+            "available": available >= quantity,
+        }
+
+    def find_stock(self, query):
+        """Answer which branches have a variant, by exact variant or by model with optional storage and color."""
+        quantity = _quantity(query.get("quantity", 1))
+        if all(query.get(field) for field in ("brand", "model", "storage", "color")):
+            branches = find_in_branches(query["brand"], query["model"], query["storage"], query["color"], quantity)
+            return {"branches": branches}
+        if not query.get("model"):
+            raise ServiceError(400, "Query parameter 'model' is required")
+        return {"results": locate_phone(query["model"], query.get("storage"), query.get("color"), quantity)}
+
+    def check_stock_batch(self, items):
+        return {"items": [self.check_stock(item) for item in _check_batch(items)]}
+
+    def create_invoice(self, payload):
+        customer = payload.get("customer") or {}
+        items = payload.get("items") or []
+        branch = _branch(payload.get("branch"))
+        errors = _validate_customer(customer)
+        if not isinstance(items, list):
+            errors.append("Items must be a list")
+        elif not items:
+            errors.append("At least one item is required")
+        if errors:
+            raise ServiceError(400, "; ".join(errors))
+
+        invoice = Invoice(
+            customer_name=customer["name"],
+            customer_address=customer["address"],
+            customer_phone=customer["phone"],
+            customer_email=customer.get("email"),
+            customer_gstin=(customer.get("gstin") or "").strip().upper()
+        )
+
+        with self.stock_lock:
+            lines = []
+            for item in items:
+                item = _item(item)
+                phone = self._find_phone(item, branch)
+                quantity = _quantity(item.get("quantity", 1))
+                # Units held for open carts in the app are not for sale
+                available = _available(item, phone, branch)
+                if available < quantity:
+                    raise ServiceError(
+                        409,
+                        f"Only {available} units of {item['brand']} {item['model']} in stock"
+                    )
+                lines.append((item, phone, quantity, _imeis(item, quantity)))
+
+            for item, phone, quantity, imeis in lines:
+                invoice.add_item(InvoiceItem(
+                    brand=item["brand"],
+                    model=item["model"],
+                    storage=item["storage"],
+                    color=item["color"],
+                    price=phone["price"],
+                    hsn_code=phone["hsn_code"],
+                    quantity=quantity,
+                    imeis=imeis
+                ))
+            invoice_data = invoice.to_dict()
+            # Stock is taken for every line or none. The app keeps its own stock counts in its
+            # own process, so its sales are not seen here
+            sale = [(item["brand"], item["model"], item["storage"], item["color"], quantity)
+                    for item, phone, quantity, imeis in lines]
+            # Pending until the jobs are queued; a crash in between puts the stock back on restart
+            short = sell_stock(sale, branch, ref=invoice.invoice_number, pending=True)
+            if short is not None:
+                raise ServiceError(409, f"Not enough {short[0]} {short[1]} in stock")
+            try:
+                # The PDF render (and delivery) is queued only if the IMEIs register,
+                # and the sale is undone if the jobs cannot be queued
+                with self.queue.enqueue_with(invoice_jobs(invoice_data)):
+                    get_imei_registry().register_invoice(invoice_data, branch)
+            except Exception as e:
+                cancel_sale(sale, branch, ref=invoice.invoice_number)
+                if isinstance(e, ValueError):
+                    # Another counter sold one of the units
+                    raise ServiceError(409, str(e))
+                raise
+            confirm_sale(invoice.invoice_number, branch)
+
+        get_sales_rollups().record_invoice(invoice)
+        get_customer_directory().record_invoice(invoice_data)
+        return invoice_data
+
+    def create_invoice_batch(self, payloads):
+        results = []
+        for payload in _check_batch(payloads):
+            try:
+                results.append({"status": 201, "invoice": self.create_invoice(payload)})
+            except ServiceError as e:
+                results.append({"status": e.status, "error": e.message})
+        return {"results": results}
+
+    def lookup_imei(self, imei):
+        sale = get_imei_registry().lookup(imei)
+        if sale is None:
+            raise ServiceError(404, f"IMEI {imei} was not sold here")
+        return sale
+
+    def get_invoice(self, invoice_number):
+        # The render job keeps the invoice it renders
+        job = self.queue.get(render_key(invoice_number))
+        if job is None:
+            raise ServiceError(404, f"Invoice {invoice_number} not found")
+        return job["payload"]
+
+    def get_pdf(self, invoice_number, timeout=PDF_WAIT_SECONDS):
+        job = self.queue.wait(render_key(invoice_number), timeout)
+        if job is None:
+            raise ServiceError(404, f"Invoice {invoice_number} not found")
+        if job["status"] == "failed":
+            raise ServiceError(500, f"PDF rendering failed: {job['last_error']}")
+        if job["status"] != "done":
+            raise ServiceError(504, "PDF is still rendering, retry shortly")
+        return job["result"]
+
+    def get_receipt(self, invoice_number, receipt_format="pdf"):
+        """Render an 80mm counter receipt; it is small enough to draw on request."""
+        invoice_data = self.get_invoice(invoice_number)
+        if receipt_format == "pdf":
+            return create_receipt_pdf(invoice_data).getvalue(), "application/pdf"
+        if receipt_format == "escpos":
+            return create_receipt_escpos(invoice_data), "application/octet-stream"
+        raise ServiceError(400, "Receipt format must be pdf or escpos")
+
+    def _find_phone(self, item, branch):
+        try:
+            phone = get_phone_details(item["brand"], item["model"], item["storage"], item["color"], branch)
+        except KeyError as e:
+            raise ServiceError(400, f"Item field {e.args[0]} is required")
+        if phone is None:
+            raise ServiceError(404, f"{item['brand']} {item['model']} ({item['storage']}, {item['color']}) not found")
+        return phone
+
+
+def _branch(branch):
+    if not branch:
+        return DEFAULT_BRANCH
+    if not isinstance(branch, str) or branch not in BRANCHES:
+        raise ServiceError(400, f"Unknown branch {branch}")
+    return branch
+
+
+def _available(item, phone, branch):
+    # Holds are per (branch, SKU); only carts of an app running in this process place them
+    sku = phone_sku(item["brand"], item["model"], item["storage"], item["color"])
+    return get_stock_holds().available((branch, sku), phone["stock"])
+
+
+def _item(item):
+    """Check that an item names its variant with strings, so lookups fail with a 400 rather than a 500."""
+    if not isinstance(item, dict):
+        raise ServiceError(400, "Each item must be a JSON object")
+    for field in ITEM_FIELDS:
+        if field not in item:
+            raise ServiceError(400, f"Item field {field} is required")
+        if not isinstance(item[field], str):
+            raise ServiceError(400, f"Item field {field} must be a string")
+    return item
+
+
+def _quantity(value):
+    """Parse a quantity given as a JSON number or a query string."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ServiceError(400, "Quantity must be a whole number")
+    try:
+        quantity = int(value)
+    except (ValueError, OverflowError):
+        # OverflowError: Infinity, or a float literal such as 1e999
+        raise ServiceError(400, "Quantity must be a whole number")
+    if quantity != float(value):
+        raise ServiceError(400, "Quantity must be a whole number")
+    if quantity < 1:
+        raise ServiceError(400, "Quantity must be at least 1")
+    return quantity
+
+
+def _imeis(item, quantity):
+    """IMEIs of an item's units; optional, but when given there must be one valid IMEI per unit."""
+    imeis = item.get("imeis")
+    if not imeis:
+        return []
+    if not isinstance(imeis, list) or len(imeis) != quantity or not all(isinstance(imei, str) for imei in imeis):
+        raise ServiceError(400, f"Give one IMEI per unit of {item['brand']} {item['model']}")
+    for imei in imeis:
+        imei_error = check_imei(imei)
+        if imei_error:
+            raise ServiceError(400, imei_error)
+    return [normalize_imei(imei) for imei in imeis]
+
+
+def _check_batch(entries):
+    if not isinstance(entries, list) or not entries:
+        raise ServiceError(400, "A non-empty list is required")
+    if len(entries) > MAX_BATCH_SIZE:
+        raise ServiceError(413, f"Batches are limited to {MAX_BATCH_SIZE} entries")
+    return entries
+
+
+def _validate_customer(customer):
+    if not isinstance(customer, dict):
+        return ["Customer must be a JSON object"]
+    # The validators expect text; other JSON types are reported rather than crashing them
+    errors = [
+        f"Customer {field} must be a string" for field in CUSTOMER_FIELDS
+        if customer.get(field) is not None and not isinstance(customer[field], str)
+    ]
+    if errors:
+        return errors
+    if not customer.get("name"):
+        errors.append("Customer name is required")
+    phone_error = check_phone(customer.get("phone"))
+    if phone_error:
+        errors.append(phone_error)
+    if not customer.get("address"):
+        errors.append("Customer address is required")
+    if customer.get("email") and not validate_email(customer["email"]):
+        errors.append("Please provide a valid email address")
+    gstin_error = check_gstin(customer["gstin"]) if customer.get("gstin") else None
+    if gstin_error:
+        errors.append(gstin_error)
+    return errors
+
+
+class InvoiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+    - GET  /catalog/search?q=...
+    - GET  /customers/search?q=...      phone or name prefix
+    - GET  /stock?brand=...&model=...&storage=...&color=...&quantity=...&branch=...
+    - GET  /stock/branches?model=...[&brand=...&storage=...&color=...&quantity=...]
+    - POST /stock/batch                 {"items": [...]}
+    - POST /invoices                    {"customer": {...}, "items": [...], "branch": ...}
+    - POST /invoices/batch              {"invoices": [...]}
+    - GET  /invoices/<number>
+    - GET  /invoices/<number>/pdf
+    - GET  /invoices/<number>/receipt[?format=escpos]   80mm receipt PDF or printer bytes
+    - GET  /imei/<imei>                 invoice and line that sold a unit
+    """
+    # HTTP/1.1 keeps connections alive between requests from the same client
+    protocol_version = "HTTP/1.1"
+    server_version = "MobileInvoiceService/1.0"
+    service = None
+
+    def do_GET(self):
+        self._dispatch(self._route_get)
+
+    def do_POST(self):
+        self._dispatch(self._route_post)
+
+    def _route_get(self, path, query):
+        parts = path.strip("/").split("/")
+        if path == "/catalog/search":
+            return self._send_json(200, self.service.search(query.get("q", [""])[0], query.get("branch", [None])[0]))
+        if path == "/customers/search":
+            return self._send_json(200, self.service.search_customers(query.get("q", [""])[0]))
+        if path == "/stock/branches":
+            return self._send_json(200, self.service.find_stock({key: values[0] for key, values in query.items()}))
+        if path == "/stock":
+            item = {key: values[0] for key, values in query.items()}
+            return self._send_json(200, self.service.check_stock(item))
+        if len(parts) == 2 and parts[0] == "invoices":
+            return self._send_json(200, self.service.get_invoice(parts[1]))
+        if len(parts) == 2 and parts[0] == "imei":
+            return self._send_json(200, self.service.lookup_imei(parts[1]))
+        if len(parts) == 3 and parts[0] == "invoices" and parts[2] == "pdf":
+            pdf = self.service.get_pdf(parts[1])
+            return self._send(200, pdf, "application/pdf")
+        if len(parts) == 3 and parts[0] == "invoices" and parts[2] == "receipt":
+            receipt, content_type = self.service.get_receipt(parts[1], query.get("format", ["pdf"])[0])
+            return self._send(200, receipt, content_type)
+        raise ServiceError(404, f"No route for GET {path}")
+
+    def _route_post(self, path, query):
+        body = self._read_json()
+        if path == "/stock/batch":
+            return self._send_json(200, self.service.check_stock_batch(body.get("items")))
+        if path == "/invoices":
+            return self._send_json(201, self.service.create_invoice(body))
+        if path == "/invoices/batch":
+            return self._send_json(200, self.service.create_invoice_batch(body.get("invoices")))
+        raise ServiceError(404, f"No route for POST {path}")
+
+    def _dispatch(self, route):
+        url = urlparse(self.path)
+        try:
+            route(url.path.rstrip("/") or "/", parse_qs(url.query))
+        except ServiceError as e:
+            self._send_json(e.status, {"error": e.message})
+        except Exception as e:
+            self.log_error("Unhandled error: %r", e)
+            self._send_json(500, {"error": "Internal server error"})
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            # The body is not read, so it must not be taken for the next request on the connection
+            self.close_connection = True
+            if length < 0:
+                raise ServiceError(400, "Content-Length must be a non-negative whole number")
+            raise ServiceError(413, "Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ServiceError(400, "Request body must be valid JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(host="127.0.0.1", port=8765, workers=2):
+    """
+    Create the HTTP server and the job workers that render its PDFs.
+
+    Parameters:
+    - host, port: Address to listen on
+    - workers: Number of PDF rendering processes; 0 when separate
+      `python job_queue.py` processes drain the queue
+
+    Returns:
+    - (server, job_workers) tuple; call job_workers.shutdown() after the
+      server stops (job_workers is None with no workers)
+    """
+    queue = get_job_queue()
+    job_workers = JobWorkers(queue, workers, processes=workers) if workers > 0 else None
+    handler = type("BoundInvoiceRequestHandler", (InvoiceRequestHandler,), {
+        "service": InvoiceService(queue)
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, job_workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local invoicing HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="PDF rendering processes (0: rendered elsewhere)")
+    args = parser.parse_args()
+
+    server, job_workers = create_server(args.host, args.port, args.workers)
+    print(f"Invoice service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if job_workers is not None:
+            job_workers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+View model of the invoice page.
+An issued invoice never changes, so the page's markup (step indicator, parties, item
+rows, totals and footer) is built once per invoice number and kept in the session;
+reruns caused by other widgets only send the cached strings again.
+"""
+from html import escape
+
+from invoice_generator import tax_columns
+from utils import format_currency
+
+STEP_INDICATOR = (
+    '<div style="display: flex; margin-bottom: 30px; background-color: #f8f9fa; padding: 15px; border-radius: 10px;">'
+    '<div style="flex: 1; text-align: center; position: relative;">'
+    '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">1</div>'
+    '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Cart</div>'
+    '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; right: 0; width: 50%;"></div>'
+    '</div>'
+    '<div style="flex: 1; text-align: center; position: relative;">'
+    '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">2</div>'
+    '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Information</div>'
+    '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; left: 0; width: 50%;"></div>'
+    '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; right: 0; width: 50%;"></div>'
+    '</div>'
+    '<div style="flex: 1; text-align: center; position: relative;">'
+    '<div style="background-color: #0066ff; color: white; width: 30px; height: 30px; border-radius: 50%; display: inline-flex; justify-content: center; align-items: center; margin-bottom: 5px;">3</div>'
+    '<div style="font-size: 0.9rem; font-weight: bold; color: #0066ff;">Invoice</div>'
+    '<div style="height: 3px; background-color: #0066ff; position: absolute; top: 15px; left: 0; width: 50%;"></div>'
+    '</div>'
+    '</div>'
+)
+
+TERMS = (
+    '<div style="margin-top: 30px; padding-top: 15px; border-top: 1px solid #eee;">'
+    '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Terms & Conditions</h3>'
+    '<ul style="font-size: 0.85rem; color: #666; margin: 0; padding-left: 20px;">'
+    '<li>Goods once sold will not be taken back or exchanged.</li>'
+    '<li>All disputes are subject to local jurisdiction only.</li>'
+    '<li>Warranty as per manufacturer\'s terms and conditions only.</li>'
+    '</ul>'
+    '</div>'
+)
+
+DOWNLOAD_ICON = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" style="margin-right: 8px;">'
+    '<path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"></path><polyline points="7 10 12 15 17 10"></polyline><line x1="12" y1="15" x2="12" y2="3"></line></svg>'
+)
+
+
+def _text(value):
+    # Keep the markup on one line: a blank line in an address would end the HTML block
+    return escape(str(value)).replace("\n", "<br>")
+
+
+def _parties_html(invoice_data):
+    seller = (
+        '<div style="flex: 1; background-color: #f9f9f9; padding: 15px; border-radius: 5px;">'
+        '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Seller Information</h3>'
+        f'<div style="font-weight: bold; margin-bottom: 5px;">{_text(invoice_data["seller_name"])}</div>'
+        f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">GSTIN: {_text(invoice_data["seller_gstin"])}</div>'
+        f'<div style="font-size: 0.9rem; color: #666;">{_text(invoice_data["seller_address"])}</div>'
+        '</div>'
+    )
+    customer = (
+        '<div style="flex: 1; background-color: #f9f9f9; padding: 15px; border-radius: 5px;">'
+        '<h3 style="font-size: 1rem; margin-bottom: 10px; color: #333;">Customer Information</h3>'
+        f'<div style="font-weight: bold; margin-bottom: 5px;">{_text(invoice_data["customer_name"])}</div>'
+        f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">Phone: {_text(invoice_data["customer_phone"])}</div>'
+        + (f'<div style="font-size: 0.9rem; margin-bottom: 5px; color: #666;">Email: {_text(invoice_data["customer_email"])}</div>' if invoice_data.get("customer_email") else '') +
+        f'<div style="font-size: 0.9rem; color: #666;">{_text(invoice_data["customer_address"])}</div>'
+        + (f'<div style="font-size: 0.9rem; margin-top: 5px; color: #666;">GSTIN: {_text(invoice_data["customer_gstin"])}</div>' if invoice_data.get("customer_gstin") else '') +
+        '</div>'
+    )
+    return f'<div style="display: flex; gap: 1rem;">{seller}{customer}</div>'
+
+
+def _items_html(invoice_data, taxes):
+    header = (
+        '<h3 style="font-size: 1.1rem; margin: 20px 0 15px 0; color: #333;">Purchased Items</h3>'
+        '<div style="display: flex; background-color: #f3f4f6; padding: 10px; border-top: 1px solid #ddd; border-bottom: 1px solid #ddd; font-weight: bold; font-size: 0.9rem;">'
+        '<div style="flex: 3;">Description</div>'
+        '<div style="flex: 1; text-align: center;">HSN</div>'
+        '<div style="flex: 1; text-align: center;">Qty</div>'
+        '<div style="flex: 1; text-align: right;">Rate</div>'
+        '<div style="flex: 1; text-align: right;">Amount</div>'
+        + ''.join(f'<div style="flex: 1; text-align: right;">{label}</div>' for label, _, _ in taxes) +
+        '<div style="flex: 1; text-align: right;">Total</div>'
+        '</div>'
+    )
+    rows = []
+    for i, item in enumerate(invoice_data['items']):
+        bg_color = '#ffffff' if i % 2 == 0 else '#f9f9f9'
+        rows.append(
+            f'<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem; background-color: {bg_color};">'
+            f'<div style="flex: 3;">{_text(item["description"])}'
+            + (f'<div style="font-size: 0.8rem; color: #666;">IMEI: {_text(", ".join(item["imeis"]))}</div>' if item.get("imeis") else '') +
+            '</div>'
+            f'<div style="flex: 1; text-align: center;">{_text(item["hsn_code"])}</div>'
+            f'<div style="flex: 1; text-align: center;">{item["quantity"]}</div>'
+            f'<div style="flex: 1; text-align: right;">{format_currency(item["price"])}</div>'
+            f'<div style="flex: 1; text-align: right;">{format_currency(item["amount"])}</div>'
+            + ''.join(f'<div style="flex: 1; text-align: right;">{format_currency(item[key])}</div>' for _, key, _ in taxes) +
+            f'<div style="flex: 1; text-align: right;">{format_currency(item["total"])}</div>'
+            '</div>'
+        )
+    return header + ''.join(rows)
+
+
+def _totals_html(invoice_data, taxes):
+    return (
+        '<div style="display: flex; margin-top: 20px;">'
+        '<div style="flex: 6;"></div>'
+        '<div style="flex: 4;">'
+        '<div style="border: 1px solid #ddd; border-radius: 5px; overflow: hidden;">'
+        '<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem;">'
+        '<div style="flex: 1; color: #666;">Subtotal:</div>'
+        f'<div style="flex: 1; text-align: right;">{invoice_data["sub_total_formatted"]}</div>'
+        '</div>'
+        + ''.join(
+            '<div style="display: flex; padding: 10px; border-bottom: 1px solid #eee; font-size: 0.9rem;">'
+            f'<div style="flex: 1; color: #666;">{label}:</div>'
+            f'<div style="flex: 1; text-align: right;">{format_currency(invoice_data[total_key])}</div>'
+            '</div>'
+            for label, _, total_key in taxes
+        ) +
+        '<div style="display: flex; padding: 12px; background-color: #f9f9f9; font-weight: bold; font-size: 1rem;">'
+        '<div style="flex: 1;">Grand Total:</div>'
+        f'<div style="flex: 1; text-align: right; color: #0066ff;">{invoice_data["grand_total_formatted"]}</div>'
+        '</div>'
+        '</div>'
+        '</div>'
+        '</div>'
+        '<div style="margin-top: 15px; font-size: 0.9rem; font-style: italic; color: #666;">'
+        f'Amount in Words: {_text(invoice_data["grand_total_words"])}'
+        '</div>'
+    )
+
+
+def build_invoice_view(invoice_data):
+    """
+    Build the markup of the invoice page for one invoice.
+
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+
+    Returns:
+    - Dictionary with the invoice number, the PDF file name, the 'summary'
+      markup (steps and success message) and the 'body' markup of the invoice
+    """
+    taxes = tax_columns(invoice_data)
+    invoice_number = _text(invoice_data["invoice_number"])
+    summary = (
+        STEP_INDICATOR +
+        '<div style="background-color: #e7f6e7; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 20px;">'
+        '<div style="color: #4CAF50; font-size: 24px; margin-bottom: 10px;">✓</div>'
+        '<div style="font-size: 1.2rem; font-weight: bold; color: #4CAF50; margin-bottom: 5px;">Invoice Generated Successfully</div>'
+        f'<div style="font-size: 0.9rem; color: #666;">Invoice #{invoice_number}</div>'
+        '</div>'
+    )
+    body = (
+        '<div class="section-container" style="background-color: white; padding: 25px; border: 1px solid #ddd;">'
+        '<div style="display: flex; justify-content: space-between; margin-bottom: 20px;">'
+        '<div>'
+        '<h1 style="color: #333; margin: 0; font-size: 24px;">TAX INVOICE</h1>'
+        f'<div style="color: #666; font-size: 0.9rem; margin-top: 5px;">Invoice #{invoice_number}</div>'
+        '</div>'
+        '<div style="text-align: right;">'
+        f'<div style="font-size: 0.9rem; color: #666;">Date: {_text(invoice_data["date"])}</div>'
+        f'<div style="font-size: 0.9rem; color: #666;">Time: {_text(invoice_data["time"])}</div>'
+        '</div>'
+        '</div>'
+        + _parties_html(invoice_data)
+        + _items_html(invoice_data, taxes)
+        + _totals_html(invoice_data, taxes)
+        + TERMS +
+        '<div style="margin-top: 30px; display: flex; justify-content: space-between;">'
+        '<div style="font-size: 0.85rem; color: #666;">Thank you for your business!</div>'
+        '<div style="font-size: 0.85rem; color: #666; text-align: right;">'
+        f'For {_text(invoice_data["seller_name"])}<br>'
+        '<div style="margin-top: 20px;">Authorized Signatory</div>'
+        '</div>'
+        '</div>'
+        '</div>'
+    )
+    return {
+        "invoice_number": invoice_data["invoice_number"],
+        "file_name": f"Invoice_{invoice_data['invoice_number']}.pdf",
+        "summary": summary,
+        "body": body,
+    }
+
+
+def download_link_html(href, file_name):
+    """Return the 'Download PDF' button markup for a data: URL."""
+    return (
+        f'<a href="{href}" download="{escape(file_name)}" '
+        'style="display: inline-flex; align-items: center; padding: 12px 25px; color: white; background-color: #0066ff; '
+        'text-decoration: none; border-radius: 5px; font-weight: bold; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">'
+        f'{DOWNLOAD_ICON}Download PDF</a>'
+    )
@@ -0,0 +1,535 @@
+"""
+Durable queue of invoice render and delivery jobs.
+Checkout commits the sale and enqueues its jobs; a pool of workers renders the PDFs and
+delivers them afterwards, so a burst of checkouts is not held up by PDF rendering and a
+crash after the sale loses no work. Jobs live in one SQLite table:
+
+- Each job has an idempotency key ("render:<invoice number>"); enqueueing a key that
+  is already queued or done does nothing, so a retried checkout renders once.
+- A worker claims a job under a lease. If the worker dies, the lease runs out and
+  another worker picks the job up again; only the holder of the current lease can
+  complete or fail it.
+- A failed job is retried with exponential backoff and jitter. After `max_attempts`,
+  failed or with the lease run out, it is marked failed, together with the jobs
+  waiting on it, until retried by hand.
+- A job may name the key of a job that must be done first; delivering an invoice
+  waits for its render and is handed the rendered PDF.
+
+Jobs run at least once: a delivery interrupted after the mail server accepted it is
+sent again, with the same Message-ID so mail clients can drop the duplicate.
+
+Run workers outside the app, and inspect the queue, with:
+    python job_queue.py [jobs.db] --workers 4
+    python job_queue.py [jobs.db] --status
+"""
+import argparse
+import json
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from email.message import EmailMessage
+from functools import lru_cache
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 300.0
+# A claimed job is given back to the queue if its worker has not finished it by then
+DEFAULT_LEASE_SECONDS = 300.0
+# Idle workers look for jobs whose backoff has passed, or that other processes added
+POLL_SECONDS = 1.0
+SMTP_TIMEOUT = 30
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    after TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    result BLOB,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_after ON jobs (after);
+"""
+
+_COLUMNS = "id, key, kind, payload, after, status, attempts, last_error, result"
+
+
+def _job(row):
+    job = dict(zip(("id", "key", "kind", "payload", "after", "status", "attempts", "last_error", "result"), row))
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+class JobQueue:
+    """
+    Job table in a SQLite database shared by every process using the same path.
+
+    With no path the queue lives in memory and only this process's workers
+    can drain it; get_job_queue() always keeps it on disk.
+    """
+    def __init__(self, path=None, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, durable=True):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        # Signalled when this process adds or finishes a job
+        self.changed = threading.Condition()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path or ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+        if path:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # A job is on disk before enqueue returns, so a committed sale always has its render queued
+            self.db.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        self.db.executescript(SCHEMA)
+
+    def enqueue(self, kind, payload, key=None, after=None):
+        """
+        Add a job unless one with the same key exists.
+
+        Parameters:
+        - kind: Handler name, a key of HANDLERS
+        - payload: JSON-serialisable job data
+        - key: Idempotency key (default: a new unique key)
+        - after: Key of a job that must be done before this one runs
+
+        Returns:
+        - The job's key
+        """
+        return self.enqueue_many([(kind, payload, key, after)])[0]
+
+    def enqueue_many(self, jobs):
+        """Add several (kind, payload, key, after) jobs in one transaction; returns their keys."""
+        with self.enqueue_with(jobs) as keys:
+            return keys
+
+    @contextmanager
+    def enqueue_with(self, jobs):
+        """
+        Add (kind, payload, key, after) jobs together with other work.
+
+        The jobs are committed when the block finishes and discarded when it
+        raises, so they are queued only if the work they follow went through.
+        The queue is locked while the block runs, so keep it short.
+
+        Yields:
+        - Keys of the jobs
+        """
+        now = time.time()
+        rows = [(key or uuid.uuid4().hex, kind, json.dumps(payload), after, now, now)
+                for kind, payload, key, after in jobs]
+        with self.lock:
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO jobs (key, kind, payload, after, run_after, created) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                yield [row[0] for row in rows]
+        self._notify()
+
+    def claim(self):
+        """
+        Take the next job that is due and whose dependency is done.
+
+        Returns:
+        - Job dictionary with 'id', 'key', 'kind', 'payload', 'after',
+          'attempts' (including this one) and 'lease_until', or None when
+          nothing is due
+        """
+        now = time.time()
+        with self.lock:
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                # A job whose last allowed attempt ran out of lease is not tried again
+                expired = self.db.execute(
+                    "SELECT id, key, attempts FROM jobs WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, self.max_attempts)
+                ).fetchall()
+                for job_id, key, attempts in expired:
+                    self._give_up(job_id, key, f"Lease expired on attempt {attempts}", now)
+                row = self.db.execute(
+                    f"SELECT {_COLUMNS} FROM jobs j"
+                    " WHERE ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?))"
+                    "   AND (after IS NULL OR EXISTS (SELECT 1 FROM jobs d WHERE d.key = j.after AND d.status = 'done'))"
+                    " ORDER BY run_after, id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                lease_until = now + self.lease_seconds
+                self.db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                    (lease_until, row[0])
+                )
+        job = _job(row)
+        job["attempts"] += 1
+        job["lease_until"] = lease_until
+        return job
+
+    def complete(self, job, result=None):
+        """
+        Mark a claimed job done, keeping its result (e.g. the rendered PDF) for jobs that wait on it.
+
+        Parameters:
+        - job: Job dictionary from claim()
+        - result: Bytes to keep, or None
+
+        Returns:
+        - False if the lease had run out and the job was claimed again or
+          finished by another worker; nothing is recorded then
+        """
+        with self.lock:
+            with self.db:
+                done = self.db.execute(
+                    "UPDATE jobs SET status = 'done', result = ?, lease_until = NULL, finished = ?"
+                    " WHERE id = ? AND status = 'running' AND lease_until = ?",
+                    (result, time.time(), job["id"], job["lease_until"])
+                ).rowcount
+        self._notify()
+        return bool(done)
+
+    def fail(self, job, error):
+        """
+        Record a failed attempt: retry after a backoff, or give up after max_attempts.
+
+        Parameters:
+        - job: Job dictionary from claim()
+        - error: Description of the failure
+
+        Returns:
+        - True if the job will be retried; False if it was given up, or if the
+          lease had run out and the attempt was not recorded
+        """
+        now = time.time()
+        with self.lock:
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                row = self.db.execute(
+                    "SELECT key, attempts FROM jobs WHERE id = ? AND status = 'running' AND lease_until = ?",
+                    (job["id"], job["lease_until"])
+                ).fetchone()
+                if row is None:
+                    return False
+                key, attempts = row
+                retry = attempts < self.max_attempts
+                if retry:
+                    # Exponential backoff; jitter keeps jobs that failed together from retrying together
+                    delay = min(MAX_BACKOFF_SECONDS, self.backoff_seconds * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                    self.db.execute(
+                        "UPDATE jobs SET status = 'queued', run_after = ?, lease_until = NULL, last_error = ? WHERE id = ?",
+                        (now + delay, error, job["id"])
+                    )
+                else:
+                    self._give_up(job["id"], key, error, now)
+        self._notify()
+        return retry
+
+    def get(self, key):
+        """Return the job with this key, including its status and result, or None."""
+        with self.lock:
+            row = self.db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE key = ?", (key,)).fetchone()
+        return _job(row) if row else None
+
+    def wait(self, key, timeout):
+        """
+        Wait for a job to be done or to fail.
+
+        Returns:
+        - The job (its status may still be 'queued' or 'running' if the
+          timeout passed), or None when there is no such job
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(key)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                return job
+            # Workers in other processes do not signal this one, so check again every so often
+            with self.changed:
+                self.changed.wait(min(remaining, POLL_SECONDS))
+
+    def wait_for_work(self, timeout=POLL_SECONDS):
+        with self.changed:
+            self.changed.wait(timeout)
+
+    def counts(self):
+        """Return the number of jobs in each status."""
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def failed_jobs(self, limit=20):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE status = 'failed' ORDER BY finished DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def retry_failed(self):
+        """Queue every failed job again with a fresh set of attempts; returns how many."""
+        with self.lock:
+            with self.db:
+                count = self.db.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, finished = NULL WHERE status = 'failed'",
+                    (time.time(),)
+                ).rowcount
+        self._notify()
+        return count
+
+    def purge(self, older_than):
+        """
+        Delete jobs finished more than `older_than` seconds ago, unless a pending job still needs their result.
+
+        Render jobs are kept: they hold the invoice and its PDF, which are served from them.
+        """
+        with self.lock:
+            with self.db:
+                return self.db.execute(
+                    "DELETE FROM jobs WHERE status = 'done' AND finished < ? AND kind != 'render'"
+                    " AND NOT EXISTS (SELECT 1 FROM jobs d WHERE d.after = jobs.key AND d.status != 'done')",
+                    (time.time() - older_than,)
+                ).rowcount
+
+    def close(self):
+        self.db.close()
+
+    def _give_up(self, job_id, key, error, now):
+        """Mark a job failed, with the jobs waiting on it, inside the caller's transaction."""
+        self.db.execute(
+            "UPDATE jobs SET status = 'failed', lease_until = NULL, last_error = ?, finished = ? WHERE id = ?",
+            (error, now, job_id)
+        )
+        # Jobs waiting on this one can no longer run
+        self.db.execute(
+            "UPDATE jobs SET status = 'failed', last_error = ?, finished = ? WHERE after = ? AND status = 'queued'",
+            (f"{key} failed", now, key)
+        )
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+
+class JobWorkers:
+    """
+    Threads that drain a job queue.
+
+    Each thread claims a job and runs its handler, in the thread itself or, with
+    `processes`, on a process pool (which keeps PDF rendering off the threads
+    serving requests). If a pool process dies the pool is replaced, so one
+    crash does not fail every later job.
+    """
+    def __init__(self, queue, workers=1, processes=0):
+        self.queue = queue
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(max_workers=processes) if processes else None
+        self.executor_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self.queue.wait_for_work()
+                continue
+            try:
+                args = [job["payload"]]
+                if job["after"]:
+                    args.append(self.queue.get(job["after"])["result"])
+                handler = HANDLERS[job["kind"]]
+                if self.executor is not None:
+                    result = self._run_in_pool(handler, args)
+                else:
+                    result = handler(*args)
+            except Exception as e:
+                self.queue.fail(job, repr(e))
+            else:
+                self.queue.complete(job, result)
+
+    def _run_in_pool(self, handler, args):
+        executor = self.executor
+        try:
+            return executor.submit(handler, *args).result()
+        except BrokenProcessPool:
+            # The attempt fails, as the job may be what killed the process; later ones get a new pool
+            with self.executor_lock:
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self.executor = ProcessPoolExecutor(max_workers=self.processes)
+            raise
+
+    def shutdown(self):
+        """Stop after the jobs in progress; unfinished jobs stay queued."""
+        self.stopping.set()
+        self.queue._notify()
+        for thread in self.threads:
+            thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+def render_invoice(invoice_data):
+    """Handler: render an invoice PDF and return its bytes."""
+    from pdf_generator import create_invoice_pdf
+    return create_invoice_pdf(invoice_data).getvalue()
+
+
+def delivery_configured():
+    """Invoices are delivered by email through SMTP_HOST, or written to INVOICE_OUTBOX_DIR for another mailer."""
+    return bool(os.environ.get("SMTP_HOST") or os.environ.get("INVOICE_OUTBOX_DIR"))
+
+
+def deliver_invoice(payload, pdf_data):
+    """Handler: email an invoice PDF to the customer."""
+    number = payload["invoice_number"]
+    message = EmailMessage()
+    message["Subject"] = f"Invoice {number} from {payload['seller_name']}"
+    message["From"] = os.environ.get("SMTP_FROM") or payload["seller_email"]
+    message["To"] = payload["to"]
+    # The same Message-ID on every attempt, so a resent invoice is recognised as a duplicate
+    message["Message-ID"] = f"<invoice-{number}@{payload['seller_email'].split('@')[-1]}>"
+    message.set_content(
+        f"Dear {payload['customer_name']},\n\nPlease find attached invoice {number}.\n\n"
+        f"Thank you for shopping with {payload['seller_name']}."
+    )
+    message.add_attachment(pdf_data, maintype="application", subtype="pdf", filename=f"Invoice_{number}.pdf")
+
+    host = os.environ.get("SMTP_HOST")
+    if host:
+        with smtplib.SMTP(host, int(os.environ.get("SMTP_PORT", 25)), timeout=SMTP_TIMEOUT) as smtp:
+            if os.environ.get("SMTP_USER"):
+                smtp.starttls()
+                smtp.login(os.environ["SMTP_USER"], os.environ.get("SMTP_PASSWORD", ""))
+            smtp.send_message(message)
+        return None
+    outbox = os.environ["INVOICE_OUTBOX_DIR"]
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, f"Invoice_{number}.eml")
+    with open(path + ".tmp", "wb") as f:
+        f.write(message.as_bytes())
+    os.replace(path + ".tmp", path)
+    return None
+
+
+HANDLERS = {
+    "render": render_invoice,
+    "deliver": deliver_invoice,
+}
+
+
+def render_key(invoice_number):
+    return f"render:{invoice_number}"
+
+
+def enqueue_invoice(queue, invoice_data):
+    """
+    Queue the PDF render of a new invoice and, when delivery is configured and
+    the customer gave an email address, its delivery.
+
+    Returns:
+    - Key of the render job
+    """
+    return queue.enqueue_many(invoice_jobs(invoice_data))[0]
+
+
+def invoice_jobs(invoice_data):
+    """Return the (kind, payload, key, after) jobs of a new invoice, its render first."""
+    number = invoice_data["invoice_number"]
+    jobs = [("render", invoice_data, render_key(number), None)]
+    if invoice_data.get("customer_email") and delivery_configured():
+        jobs.append(("deliver", {
+            "invoice_number": number,
+            "to": invoice_data["customer_email"],
+            "customer_name": invoice_data["customer_name"],
+            "seller_name": invoice_data["seller_name"],
+            "seller_email": invoice_data["seller_email"],
+        }, f"deliver:{number}", render_key(number)))
+    return jobs
+
+
+@lru_cache(maxsize=None)
+def get_job_queue():
+    """
+    Return the process-wide job queue shared by the app and the HTTP service.
+
+    Jobs are kept on disk at JOB_QUEUE_PATH (default data/jobs.db next to this
+    module), where workers in other processes can drain them and a restart
+    does not lose them.
+    """
+    return JobQueue(os.environ.get("JOB_QUEUE_PATH") or DEFAULT_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_job_workers():
+    """
+    Start this process's job workers, JOB_WORKERS threads (default 1).
+
+    Set JOB_WORKERS=0 when separate `python job_queue.py` processes drain the queue.
+
+    Returns:
+    - JobWorkers, or None when this process runs no workers
+    """
+    workers = int(os.environ.get("JOB_WORKERS", 1))
+    return JobWorkers(get_job_queue(), workers) if workers > 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain or inspect the invoice job queue.")
+    parser.add_argument("path", nargs="?", default=os.environ.get("JOB_QUEUE_PATH") or DEFAULT_PATH,
+                        help="Job queue database (default: JOB_QUEUE_PATH or data/jobs.db)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Rendering processes")
+    parser.add_argument("--status", action="store_true", help="Print job counts and recent failures, then exit")
+    parser.add_argument("--retry-failed", action="store_true", help="Queue failed jobs again, then exit")
+    parser.add_argument("--purge-days", type=float, default=None, help="Delete jobs, other than invoice renders, done more than this many days ago, then exit")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.path)
+    if args.status:
+        print("  ".join(f"{status}: {count}" for status, count in sorted(queue.counts().items())) or "No jobs")
+        for job in queue.failed_jobs():
+            print(f"{job['key']}  {job['attempts']} attempts  {job['last_error']}")
+        return
+    if args.retry_failed:
+        print(f"Queued {queue.retry_failed()} failed jobs again")
+        return
+    if args.purge_days is not None:
+        print(f"Deleted {queue.purge(args.purge_days * 86400)} finished jobs")
+        return
+
+    workers = JobWorkers(queue, args.workers, processes=args.workers)
+    print(f"Draining {args.path} with {args.workers} workers; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
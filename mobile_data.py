@@ -1,7 +1,19 @@
 """
 This module provides the mobile phone database for the invoice generator application.
-It contains comprehensive data about various mobile phone models from different brands.
+It contains comprehensive data about various mobile phone models from different brands,
+and the stock of every variant in each of the shop's branches. Set STOCK_JOURNAL_DIR to
+record every stock movement in a journal and restore the stock from it on startup (in
+the one process that owns the stock: a second process opening the same journal fails on
+import), and CATALOG_IMAGE_PATH to serve catalog lookups from a shared memory-mapped
+catalog image.
 """
+import os
+import threading
+from functools import lru_cache
+
+from stock_journal import StockJournal, DEFAULT_COMPACT_EVERY
+from catalog_image import get_catalog_image
+from catalog_search import CatalogSearchIndex, DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT
 
 # Mobile phone database with details for various brands and models
 MOBILE_DATABASE = {
@@ -253,50 +265,309 @@ MOBILE_DATABASE = {
     ]
 }
 
+# Branches of the shop, by branch code
+BRANCHES = {
+    "BLR-MG": "MG Road, Bangalore",
+    "BLR-KOR": "Koramangala, Bangalore",
+    "MYS-SRR": "Sayyaji Rao Road, Mysuru",
+}
+DEFAULT_BRANCH = "BLR-MG"
+
+def phone_sku(brand, model, storage, color):
+    """Return the SKU identifying one variant (brand, model, storage and color) of a phone."""
+    return f"{brand}|{model}|{storage}|{color}"
+
+# Catalog rows by SKU; the rows hold product details, stock is kept per branch below
+PHONES_BY_SKU = {}
+# Stock partitions: branch code -> SKU -> units in that branch
+BRANCH_STOCK = {branch: {} for branch in BRANCHES}
+# Cross-branch index: SKU -> {branch code: units} for the branches that have it in stock
+STOCK_BY_SKU = {}
+
+_stock_lock = threading.Lock()
+
+def _set_branch_stock(branch, sku, units):
+    """Set a branch's stock of a SKU and keep the cross-branch index in step."""
+    BRANCH_STOCK[branch][sku] = units
+    by_branch = STOCK_BY_SKU.setdefault(sku, {})
+    if units > 0:
+        by_branch[branch] = units
+    else:
+        by_branch.pop(branch, None)
+
+def _seed_branch_stock():
+    """Split the single stock figure of each catalog row across the branches."""
+    branches = list(BRANCHES)
+    for brand, models in MOBILE_DATABASE.items():
+        for phone in models:
+            sku = phone_sku(brand, phone["model"], phone["storage"], phone["color"])
+            PHONES_BY_SKU[sku] = (brand, phone)
+            stock = phone.pop("stock")
+            # The first branch is the flagship store and keeps the remainder
+            shares = [stock * 3 // 10, stock // 5]
+            for branch, units in zip(branches, [stock - sum(shares)] + shares):
+                _set_branch_stock(branch, sku, units)
+
+_seed_branch_stock()
+
+# Journal that stock movements are written to, when one is open
+_journal = None
+# Invoice numbers of sales taken but not yet confirmed or cancelled; the journal is
+# not compacted while there are any, so a crash cannot hide them in a snapshot
+_pending_sales = set()
+
+def open_stock_journal(directory, compact_every=DEFAULT_COMPACT_EVERY):
+    """
+    Restore the stock from a journal directory and record every later movement in it.
+    
+    Parameters:
+    - directory: Stock journal directory; created with a snapshot of the current stock if new
+    - compact_every: Movements between snapshots
+    
+    Returns:
+    - Number of movements replayed on top of the latest snapshot
+
+    A sale left pending by a crash is confirmed if its invoice was queued, and
+    otherwise put back with a compensating return.
+    
+    Raises:
+    - JournalLockedError: If another process has the journal open; its stock
+      would diverge from this process's, and both would append movements
+    """
+    global _journal
+    journal = StockJournal(directory, compact_every)
+    with _stock_lock:
+        if _journal is not None and os.path.samefile(_journal.directory, directory):
+            # Reopening this process's own journal; give up its lock first
+            _journal.close()
+        # Locks the directory before anything in it is read or truncated
+        snapshot, tail = journal.load()
+        if _journal is not None:
+            _journal.close()
+        for branch, units_by_sku in (snapshot or {}).items():
+            if branch in BRANCH_STOCK:
+                for sku, units in units_by_sku.items():
+                    _set_branch_stock(branch, sku, units)
+        for movement in tail:
+            branch, sku = movement["branch"], movement["sku"]
+            if branch in BRANCH_STOCK and movement["kind"] != "confirm":
+                _set_branch_stock(branch, sku, BRANCH_STOCK[branch].get(sku, 0) + movement["change"])
+        _pending_sales.clear()
+        for ref, changes in journal.unconfirmed(tail).items():
+            if _sale_completed(ref):
+                journal.append("confirm", next(iter(changes))[0], "", 0, ref)
+                continue
+            for (branch, sku), change in changes.items():
+                journal.append("return", branch, sku, -change, ref)
+                if branch in BRANCH_STOCK:
+                    _set_branch_stock(branch, sku, BRANCH_STOCK[branch].get(sku, 0) - change)
+        if snapshot is None:
+            # A new journal starts from the stock as it is now
+            journal.compact(BRANCH_STOCK)
+        _journal = journal
+    return len(tail)
+
+def _sale_completed(ref):
+    """Whether the invoice of a sale left pending by a crash was queued, so the sale stands."""
+    # The job queue is only needed to settle such sales, so it is not imported up front
+    from job_queue import get_job_queue, render_key
+    return get_job_queue().get(render_key(ref)) is not None
+
+if os.environ.get("STOCK_JOURNAL_DIR"):
+    open_stock_journal(os.environ["STOCK_JOURNAL_DIR"])
+
+def _with_stock(brand, phone, branch):
+    """Return a copy of a catalog row with the brand and the stock in a branch."""
+    sku = phone_sku(brand, phone["model"], phone["storage"], phone["color"])
+    return {**phone, "brand": brand, "stock": BRANCH_STOCK[branch].get(sku, 0)}
+
+def _image_rows_with_stock(rows, branch):
+    """Add the stock in a branch to rows decoded from the catalog image."""
+    return [_with_stock(row["brand"], row, branch) for row in rows]
+
 def get_all_brands():
     """Return a list of all available brands."""
     return list(MOBILE_DATABASE.keys())
 
-def get_models_by_brand(brand):
-    """Return all models for a specific brand."""
-    return MOBILE_DATABASE.get(brand, [])
+def get_models_by_brand(brand, branch=DEFAULT_BRANCH):
+    """Return all models for a specific brand, with their stock in a branch."""
+    image = get_catalog_image()
+    if image is not None:
+        return _image_rows_with_stock(image.brand_records(brand), branch)
+    return [_with_stock(brand, phone, branch) for phone in MOBILE_DATABASE.get(brand, [])]
 
-def search_phones(query):
-    """Search phones by brand, model, or description."""
-    results = []
-    query = query.lower()
+@lru_cache(maxsize=None)
+def _catalog_rows():
+    """(brand, row) of every catalog entry, in catalog order."""
+    return [(brand, phone) for brand, models in MOBILE_DATABASE.items() for phone in models]
+
+@lru_cache(maxsize=None)
+def _search_index():
+    """Build the ranked search index over the catalog, on first use."""
+    image = get_catalog_image()
+    if image is not None:
+        return CatalogSearchIndex(image.record(index) for index in range(len(image)))
+    return CatalogSearchIndex(dict(phone, brand=brand) for brand, phone in _catalog_rows())
+
+def search_phones(query, branch=DEFAULT_BRANCH, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Search phones by brand, model, description or color, with their stock in a branch.
     
-    for brand, models in MOBILE_DATABASE.items():
-        for phone in models:
-            if (query in brand.lower() or 
-                query in phone["model"].lower() or 
-                query in phone["description"].lower() or
-                query in phone["color"].lower()):
-                # Add brand to the phone dict for easier display
-                phone_with_brand = phone.copy()
-                phone_with_brand["brand"] = brand
-                results.append(phone_with_brand)
+    Tolerates typos ("galxy s23", "iphne") and returns the best `limit` matches,
+    best first; a match in the model name ranks above one in the description.
+    """
+    positions = _search_index().search(query, limit)
+    image = get_catalog_image()
+    if image is not None:
+        return _image_rows_with_stock([image.record(index) for index in positions], branch)
+    rows = _catalog_rows()
+    return [_with_stock(*rows[index], branch) for index in positions]
+
+def get_phone_details(brand, model, storage, color, branch=DEFAULT_BRANCH):
+    """Get detailed information for a specific phone model, with its stock in a branch."""
+    image = get_catalog_image()
+    if image is not None:
+        row = image.get(phone_sku(brand, model, storage, color))
+        return row and _with_stock(brand, row, branch)
+    entry = PHONES_BY_SKU.get(phone_sku(brand, model, storage, color))
+    if entry is None or entry[0] != brand:
+        return None
+    return _with_stock(brand, entry[1], branch)
+
+def get_stock(brand, model, storage, color, branch=DEFAULT_BRANCH):
+    """Return the units of a phone variant in stock at a branch."""
+    return BRANCH_STOCK[branch].get(phone_sku(brand, model, storage, color), 0)
+
+def _compact_if_due():
+    """Snapshot the stock when the journal is due for it and no sale is pending; call with _stock_lock held."""
+    if _journal is not None and not _pending_sales and _journal.needs_compaction():
+        _journal.compact(BRANCH_STOCK)
+
+def _move_stock(kind, brand, model, storage, color, change, branch, ref):
+    """Journal and apply a stock movement; returns False if the SKU is unknown or stock would go negative."""
+    sku = phone_sku(brand, model, storage, color)
+    with _stock_lock:
+        stock = BRANCH_STOCK[branch].get(sku)
+        if stock is None or stock + change < 0:
+            return False
+        if _journal is not None:
+            _journal.append(kind, branch, sku, change, ref)
+        _set_branch_stock(branch, sku, stock + change)
+        _compact_if_due()
+        return True
+
+def update_stock(brand, model, storage, color, quantity=1, branch=DEFAULT_BRANCH, ref=None):
+    """Update a branch's stock after selling phones; ref is the invoice number."""
+    return _move_stock("sale", brand, model, storage, color, -quantity, branch, ref)
+
+def sell_stock(lines, branch=DEFAULT_BRANCH, ref=None, pending=False):
+    """
+    Take every line of a sale out of a branch's stock, or none of them.
     
-    return results
-
-def get_phone_details(brand, model, storage, color):
-    """Get detailed information for a specific phone model."""
-    for phone in MOBILE_DATABASE.get(brand, []):
-        if (phone["model"] == model and 
-            phone["storage"] == storage and 
-            phone["color"] == color):
-            return phone
+    Parameters:
+    - lines: List of (brand, model, storage, color, quantity) tuples
+    - branch: Branch that sells the units
+    - ref: Invoice number
+    - pending: Keep the sale pending until confirm_sale() or cancel_sale() with
+      the same ref; if the process stops first, the next open_stock_journal()
+      settles it against the job queue
+    
+    Returns:
+    - None when the stock was updated, or the first line that is unknown or
+      short of stock (nothing is updated then)
+    """
+    # Units needed per SKU, which may appear on more than one line
+    needed = {}
+    for line in lines:
+        sku = phone_sku(*line[:4])
+        quantity, first_line = needed.get(sku, (0, line))
+        needed[sku] = (quantity + line[4], first_line)
+    with _stock_lock:
+        for sku, (quantity, line) in needed.items():
+            stock = BRANCH_STOCK[branch].get(sku)
+            if stock is None or stock < quantity:
+                return line
+        for brand, model, storage, color, quantity in lines:
+            sku = phone_sku(brand, model, storage, color)
+            if _journal is not None:
+                _journal.append("sale", branch, sku, -quantity, ref, pending=pending)
+            _set_branch_stock(branch, sku, BRANCH_STOCK[branch][sku] - quantity)
+        if pending:
+            _pending_sales.add(ref)
+        _compact_if_due()
     return None
 
-def update_stock(brand, model, storage, color, quantity=1):
-    """Update stock after selling phones."""
-    for phone in MOBILE_DATABASE.get(brand, []):
-        if (phone["model"] == model and 
-            phone["storage"] == storage and 
-            phone["color"] == color):
-            if phone["stock"] >= quantity:
-                phone["stock"] -= quantity
-                return True
-            else:
-                return False
-    return False
+def confirm_sale(ref, branch=DEFAULT_BRANCH):
+    """Mark a pending sale as final once its invoice is queued; ref is the invoice number."""
+    with _stock_lock:
+        if _journal is not None:
+            _journal.append("confirm", branch, "", 0, ref)
+        _pending_sales.discard(ref)
+        _compact_if_due()
+
+def cancel_sale(lines, branch=DEFAULT_BRANCH, ref=None):
+    """Put the stock of a pending sale back, with the lines and ref it was taken with."""
+    for brand, model, storage, color, quantity in lines:
+        return_stock(brand, model, storage, color, quantity, branch, ref)
+    with _stock_lock:
+        _pending_sales.discard(ref)
+        _compact_if_due()
+
+def return_stock(brand, model, storage, color, quantity=1, branch=DEFAULT_BRANCH, ref=None):
+    """Put returned phones back into a branch's stock; ref is the invoice or credit note number."""
+    return _move_stock("return", brand, model, storage, color, quantity, branch, ref)
+
+def receive_stock(brand, model, storage, color, quantity, branch=DEFAULT_BRANCH, ref=None):
+    """Add phones delivered to a branch; ref is the delivery note or purchase invoice number."""
+    return _move_stock("receipt", brand, model, storage, color, quantity, branch, ref)
+
+def adjust_stock(brand, model, storage, color, change, branch=DEFAULT_BRANCH, reason=None):
+    """Correct a branch's stock after a count, e.g. -1 for a unit lost to damage or theft."""
+    return _move_stock("adjustment", brand, model, storage, color, change, branch, reason)
+
+def find_in_branches(brand, model, storage, color, quantity=1):
+    """
+    Find the branches that have a phone variant in stock.
+    
+    Parameters:
+    - brand, model, storage, color: The phone variant
+    - quantity: Minimum number of units a branch must have
+    
+    Returns:
+    - List of {'branch', 'branch_name', 'stock'} dicts, most stock first
+    """
+    by_branch = STOCK_BY_SKU.get(phone_sku(brand, model, storage, color), {})
+    return [
+        {"branch": branch, "branch_name": BRANCHES[branch], "stock": units}
+        for branch, units in sorted(by_branch.items(), key=lambda entry: -entry[1])
+        if units >= quantity
+    ]
+
+def locate_phone(model, storage=None, color=None, quantity=1):
+    """
+    Answer "which store has a 256GB S23 Ultra in black?".
+    
+    Parameters:
+    - model: Model name or part of it, e.g. "S23 Ultra"
+    - storage: Optional storage, e.g. "256GB"
+    - color: Optional color or part of it, e.g. "black"
+    - quantity: Minimum number of units a branch must have
+    
+    Returns:
+    - List of variant dicts with the branch, branch_name and stock of every
+      branch that has enough units, most stock first
+    """
+    model, color = model.lower(), (color or "").lower()
+    storage = (storage or "").replace(" ", "").upper()
+    results = []
+    for sku, (brand, phone) in PHONES_BY_SKU.items():
+        if (model in phone["model"].lower() and
+            (not storage or phone["storage"] == storage) and
+            color in phone["color"].lower()):
+            for branch, units in STOCK_BY_SKU.get(sku, {}).items():
+                if units >= quantity:
+                    results.append({
+                        "brand": brand, "model": phone["model"], "storage": phone["storage"], "color": phone["color"],
+                        "branch": branch, "branch_name": BRANCHES[branch], "stock": units
+                    })
+    return sorted(results, key=lambda result: -result["stock"])
@@ -0,0 +1,98 @@
+"""
+Font handling for PDF invoices.
+Registers a Unicode TrueType font once per process so amounts can be printed with
+the ₹ glyph, which the built-in Helvetica font does not have.
+"""
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.fonts import addMapping
+
+RUPEE = "₹"
+
+InvoiceFonts = namedtuple("InvoiceFonts", ["regular", "bold", "rupee"])
+
+# Built-in fonts, used when no Unicode TTF can be found on this machine
+FALLBACK_FONTS = InvoiceFonts("Helvetica", "Helvetica-Bold", "Rs.")
+
+# Candidate (regular, bold) font files, in order of preference.
+# INVOICE_FONT_PATH / INVOICE_FONT_BOLD_PATH override the search.
+# fonts/ ships DejaVu Sans cut down to Latin, punctuation and currency signs
+# (₹ included), without hinting or the long name records, so an embedded
+# subset costs a few KB. Each file was built from the upstream TTF with:
+#   pyftsubset DejaVuSans.ttf --no-hinting --layout-features='' \
+#     --unicodes=U+0020-007E,U+00A0-017F,U+2010-2027,U+2030-203A,U+20A0-20C0,U+2122 \
+#     --drop-tables+=GPOS,GSUB,GDEF,kern,FFTM,MATH --name-IDs=0,1,2,3,4,5,6 \
+#     --name-languages=0x409 --notdef-outline --recalc-bounds
+FONT_CANDIDATES = [
+    (os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "DejaVuSans.ttf"),
+     os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "DejaVuSans-Bold.ttf")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf",
+     "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+     "/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+    ("C:\\Windows\\Fonts\\arial.ttf", "C:\\Windows\\Fonts\\arialbd.ttf"),
+]
+
+
+def _find_font_files():
+    """Return the first (regular, bold) pair of font files that exists, or None."""
+    override = os.environ.get("INVOICE_FONT_PATH")
+    if override:
+        return override, os.environ.get("INVOICE_FONT_BOLD_PATH", override)
+
+    for regular, bold in FONT_CANDIDATES:
+        if os.path.exists(regular):
+            return regular, bold if os.path.exists(bold) else regular
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_invoice_fonts():
+    """
+    Register the invoice fonts with ReportLab and return their names.
+
+    The TTF files are parsed only on the first call in each process; later
+    calls return the cached result. ReportLab embeds only the glyphs that a
+    document actually uses, so each PDF carries a small font subset rather
+    than the whole font file.
+
+    Returns:
+    - InvoiceFonts tuple (regular font name, bold font name, rupee symbol)
+    """
+    font_files = _find_font_files()
+    if font_files is None:
+        return FALLBACK_FONTS
+
+    regular_path, bold_path = font_files
+    family = "InvoiceSans"
+    try:
+        regular = TTFont(family, regular_path, asciiReadable=False)
+        bold = TTFont(family + "-Bold", bold_path, asciiReadable=False)
+    except Exception:
+        return FALLBACK_FONTS
+
+    if ord(RUPEE) not in regular.face.charToGlyph:
+        return FALLBACK_FONTS
+
+    pdfmetrics.registerFont(regular)
+    pdfmetrics.registerFont(bold)
+    # Lets <b> markup inside Paragraphs switch to the bold face
+    addMapping(family, 0, 0, family)
+    addMapping(family, 1, 0, family + "-Bold")
+    addMapping(family, 0, 1, family)
+    addMapping(family, 1, 1, family + "-Bold")
+    return InvoiceFonts(family, family + "-Bold", RUPEE)
+
+
+def pdf_text(text, fonts):
+    """Replace the ₹ sign with the fallback symbol when the font cannot draw it."""
+    if fonts.rupee == RUPEE:
+        return text
+    return text.replace(RUPEE, fonts.rupee + " ")
@@ -6,199 +6,681 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm, mm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak, Flowable
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from io import BytesIO
+from xml.sax.saxutils import escape
 import base64
 from datetime import datetime
+from pdf_fonts import get_invoice_fonts, pdf_text
+from utils import format_currency
+from invoice_generator import tax_columns
+from e_invoice import e_invoice_details, draw_qr
+from functools import lru_cache
 
-def create_invoice_pdf(invoice_data):
-    """
-    Create a PDF invoice from the provided invoice data.
-    
-    Parameters:
-    - invoice_data: Dictionary containing all invoice information
-    
-    Returns:
-    - BytesIO object containing the PDF data
-    """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4,
-        rightMargin=1*cm, 
-        leftMargin=1*cm, 
-        topMargin=1*cm, 
-        bottomMargin=1*cm
-    )
-    
-    # Styles
+PAGE_MARGIN = 1*cm
+INFO_COL_WIDTHS = [2.8*cm, 4.3*cm, 1.6*cm, 2.6*cm]
+PARTY_COL_WIDTHS = [8.5*cm, 8.5*cm]
+# Sized for 8pt DejaVu Sans with 3pt cell padding: line amounts up to
+# ₹9,99,999.99 and bold totals up to ₹99,99,999.99 fit on one line
+ITEM_COL_WIDTHS = [0.5*cm, 4.15*cm, 1.65*cm, 0.9*cm, 2*cm, 2.45*cm, 2.2*cm, 2.2*cm, 2.45*cm]
+# Inter-state invoices have a single IGST column in place of SGST and CGST;
+# the rest of its width goes to the description
+IGST_ITEM_COL_WIDTHS = [0.5*cm, 6.1*cm, 1.65*cm, 0.9*cm, 2*cm, 2.45*cm, 2.45*cm, 2.45*cm]
+E_INVOICE_QR_SIZE = 3.5*cm
+
+@lru_cache(maxsize=None)
+def _get_styles(fonts):
+    """Build the paragraph styles once per font set and share them between invoices."""
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(
         name='InvoiceTitle',
         parent=styles['Heading1'],
         fontSize=16,
+        fontName=fonts.bold,
         alignment=1,  # Center
     ))
     styles.add(ParagraphStyle(
         name='InvoiceSubtitle',
         parent=styles['Heading2'],
         fontSize=14,
+        fontName=fonts.bold,
         alignment=1,  # Center
     ))
     styles.add(ParagraphStyle(
         name='InvoiceInfo',
         parent=styles['Normal'],
         fontSize=9,
+        fontName=fonts.regular,
     ))
     styles.add(ParagraphStyle(
         name='TableHeader',
         parent=styles['Normal'],
         fontSize=9,
         alignment=1,  # Center
-        fontName='Helvetica-Bold',
+        fontName=fonts.bold,
     ))
     styles.add(ParagraphStyle(
         name='TableCell',
         parent=styles['Normal'],
         fontSize=9,
+        fontName=fonts.regular,
+    ))
+    styles.add(ParagraphStyle(
+        name='ItemCell',
+        parent=styles['Normal'],
+        fontSize=8,
+        leading=10,
+        fontName=fonts.regular,
     ))
     styles.add(ParagraphStyle(
         name='Total',
         parent=styles['Normal'],
         fontSize=10,
-        fontName='Helvetica-Bold',
+        fontName=fonts.bold,
         alignment=2,  # Right aligned
     ))
+    return styles
+
+@lru_cache(maxsize=None)
+def _get_table_styles(fonts):
+    """Build the table styles once per font set; Table.setStyle only reads them."""
+    return {
+        'info': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+            ('FONTNAME', (0, 0), (0, -1), fonts.bold),
+            ('FONTNAME', (2, 0), (2, -1), fonts.bold),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        'parties': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+            ('FONTNAME', (0, 0), (1, 0), fonts.bold),
+            ('VALIGN', (0, 0), (1, -1), 'TOP'),
+            ('GRID', (0, 0), (1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (1, 0), colors.lightgrey),
+        ]),
+        'items': TableStyle([
+            # Header row
+            ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('LEADING', (0, 0), (-1, -1), 10),
+            ('LEFTPADDING', (0, 0), (-1, -1), 3),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('FONTNAME', (0, 0), (-1, 0), fonts.bold),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            
+            # Grid
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            
+            # Alignment for specific columns
+            ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Quantity
+            ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Rate
+            ('ALIGN', (5, 1), (-1, -1), 'RIGHT'),  # Amount, taxes, Total
+            
+            # Total row
+            ('FONTNAME', (0, -1), (-1, -1), fonts.bold),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ]),
+        'signature': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+            ('ALIGN', (0, 0), (1, 0), 'CENTER'),
+            ('ALIGN', (0, 1), (1, 1), 'CENTER'),
+            ('FONTNAME', (0, 1), (1, 1), fonts.bold),
+            ('VALIGN', (0, 0), (1, -1), 'BOTTOM'),
+        ]),
+    }
+
+def create_invoice_pdf(invoice_data, compact=False):
+    """
+    Create a PDF invoice from the provided invoice data.
     
-    # Build the document
-    elements = []
+    Invoices that fit on one page (the usual 1-5 lines) are drawn straight onto
+    the canvas at precomputed positions in one text object; longer ones, and
+    ones whose text the planner cannot wrap exactly like Paragraph, go through
+    the platypus flowable layout. Both produce the same invoice.
     
-    # Title
-    elements.append(Paragraph("TAX INVOICE", styles['InvoiceTitle']))
-    elements.append(Spacer(1, 5*mm))
+    Parameters:
+    - invoice_data: Dictionary containing all invoice information
+    - compact: Produce the smallest file for archiving (compressed page
+      streams). The invoice looks the same in both modes.
     
-    # Invoice information
-    invoice_info = [
-        ['Invoice No.:', invoice_data['invoice_number'], 'Date:', invoice_data['date']],
-        ['Time:', invoice_data['time'], '', '']
-    ]
+    Returns:
+    - BytesIO object containing the PDF data
+    """
+    buffer = BytesIO()
+    # Fonts, paragraph styles and table styles are built once per process
+    fonts = get_invoice_fonts()
+    content = _invoice_content(invoice_data, fonts)
     
-    invoice_info_table = Table(invoice_info, colWidths=[2.5*cm, 4*cm, 2*cm, 2.5*cm])
-    invoice_info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(invoice_info_table)
-    elements.append(Spacer(1, 5*mm))
+    layout = _fixed_layout(content, fonts)
+    if layout is not None:
+        pdf = canvas.Canvas(
+            buffer,
+            pagesize=A4,
+            initialFontName=fonts.regular,
+            pageCompression=1 if compact else None
+        )
+        _draw_fixed_layout(pdf, layout)
+        pdf.showPage()
+        pdf.save()
+    else:
+        _invoice_doc(buffer, fonts, compact).build(_invoice_flowables(content, fonts))
     
-    # Seller and customer information
-    seller_customer_data = [
-        ['Seller:', 'Buyer:'],
-        [
-            f"{invoice_data['seller_name']}\n{invoice_data['seller_address']}\nPhone: {invoice_data['seller_phone']}\nEmail: {invoice_data['seller_email']}\nGSTIN: {invoice_data['seller_gstin']}",
-            f"{invoice_data['customer_name']}\n{invoice_data['customer_address']}\nPhone: {invoice_data['customer_phone']}" +
-            (f"\nEmail: {invoice_data['customer_email']}" if invoice_data.get('customer_email') else "") +
-            (f"\nGSTIN: {invoice_data['customer_gstin']}" if invoice_data.get('customer_gstin') else "")
-        ]
-    ]
+    buffer.seek(0)
+    return buffer
+
+def create_invoices_pdf(invoices, compact=False):
+    """
+    Create a single PDF holding several invoices, each starting on a new page.
     
-    seller_customer_table = Table(seller_customer_data, colWidths=[8.5*cm, 8.5*cm])
-    seller_customer_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (1, -1), 'TOP'),
-        ('GRID', (0, 0), (1, -1), 0.5, colors.grey),
-        ('BACKGROUND', (0, 0), (1, 0), colors.lightgrey),
-    ]))
-    elements.append(seller_customer_table)
-    elements.append(Spacer(1, 5*mm))
+    Used for reprints and audit bundles; every invoice looks exactly as it
+    does in its own PDF, and fonts are embedded once for the whole document.
     
-    # Invoice items
-    table_data = [
-        ['#', 'Description', 'HSN/SAC', 'Qty', 'Rate', 'Amount', 'SGST 9%', 'CGST 9%', 'Total']
+    Parameters:
+    - invoices: Iterable of invoice dictionaries
+    - compact: As for create_invoice_pdf
+    
+    Returns:
+    - BytesIO object containing the PDF data
+    """
+    buffer = BytesIO()
+    fonts = get_invoice_fonts()
+    story = []
+    for invoice_data in invoices:
+        if story:
+            story.append(PageBreak())
+        content = _invoice_content(invoice_data, fonts)
+        layout = _fixed_layout(content, fonts)
+        if layout is not None:
+            story.append(_FixedInvoicePage(layout))
+        else:
+            story.extend(_invoice_flowables(content, fonts))
+    if not story:
+        raise ValueError("At least one invoice is required")
+    
+    _invoice_doc(buffer, fonts, compact).build(story)
+    buffer.seek(0)
+    return buffer
+
+def _invoice_content(invoice_data, fonts):
+    """Collect the text of every section of the invoice."""
+    taxes = tax_columns(invoice_data)
+    items = [
+        ['#', 'Description', 'HSN/SAC', 'Qty', 'Rate', 'Amount'] + [label for label, _, _ in taxes] + ['Total']
     ]
     
     for i, item in enumerate(invoice_data['items']):
-        table_data.append([
+        items.append([
             i+1,
-            Paragraph(item['description'], styles['TableCell']),
+            item['description'] + (f" IMEI: {', '.join(item['imeis'])}" if item.get('imeis') else ''),
             item['hsn_code'],
             item['quantity'],
-            f"₹{item['price']:,.2f}",
-            f"₹{item['amount']:,.2f}",
-            f"₹{item['sgst']:,.2f}",
-            f"₹{item['cgst']:,.2f}",
-            f"₹{item['total']:,.2f}"
+            pdf_text(format_currency(item['price']), fonts),
+            pdf_text(format_currency(item['amount']), fonts)
+        ] + [pdf_text(format_currency(item[key]), fonts) for _, key, _ in taxes] + [
+            pdf_text(format_currency(item['total']), fonts)
         ])
     
     # Add total row
-    table_data.append([
+    items.append([
         '',
         'Total:',
         '',
         sum(item['quantity'] for item in invoice_data['items']),
         '',
-        invoice_data['sub_total_formatted'],
-        invoice_data['total_sgst_formatted'],
-        invoice_data['total_cgst_formatted'],
-        invoice_data['grand_total_formatted']
+        pdf_text(invoice_data['sub_total_formatted'], fonts)
+    ] + [pdf_text(format_currency(invoice_data[total_key]), fonts) for _, _, total_key in taxes] + [
+        pdf_text(invoice_data['grand_total_formatted'], fonts)
     ])
     
-    col_widths = [0.7*cm, 6*cm, 1.8*cm, 0.8*cm, 1.8*cm, 2*cm, 1.8*cm, 1.8*cm, 2*cm]
-    items_table = Table(table_data, colWidths=col_widths, repeatRows=1)
-    items_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        
-        # Grid
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        
-        # Alignment for specific columns
-        ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Quantity
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Rate
-        ('ALIGN', (5, 1), (8, -1), 'RIGHT'),   # Amount, SGST, CGST, Total
-        
-        # Total row
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-    ]))
+    return {
+        'info': [
+            ['Invoice No.:', invoice_data['invoice_number'], 'Date:', invoice_data['date']],
+            ['Time:', invoice_data['time'], '', '']
+        ],
+        'parties': [
+            ['Seller:', 'Buyer:'],
+            [
+                f"{invoice_data['seller_name']}\n{invoice_data['seller_address']}\nPhone: {invoice_data['seller_phone']}\nEmail: {invoice_data['seller_email']}\nGSTIN: {invoice_data['seller_gstin']}",
+                f"{invoice_data['customer_name']}\n{invoice_data['customer_address']}\nPhone: {invoice_data['customer_phone']}" +
+                (f"\nEmail: {invoice_data['customer_email']}" if invoice_data.get('customer_email') else "") +
+                (f"\nGSTIN: {invoice_data['customer_gstin']}" if invoice_data.get('customer_gstin') else "")
+            ]
+        ],
+        'items': items,
+        'item_col_widths': IGST_ITEM_COL_WIDTHS if len(taxes) == 1 else ITEM_COL_WIDTHS,
+        'words': f"Amount in words: {invoice_data['grand_total_words']}",
+        'terms': [
+            "1. Goods once sold will not be taken back or exchanged.",
+            "2. Warranty as per manufacturer's terms and conditions only.",
+            "3. All disputes are subject to local jurisdiction only.",
+        ],
+        'signature': [
+            ['For ' + invoice_data['seller_name'], 'Received the above goods in good condition'],
+            ['Authorized Signatory', 'Customer Signature']
+        ],
+        # IRN and signed QR code of B2B invoices, when a signing key is configured
+        'e_invoice': e_invoice_details(invoice_data),
+    }
+
+def _invoice_doc(buffer, fonts, compact):
+    """Create the A4 document template shared by single and multi-invoice PDFs."""
+    return SimpleDocTemplate(
+        buffer, 
+        pagesize=A4,
+        rightMargin=PAGE_MARGIN, 
+        leftMargin=PAGE_MARGIN, 
+        topMargin=PAGE_MARGIN, 
+        bottomMargin=PAGE_MARGIN,
+        # Start the canvas in the invoice font so no unused Helvetica resource is written
+        initialFontName=fonts.regular,
+        pageCompression=1 if compact else None
+    )
+
+def _invoice_flowables(content, fonts):
+    """Return the platypus flowables for one invoice."""
+    styles = _get_styles(fonts)
+    table_styles = _get_table_styles(fonts)
+    
+    # Build the document
+    elements = []
+    
+    # Title
+    elements.append(Paragraph("TAX INVOICE", styles['InvoiceTitle']))
+    elements.append(Spacer(1, 5*mm))
+    
+    # Invoice information
+    invoice_info_table = Table(content['info'], colWidths=INFO_COL_WIDTHS)
+    invoice_info_table.setStyle(table_styles['info'])
+    elements.append(invoice_info_table)
+    elements.append(Spacer(1, 5*mm))
+    
+    # e-Invoice IRN and QR code
+    if content['e_invoice']:
+        elements.append(_EInvoiceBlock(content['e_invoice'], styles['TableCell']))
+        elements.append(Spacer(1, 5*mm))
+    
+    # Seller and customer information
+    # Paragraph cells so long addresses wrap inside their column
+    parties = [content['parties'][0]] + [
+        [Paragraph(escape(text).replace('\n', '<br/>'), styles['TableCell']) for text in row]
+        for row in content['parties'][1:]
+    ]
+    seller_customer_table = Table(parties, colWidths=PARTY_COL_WIDTHS)
+    seller_customer_table.setStyle(table_styles['parties'])
+    elements.append(seller_customer_table)
+    elements.append(Spacer(1, 5*mm))
+    
+    # Invoice items
+    table_data = [content['items'][0]]
+    for row in content['items'][1:-1]:
+        table_data.append([row[0], Paragraph(row[1], styles['ItemCell'])] + row[2:])
+    table_data.append(content['items'][-1])
+    
+    items_table = Table(table_data, colWidths=content['item_col_widths'], repeatRows=1)
+    items_table.setStyle(table_styles['items'])
     elements.append(items_table)
     
     # Amount in words
     elements.append(Spacer(1, 5*mm))
-    elements.append(Paragraph(f"Amount in words: {invoice_data['grand_total_words']}", styles['TableCell']))
+    elements.append(Paragraph(content['words'], styles['TableCell']))
     
     # Terms and conditions
     elements.append(Spacer(1, 8*mm))
     elements.append(Paragraph("Terms and Conditions:", styles['TableHeader']))
-    elements.append(Paragraph("1. Goods once sold will not be taken back or exchanged.", styles['TableCell']))
-    elements.append(Paragraph("2. Warranty as per manufacturer's terms and conditions only.", styles['TableCell']))
-    elements.append(Paragraph("3. All disputes are subject to local jurisdiction only.", styles['TableCell']))
+    for term in content['terms']:
+        elements.append(Paragraph(term, styles['TableCell']))
     
     # Signature
     elements.append(Spacer(1, 1.5*cm))
-    sig_table = Table([
-        ['For ' + invoice_data['seller_name'], 'Received the above goods in good condition'],
-        ['Authorized Signatory', 'Customer Signature']
-    ], colWidths=[8.5*cm, 8.5*cm])
-    sig_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (1, 0), 'CENTER'),
-        ('ALIGN', (0, 1), (1, 1), 'CENTER'),
-        ('FONTNAME', (0, 1), (1, 1), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (1, -1), 'BOTTOM'),
-    ]))
+    sig_table = Table(content['signature'], colWidths=PARTY_COL_WIDTHS)
+    sig_table.setStyle(table_styles['signature'])
     elements.append(sig_table)
     
-    # Build the PDF
-    doc.build(elements)
+    return elements
+
+def _wrap_words(text, style, width, strict=False):
+    """
+    Break text into lines no wider than width, the way Paragraph does.
     
-    buffer.seek(0)
-    return buffer
+    With strict, return None when a word is wider than width on its own, as
+    Paragraph would split the word rather than overflow.
+    """
+    space = stringWidth(' ', style.fontName, style.fontSize)
+    # Paragraph lets each space shrink slightly to fit one more word on a line
+    shrink = getattr(style, 'spaceShrinkage', 0) * space
+    lines = []
+    current = []
+    current_width = 0
+    for word in text.split():
+        word_width = stringWidth(word, style.fontName, style.fontSize)
+        if strict and word_width > width:
+            return None
+        if current and current_width + space + word_width > width + shrink * len(current):
+            lines.append(' '.join(current))
+            current = [word]
+            current_width = word_width
+        else:
+            current_width += (space if current else 0) + word_width
+            current.append(word)
+    lines.append(' '.join(current))
+    return lines
+
+# Fixed-layout fast path. Positions follow the platypus layout above: a frame
+# inset by 6pt inside the page margins, tables centred in the frame, and table
+# cells placed the way Table._drawCell places them.
+FRAME_PADDING = 6
+FRAME_LEFT = PAGE_MARGIN + FRAME_PADDING
+FRAME_WIDTH = A4[0] - 2 * FRAME_LEFT
+FRAME_TOP = A4[1] - FRAME_LEFT
+FRAME_BOTTOM = FRAME_LEFT
+# Cell settings of a Table before its TableStyle applies
+CELL_DEFAULTS = {
+    'FONTNAME': 'Helvetica', 'FONTSIZE': 10, 'LEADING': 12, 'ALIGN': 'LEFT', 'VALIGN': 'BOTTOM',
+    'LEFTPADDING': 6, 'RIGHTPADDING': 6, 'TOPPADDING': 3, 'BOTTOMPADDING': 3,
+}
+# Line cap Table uses for GRID lines
+GRID_LINE_CAP = 1
+
+@lru_cache(maxsize=None)
+def _cell_styles(fonts, name, ncols, nrows):
+    """
+    Expand a table style's commands into per-cell settings for the fixed layout.
+    
+    Returns:
+    - (cells, backgrounds, grids): cells[row][col] is a dictionary of the
+      CELL_DEFAULTS keys; backgrounds are (col0, row0, col1, row1, color) and
+      grids (col0, row0, col1, row1, weight, color) ranges
+    """
+    cells = [[dict(CELL_DEFAULTS) for _ in range(ncols)] for _ in range(nrows)]
+    backgrounds = []
+    grids = []
+    for command in _get_table_styles(fonts)[name].getCommands():
+        op, (c0, r0), (c1, r1) = command[:3]
+        c0, c1 = c0 % ncols, c1 % ncols
+        r0, r1 = r0 % nrows, r1 % nrows
+        if op == 'BACKGROUND':
+            backgrounds.append((c0, r0, c1, r1, command[3]))
+        elif op == 'GRID':
+            grids.append((c0, r0, c1, r1, command[3], command[4]))
+        elif op in CELL_DEFAULTS:
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    cells[r][c][op] = command[3]
+    return cells, backgrounds, grids
+
+def _word_space(line, font_name, font_size, width):
+    """Return the negative word spacing Paragraph applies to a line that overflows width."""
+    extra = width - stringWidth(line, font_name, font_size)
+    spaces = line.count(' ')
+    return extra / spaces if extra < 0 and spaces else 0
+
+class _FixedPage:
+    """Text runs, fills and grid lines of one invoice page, in page coordinates."""
+    def __init__(self):
+        self.texts = []                # (font, size, x, y, text, word space)
+        self.fills = []                # (color, x, y, width, height)
+        self.grids = {}                # (weight, color) -> [(x1, y1, x2, y2)]
+        self.e_invoice = None          # (block, left, top)
+
+    def text(self, font, size, x, y, line, align='LEFT', word_space=0):
+        if align in ('CENTER', 'CENTRE'):
+            x -= stringWidth(line, font, size) / 2
+        elif align == 'RIGHT':
+            x -= stringWidth(line, font, size)
+        self.texts.append((font, size, x, y, line, word_space))
+
+    def paragraph(self, text, style, top):
+        """Place a frame-wide paragraph; returns its height, or None if it cannot be planned."""
+        lines = _wrap_words(text, style, FRAME_WIDTH, strict=True)
+        if lines is None:
+            return None
+        y = top - style.fontSize
+        for line in lines:
+            if style.alignment == 1:
+                self.text(style.fontName, style.fontSize, FRAME_LEFT + FRAME_WIDTH / 2, y, line, 'CENTER')
+            else:
+                self.text(style.fontName, style.fontSize, FRAME_LEFT, y, line,
+                          word_space=_word_space(line, style.fontName, style.fontSize, FRAME_WIDTH))
+            y -= style.leading
+        return len(lines) * style.leading
+
+    def table(self, rows, col_widths, cell_styles, top, paragraphs=None):
+        """
+        Place a table below top; returns its height, or None if it cannot be planned.
+        
+        paragraphs maps (row, col) to the ParagraphStyle of cells the flowable
+        layout makes Paragraphs; their value is a list of forced line breaks.
+        """
+        cells, backgrounds, grids = cell_styles
+        paragraphs = paragraphs or {}
+        planned = []
+        heights = []
+        for r, row in enumerate(rows):
+            row_cells = []
+            height = 0
+            for c, value in enumerate(row):
+                cell = cells[r][c]
+                style = paragraphs.get((r, c))
+                if style is not None:
+                    width = col_widths[c] - cell['LEFTPADDING'] - cell['RIGHTPADDING']
+                    lines = []
+                    for segment in value:
+                        wrapped = _wrap_words(segment, style, width, strict=True)
+                        if not segment.strip() or wrapped is None:
+                            return None
+                        lines.extend(wrapped)
+                    content_height = len(lines) * style.leading
+                else:
+                    lines = str(value).split('\n')
+                    content_height = len(lines) * cell['LEADING']
+                row_cells.append((lines, style, content_height))
+                height = max(height, content_height + cell['TOPPADDING'] + cell['BOTTOMPADDING'])
+            planned.append(row_cells)
+            heights.append(height)
+        
+        x0 = FRAME_LEFT + (FRAME_WIDTH - sum(col_widths)) / 2
+        col_x = [x0]
+        for width in col_widths:
+            col_x.append(col_x[-1] + width)
+        row_y = [top]
+        for height in heights:
+            row_y.append(row_y[-1] - height)
+        
+        for c0, r0, c1, r1, color in backgrounds:
+            self.fills.append((color, col_x[c0], row_y[r1 + 1], col_x[c1 + 1] - col_x[c0], row_y[r0] - row_y[r1 + 1]))
+        for r, row_cells in enumerate(planned):
+            bottom, height = row_y[r + 1], heights[r]
+            for c, (lines, style, content_height) in enumerate(row_cells):
+                cell = cells[r][c]
+                valign = cell['VALIGN']
+                if style is not None:
+                    # A Paragraph is placed by its box, then draws its first baseline fontSize below the top
+                    if valign == 'TOP':
+                        y = bottom + height - cell['TOPPADDING']
+                    elif valign == 'BOTTOM':
+                        y = bottom + cell['BOTTOMPADDING'] + content_height
+                    else:
+                        y = bottom + (height + cell['BOTTOMPADDING'] - cell['TOPPADDING'] + content_height) / 2
+                    font, size, leading = style.fontName, style.fontSize, style.leading
+                    y -= size
+                    available = col_widths[c] - cell['LEFTPADDING'] - cell['RIGHTPADDING']
+                else:
+                    font, size, leading = cell['FONTNAME'], cell['FONTSIZE'], cell['LEADING']
+                    if valign == 'TOP':
+                        y = bottom + height - cell['TOPPADDING'] - size
+                    elif valign == 'BOTTOM':
+                        y = bottom + cell['BOTTOMPADDING'] + content_height - size
+                    else:
+                        y = bottom + (cell['BOTTOMPADDING'] + height - cell['TOPPADDING'] + content_height) / 2 - size
+                # A Paragraph box spans the padded cell whatever the alignment, and its lines start at the left
+                align = 'LEFT' if style is not None else cell['ALIGN']
+                if align == 'LEFT':
+                    x = col_x[c] + cell['LEFTPADDING']
+                elif align == 'RIGHT':
+                    x = col_x[c + 1] - cell['RIGHTPADDING']
+                else:
+                    x = (col_x[c] + col_x[c + 1] + cell['LEFTPADDING'] - cell['RIGHTPADDING']) / 2
+                for line in lines:
+                    if line:
+                        word_space = style is not None and _word_space(line, font, size, available)
+                        self.text(font, size, x, y, line, align, word_space)
+                    y -= leading
+        
+        for c0, r0, c1, r1, weight, color in grids:
+            segments = self.grids.setdefault((weight, color), [])
+            segments.extend((col_x[c0], row_y[r], col_x[c1 + 1], row_y[r]) for r in range(r0, r1 + 2))
+            segments.extend((col_x[c], row_y[r1 + 1], col_x[c], row_y[r0]) for c in range(c0, c1 + 2))
+        return row_y[0] - row_y[-1]
+
+def _fixed_layout(content, fonts):
+    """
+    Plan the invoice on one page at fixed positions.
+    
+    Returns:
+    - _FixedPage, or None when the invoice needs the flowable layout (it does
+      not fit on one page, uses Paragraph markup or has text Paragraph would
+      wrap differently)
+    """
+    items = content['items']
+    texts = [row[1] for row in items[1:-1]] + [content['words']]
+    if any('<' in text or '&' in text for text in texts):
+        return None
+    
+    styles = _get_styles(fonts)
+    title_style = styles['InvoiceTitle']
+    page = _FixedPage()
+    y = FRAME_TOP
+    
+    def place(height, space_after=0):
+        nonlocal y
+        if height is None:
+            return False
+        y -= height + space_after
+        return True
+    
+    ok = (
+        place(page.paragraph("TAX INVOICE", title_style, y), title_style.spaceAfter + 5*mm) and
+        place(page.table(content['info'], INFO_COL_WIDTHS, _cell_styles(fonts, 'info', 4, len(content['info'])), y),
+              5*mm)
+    )
+    if ok and content['e_invoice']:
+        block = _e_invoice_block(content['e_invoice'], styles['TableCell'], FRAME_WIDTH)
+        page.e_invoice = (block, FRAME_LEFT, y)
+        place(block['height'], 5*mm)
+    
+    parties = content['parties']
+    party_paragraphs = {(r, c): styles['TableCell'] for r in range(1, len(parties)) for c in range(2)}
+    parties = [parties[0]] + [[text.split('\n') for text in row] for row in parties[1:]]
+    item_paragraphs = {(r, 1): styles['ItemCell'] for r in range(1, len(items) - 1)}
+    items = [items[0]] + [row[:1] + [[row[1]]] + row[2:] for row in items[1:-1]] + [items[-1]]
+    widths = content['item_col_widths']
+    ok = ok and (
+        place(page.table(parties, PARTY_COL_WIDTHS, _cell_styles(fonts, 'parties', 2, len(parties)), y,
+                         party_paragraphs), 5*mm) and
+        place(page.table(items, widths, _cell_styles(fonts, 'items', len(widths), len(items)), y,
+                         item_paragraphs), 5*mm) and
+        place(page.paragraph(content['words'], styles['TableCell'], y), 8*mm) and
+        place(page.paragraph("Terms and Conditions:", styles['TableHeader'], y)) and
+        all(place(page.paragraph(term, styles['TableCell'], y)) for term in content['terms']) and
+        place(1.5*cm) and
+        place(page.table(content['signature'], PARTY_COL_WIDTHS,
+                         _cell_styles(fonts, 'signature', 2, len(content['signature'])), y))
+    )
+    if not ok or y < FRAME_BOTTOM:
+        return None
+    return page
+
+def _draw_fixed_layout(pdf, page):
+    """Draw a planned invoice: backgrounds, then every text run in one text object, then the grids."""
+    for color, x, y, width, height in page.fills:
+        pdf.setFillColor(color)
+        pdf.rect(x, y, width, height, stroke=0, fill=1)
+    
+    pdf.setFillColor(colors.black)
+    text = pdf.beginText()
+    current = None
+    for font, size, x, y, line, word_space in page.texts:
+        if (font, size) != current:
+            text.setFont(font, size)
+            current = (font, size)
+        text.setTextOrigin(x, y)
+        # Every run sets its own origin, so the cursor advance textOut measures is
+        # not needed. Each run ends with a line move, as the flowable layout's
+        # cells do, so text extraction reads each cell as its own line.
+        if word_space:
+            text.setWordSpace(word_space)
+            text._textOut(line, TStar=True)
+            text.setWordSpace(0)
+        else:
+            text._textOut(line, TStar=True)
+    pdf.drawText(text)
+    
+    pdf.saveState()
+    pdf.setLineCap(GRID_LINE_CAP)
+    for (weight, color), segments in page.grids.items():
+        pdf.setLineWidth(weight)
+        pdf.setStrokeColor(color)
+        pdf.lines(segments)
+    pdf.restoreState()
+    
+    if page.e_invoice:
+        _draw_e_invoice(pdf, *page.e_invoice)
+
+class _FixedInvoicePage(Flowable):
+    """A planned one-page invoice placed in a multi-invoice document."""
+    def __init__(self, page):
+        super().__init__()
+        self.page = page
+
+    def wrap(self, availWidth, availHeight):
+        # Fill the frame so the invoice always starts at the top of a fresh page
+        return availWidth, availHeight
+
+    def draw(self):
+        # The canvas origin is now the frame's bottom-left corner
+        self.canv.translate(-FRAME_LEFT, -FRAME_BOTTOM)
+        _draw_fixed_layout(self.canv, self.page)
+
+class _EInvoiceBlock(Flowable):
+    """The IRN beside the signed QR code."""
+    def __init__(self, details, style):
+        super().__init__()
+        self.details = details
+        self.style = style
+
+    def wrap(self, availWidth, availHeight):
+        self.block = _e_invoice_block(self.details, self.style, availWidth)
+        return availWidth, self.block['height']
+
+    def draw(self):
+        _draw_e_invoice(self.canv, self.block, 0, self.block['height'])
+
+def _e_invoice_block(details, style, width):
+    """Plan the IRN text to the left of a QR code at the right edge of `width`."""
+    lines = ["e-Invoice"] + _wrap_words(f"IRN: {details['irn']}", style, width - E_INVOICE_QR_SIZE - 5*mm)
+    return {
+        'lines': lines,
+        'style': style,
+        'qr': details['signed_qr'],
+        'width': width,
+        'height': max(E_INVOICE_QR_SIZE, len(lines) * style.leading),
+    }
+
+def _draw_e_invoice(pdf, block, left, top):
+    style = block['style']
+    pdf.setFillColor(style.textColor)
+    pdf.setFont(style.fontName, style.fontSize)
+    y = top - style.fontSize
+    for line in block['lines']:
+        pdf.drawString(left, y, line)
+        y -= style.leading
+    # Vector QR code at the right edge; its quiet zone is part of the square
+    draw_qr(pdf, left + block['width'] - E_INVOICE_QR_SIZE, top - E_INVOICE_QR_SIZE, E_INVOICE_QR_SIZE, block['qr'])
 
 def get_pdf_download_link(pdf_buffer, filename="invoice.pdf"):
     """
@@ -0,0 +1,99 @@
+"""
+HTML for the product cards in the catalog grid.
+Each card is one markdown element built from a template. The parts that never change
+for a SKU (logo, model, HSN code, badges, description) are filled in once and cached;
+a rerun only interpolates the price and the stock line.
+"""
+from functools import lru_cache
+from html import escape
+from string import Template
+
+from utils import format_currency
+
+BRAND_COLORS = {
+    'samsung': '#1428a0',
+    'apple': '#000000',
+    'oppo': '#025e3b',
+    'vivo': '#415fff',
+    'redmi': '#ff6700',
+    'realme': '#ffc803'
+}
+
+# $-placeholders in upper case are filled once per SKU, lower case on every render
+CARD_TEMPLATE = (
+    '<div class="product-card">'
+    '<div style="display: flex; align-items: center; margin-bottom: 10px;">'
+    '<div style="flex: 0 0 80px; text-align: center;">$LOGO</div>'
+    '<div style="flex-grow: 1;"><h3 style="margin: 0; color: #333;">$MODEL</h3>'
+    '<div style="font-size: 0.8rem; color: #666;">HSN: $HSN_CODE</div></div>'
+    '</div>'
+    '<div style="display: flex; align-items: center; justify-content: space-between;">'
+    '<div><div class="badge badge-primary">$STORAGE</div> '
+    '<div class="badge badge-success">$COLOR</div></div>'
+    '<div style="text-align: right; font-size: 1.2rem; font-weight: bold; color: #0066ff;">$price</div>'
+    '</div>'
+    '<div style="margin: 10px 0; font-size: 0.9rem; color: #444;">$DESCRIPTION</div>'
+    '<div style="font-size: 0.8rem; margin-bottom: 10px;">'
+    '<span style="color: $stock_color; font-weight: bold;">● </span>'
+    '<span style="color: #666;">Available: $available units</span></div>'
+    '$other_stores'
+    '</div>'
+)
+
+
+def get_brand_logo_html(brand, width=120):
+    """Return a brand logo drawn as a colored badge."""
+    brand_lower = brand.lower()
+    color = BRAND_COLORS.get(brand_lower, '#0066ff')
+    text_color = '#ffffff' if brand_lower != 'realme' else '#000000'
+
+    return f'<div style="background-color: {color}; color: {text_color}; width: {width}px; height: 40px; border-radius: 5px; display: flex; align-items: center; justify-content: center; font-weight: bold;">{brand.upper()}</div>'
+
+
+@lru_cache(maxsize=4096)
+def _card_template(brand, model, storage, color, hsn_code, description):
+    """Fill in the static parts of a card; cached per SKU (and its catalog text)."""
+    static = {
+        "LOGO": get_brand_logo_html(brand, width=60),
+        "MODEL": escape(model),
+        "HSN_CODE": escape(hsn_code),
+        "STORAGE": escape(storage),
+        "COLOR": escape(color),
+        "DESCRIPTION": escape(description),
+    }
+    # Escape '$' so catalog text cannot be mistaken for a placeholder later
+    return Template(Template(CARD_TEMPLATE).safe_substitute(
+        {key: value.replace("$", "$$") for key, value in static.items()}
+    ))
+
+
+def stock_color(available):
+    return "#4CAF50" if available > 5 else "#ff9800" if available > 0 else "#f44336"
+
+
+def product_card_html(row, available, other_stores=()):
+    """
+    Render the markup of one product card.
+
+    Parameters:
+    - row: Catalog row with 'brand'
+    - available: Units available to sell at this branch
+    - other_stores: (store name, units) of other branches that have the phone
+
+    Returns:
+    - HTML for a single st.markdown call
+    """
+    template = _card_template(row["brand"], row["model"], row["storage"], row["color"], row["hsn_code"], row["description"])
+    other_stores_html = ""
+    if other_stores:
+        other_stores_html = (
+            '<div style="font-size: 0.8rem; color: #666; margin-bottom: 10px;">In stock at '
+            + ", ".join(f"{escape(name)} ({units})" for name, units in other_stores)
+            + '</div>'
+        )
+    return template.substitute(
+        price=format_currency(row["price"]),
+        stock_color=stock_color(available),
+        available=available,
+        other_stores=other_stores_html,
+    )
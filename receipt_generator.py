@@ -0,0 +1,205 @@
+"""
+Module for generating counter receipts on 80mm thermal rolls.
+Works from the same Invoice.to_dict() data as the A4 PDF, either as an ESC/POS byte
+stream for the printer or as a narrow-roll PDF drawn straight onto the canvas.
+"""
+from io import BytesIO
+
+from utils import format_currency
+from invoice_generator import tax_columns
+
+# 80mm paper with the common 72mm printable width
+RECEIPT_COLUMNS = 48          # Font A characters per line on 80mm paper
+RECEIPT_WIDTH_MM = 80
+RECEIPT_MARGIN_MM = 4
+
+# ESC/POS commands
+ESC_INIT = b"\x1b@"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+GS_DOUBLE_SIZE = b"\x1d!\x11"
+GS_NORMAL_SIZE = b"\x1d!\x00"
+GS_FEED_AND_CUT = b"\x1dVB\x03"
+
+
+def receipt_lines(invoice_data, columns=RECEIPT_COLUMNS, rupee="₹"):
+    """
+    Lay out a receipt as a list of lines shared by both receipt renderers.
+
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+    - columns: Characters per line
+    - rupee: Currency symbol the output device can print
+
+    Returns:
+    - List of (style, left, right) tuples, where style is one of
+      'title', 'center', 'bold', 'normal' or 'rule', and right is
+      right-aligned text (or '')
+    """
+    lines = [
+        ("title", invoice_data["seller_name"], ""),
+        ("center", invoice_data["seller_address"], ""),
+        ("center", f"Ph: {invoice_data['seller_phone']}  GSTIN: {invoice_data['seller_gstin']}", ""),
+        ("center", "TAX INVOICE", ""),
+        ("rule", "", ""),
+        ("normal", f"Invoice: {invoice_data['invoice_number']}", ""),
+        ("normal", f"Date: {invoice_data['date']}", f"Time: {invoice_data['time']}"),
+        ("normal", f"Customer: {invoice_data['customer_name']}", ""),
+        ("normal", f"Phone: {invoice_data['customer_phone']}", ""),
+    ]
+    if invoice_data.get("customer_gstin"):
+        lines.append(("normal", f"GSTIN: {invoice_data['customer_gstin']}", ""))
+    lines.append(("rule", "", ""))
+
+    for item in invoice_data["items"]:
+        lines.append(("bold", item["description"], ""))
+        lines.append((
+            "normal",
+            f"  {item['quantity']} x {format_currency(item['price'])}  HSN {item['hsn_code']}",
+            format_currency(item["amount"])
+        ))
+        for imei in item.get("imeis") or ():
+            lines.append(("normal", f"  IMEI {imei}", ""))
+
+    lines.append(("rule", "", ""))
+    lines.append(("normal", "Subtotal", invoice_data["sub_total_formatted"]))
+    for label, _, total_key in tax_columns(invoice_data):
+        lines.append(("normal", label, format_currency(invoice_data[total_key])))
+    lines.append(("title", "TOTAL", invoice_data["grand_total_formatted"]))
+    lines.append(("normal", invoice_data["grand_total_words"], ""))
+    lines.append(("rule", "", ""))
+    lines.append(("center", "Goods once sold will not be taken back.", ""))
+    lines.append(("center", "Thank you for shopping with us!", ""))
+
+    if rupee != "₹":
+        lines = [(style, left.replace("₹", rupee), right.replace("₹", rupee))
+                 for style, left, right in lines]
+    return [wrapped for line in lines for wrapped in _wrap(line, columns)]
+
+
+def create_receipt_escpos(invoice_data, columns=RECEIPT_COLUMNS, encoding="cp858"):
+    """
+    Create an ESC/POS byte stream for an 80mm thermal printer.
+
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+    - columns: Characters per line of the printer's default font
+    - encoding: Code page selected on the printer
+
+    Returns:
+    - Bytes ready to be written to the printer device or socket
+    """
+    out = [ESC_INIT]
+    # Thermal printer code pages have no rupee sign
+    for style, left, right in receipt_lines(invoice_data, columns, rupee="Rs."):
+        if style == "rule":
+            out.append(ESC_ALIGN_LEFT + ("-" * columns).encode(encoding) + b"\n")
+        elif style == "title" and not right:
+            out.append(ESC_ALIGN_CENTER + GS_DOUBLE_SIZE + ESC_BOLD_ON +
+                       left.encode(encoding, "replace") +
+                       b"\n" + ESC_BOLD_OFF + GS_NORMAL_SIZE)
+        elif style == "center":
+            out.append(ESC_ALIGN_CENTER + left.encode(encoding, "replace") + b"\n")
+        else:
+            text = _justify(left, right, columns).encode(encoding, "replace")
+            if style in ("bold", "title"):
+                text = ESC_BOLD_ON + text + ESC_BOLD_OFF
+            out.append(ESC_ALIGN_LEFT + text + b"\n")
+    out.append(GS_FEED_AND_CUT)
+    return b"".join(out)
+
+
+def create_receipt_pdf(invoice_data, columns=RECEIPT_COLUMNS):
+    """
+    Create a narrow-roll PDF receipt drawn directly on the canvas.
+
+    The page is 80mm wide and exactly as tall as the receipt, so it prints on a
+    roll without flowable layout or page breaks.
+
+    Parameters:
+    - invoice_data: Dictionary from Invoice.to_dict()
+    - columns: Characters per line used for wrapping
+
+    Returns:
+    - BytesIO object containing the PDF data
+    """
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+    from pdf_fonts import get_invoice_fonts
+
+    fonts = get_invoice_fonts()
+    lines = receipt_lines(invoice_data, columns, rupee=fonts.rupee)
+    font_size = 7
+    leading = font_size * 1.35
+    left_x = RECEIPT_MARGIN_MM * mm
+    right_x = (RECEIPT_WIDTH_MM - RECEIPT_MARGIN_MM) * mm
+    center_x = RECEIPT_WIDTH_MM * mm / 2
+    height = 2 * RECEIPT_MARGIN_MM * mm + leading * (len(lines) + sum(1 for line in lines if line[0] == "title"))
+
+    buffer = BytesIO()
+    # Receipts go straight to the printer and are not archived, so skip
+    # stream compression, which would otherwise dominate the render time
+    pdf = canvas.Canvas(buffer, pagesize=(RECEIPT_WIDTH_MM * mm, height),
+                        initialFontName=fonts.regular, initialFontSize=font_size,
+                        pageCompression=0)
+    y = height - RECEIPT_MARGIN_MM * mm - font_size
+    for style, left, right in lines:
+        if style == "rule":
+            pdf.setDash(1, 2)
+            pdf.line(left_x, y + font_size / 3, right_x, y + font_size / 3)
+        elif style == "title":
+            pdf.setFont(fonts.bold, font_size * 1.6)
+            y -= leading * 0.6
+            if right:
+                pdf.drawString(left_x, y, left)
+                pdf.drawRightString(right_x, y, right)
+            else:
+                pdf.drawCentredString(center_x, y, left)
+            y -= leading * 0.4
+        elif style == "center":
+            pdf.setFont(fonts.regular, font_size)
+            pdf.drawCentredString(center_x, y, left)
+        else:
+            pdf.setFont(fonts.bold if style == "bold" else fonts.regular, font_size)
+            pdf.drawString(left_x, y, left)
+            if right:
+                pdf.drawRightString(right_x, y, right)
+        y -= leading
+    pdf.showPage()
+    pdf.save()
+
+    buffer.seek(0)
+    return buffer
+
+
+def _justify(left, right, columns):
+    """Pad text so that `right` ends at the last column."""
+    if not right:
+        return left
+    return left + " " * max(1, columns - len(left) - len(right)) + right
+
+
+def _wrap(line, columns):
+    """Split a line whose text does not fit into continuation lines."""
+    style, left, right = line
+    # Titles without right-hand text print at double width
+    limit = columns // 2 if style == "title" and not right else columns
+    if len(left) <= limit - (len(right) + 1 if right else 0) or style == "rule":
+        return [line]
+
+    wrapped = []
+    current = ""
+    for word in left.split():
+        if current and len(current) + 1 + len(word) > limit:
+            wrapped.append((style, current, ""))
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    # The right-hand text goes on the last line, wrapping once more if needed
+    if right and len(current) + len(right) + 1 > columns:
+        wrapped.append((style, current, ""))
+        current = ""
+    wrapped.append((style, current, right))
+    return wrapped
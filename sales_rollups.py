@@ -0,0 +1,171 @@
+"""
+Sales rollups for the dashboard.
+Keeps running totals by brand, model, day and hour of day, plus tax collected, and
+updates them once per finalized invoice, so reports read a handful of buckets instead
+of rescanning every invoice. The buckets live in SQLite and each invoice adds to them
+in one transaction, so the app and the HTTP service can record sales into the same
+file at once.
+"""
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+TAX_KINDS = ("sgst", "cgst", "igst")
+# Used by get_sales_rollups() when SALES_ROLLUPS_PATH is not set
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_rollups.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    invoices INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    sales REAL NOT NULL,
+    tax REAL NOT NULL,
+    PRIMARY KEY (dimension, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tax_collected (
+    kind TEXT PRIMARY KEY,
+    amount REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+_BUCKET_FIELDS = ("invoices", "quantity", "sales", "tax")
+
+
+def _empty_bucket():
+    return {"invoices": 0, "quantity": 0, "sales": 0.0, "tax": 0.0}
+
+
+def _bucket(table, key):
+    bucket = table.get(key)
+    if bucket is None:
+        bucket = table[key] = _empty_bucket()
+    return bucket
+
+
+class SalesRollups:
+    """
+    Running sales totals, updated incrementally per invoice.
+
+    Every dimension maps a key to a bucket of invoice count, units sold,
+    taxable sales and tax. Recording an invoice adds to one bucket per line
+    and dimension with upserts that increment the stored values, so
+    processes sharing the database never overwrite each other's sales.
+    Queries only read buckets.
+
+    With no path the rollups live in memory and only this process sees them.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path or ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+        if path:
+            # Readers (the dashboard) do not block the processes recording sales
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+
+    def record_invoice(self, invoice):
+        """
+        Add a finalized invoice to the rollups.
+
+        Parameters:
+        - invoice: Invoice object whose items have all been added
+        """
+        day = invoice.date.strftime("%Y-%m-%d")
+        hour = str(invoice.date.hour)
+        # Sum the invoice's lines per bucket first, so each bucket is written once
+        deltas = {}
+        tax = dict.fromkeys(TAX_KINDS, 0.0)
+        for item in invoice.items:
+            taxes = {kind: getattr(item, kind, 0) for kind in TAX_KINDS}
+            line_tax = sum(taxes.values())
+            for key in (("total", ""), ("brand", item.brand), ("model", f"{item.brand} {item.model}"),
+                        ("day", day), ("hour", hour)):
+                bucket = _bucket(deltas, key)
+                # An invoice counts once per bucket, however many of its lines land there
+                bucket["invoices"] = 1
+                bucket["quantity"] += item.quantity
+                bucket["sales"] += item.amount
+                bucket["tax"] += line_tax
+            for kind, amount in taxes.items():
+                tax[kind] += amount
+
+        with self.lock:
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                self.db.executemany(
+                    "INSERT INTO buckets (dimension, key, invoices, quantity, sales, tax) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (dimension, key) DO UPDATE SET invoices = invoices + excluded.invoices, "
+                    "quantity = quantity + excluded.quantity, sales = sales + excluded.sales, "
+                    "tax = tax + excluded.tax",
+                    [key + tuple(bucket[field] for field in _BUCKET_FIELDS) for key, bucket in deltas.items()]
+                )
+                self.db.executemany(
+                    "INSERT INTO tax_collected (kind, amount) VALUES (?, ?) "
+                    "ON CONFLICT (kind) DO UPDATE SET amount = amount + excluded.amount",
+                    tax.items()
+                )
+
+    def summary(self):
+        """Return overall totals and tax collected per tax kind."""
+        totals = self._buckets("total").get("") or _empty_bucket()
+        with self.lock:
+            collected = dict(self.db.execute("SELECT kind, amount FROM tax_collected"))
+        return dict(totals, **{f"{kind}_collected": collected.get(kind, 0.0) for kind in TAX_KINDS})
+
+    def top(self, dimension, limit=10):
+        """
+        Return the best-selling keys of a dimension.
+
+        Parameters:
+        - dimension: 'brand' or 'model'
+        - limit: Maximum number of rows
+
+        Returns:
+        - List of bucket dicts with a 'key' field, highest sales first
+        """
+        if dimension not in ("brand", "model"):
+            raise KeyError(dimension)
+        rows = [dict(bucket, key=key) for key, bucket in self._buckets(dimension, limit).items()]
+        return sorted(rows, key=lambda row: row["sales"], reverse=True)
+
+    def daily(self, start=None, end=None):
+        """Return per-day buckets in date order, optionally between two 'YYYY-MM-DD' dates."""
+        rows = [dict(bucket, key=day) for day, bucket in self._buckets("day").items()
+                if (start is None or day >= start) and (end is None or day <= end)]
+        return sorted(rows, key=lambda row: row["key"])
+
+    def hourly(self):
+        """Return per-hour-of-day buckets for all 24 hours."""
+        by_hour = self._buckets("hour")
+        return [dict(by_hour.get(str(hour)) or _empty_bucket(), key=hour) for hour in range(24)]
+
+    def close(self):
+        self.db.close()
+
+    def _buckets(self, dimension, limit=None):
+        """Read a dimension's buckets, highest sales first when limited."""
+        query = f"SELECT key, {', '.join(_BUCKET_FIELDS)} FROM buckets WHERE dimension = ?"
+        params = (dimension,)
+        if limit is not None:
+            query += " ORDER BY sales DESC LIMIT ?"
+            params += (limit,)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return {row[0]: dict(zip(_BUCKET_FIELDS, row[1:])) for row in rows}
+
+
+@lru_cache(maxsize=None)
+def get_sales_rollups():
+    """
+    Return the process-wide rollups.
+
+    The app and the HTTP service share them through one SQLite file,
+    SALES_ROLLUPS_PATH or data/sales_rollups.db next to this module.
+    """
+    return SalesRollups(os.environ.get("SALES_ROLLUPS_PATH") or DEFAULT_PATH)
@@ -0,0 +1,156 @@
+"""
+Stock holds for open carts.
+Adding a phone to a cart places a time-limited hold on the units, so two salespeople
+cannot both sell the last one. Holds are released when the line is removed, when the
+cart is checked out, or when they expire. Expiry is driven by a heap ordered by expiry
+time, so a sweep only touches holds that are actually due.
+
+Holds live in the memory of one process, and so does the stock itself: every process
+importing mobile_data keeps its own counts. The holds keep the app's sessions off each
+other's units, and checkout takes the stock with mobile_data.sell_stock, which fails
+rather than let two sales in the same process oversell. A separate process, such as
+the HTTP service started with `python invoice_service.py`, has its own stock counts and
+neither sees nor places these holds, so its sales are not guarded against the app's.
+"""
+import heapq
+import os
+import threading
+import time
+from functools import lru_cache
+
+# How long an untouched cart keeps its units
+DEFAULT_HOLD_SECONDS = 15 * 60
+
+
+class StockHolds:
+    """
+    Held quantities per (cart, SKU), with totals per SKU.
+
+    Every hold has an expiry time. The heap holds (expires, cart_id, sku)
+    entries; when a hold is renewed a new entry is pushed, and the stale one
+    is discarded when it reaches the top of the heap.
+    """
+    def __init__(self, ttl=DEFAULT_HOLD_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.holds = {}      # (cart_id, sku) -> [quantity, expires]
+        self.held = {}       # sku -> quantity held across all carts
+        self.by_cart = {}    # cart_id -> set of held skus
+        self.expiry = []     # heap of (expires, cart_id, sku)
+
+    def hold(self, cart_id, sku, quantity, stock):
+        """
+        Hold more units of a SKU for a cart and renew the cart's other holds.
+
+        Parameters:
+        - cart_id: Identifier of the cart
+        - sku: SKU of the phone variant
+        - quantity: Number of additional units to hold
+        - stock: Units currently in stock
+
+        Returns:
+        - True when the units were held, False when not enough are available
+        """
+        with self.lock:
+            now = self.clock()
+            self._sweep(now)
+            if stock - self.held.get(sku, 0) < quantity:
+                return False
+            key = (cart_id, sku)
+            entry = self.holds.get(key)
+            if entry is None:
+                entry = self.holds[key] = [0, 0]
+                self.by_cart.setdefault(cart_id, set()).add(sku)
+            entry[0] += quantity
+            self.held[sku] = self.held.get(sku, 0) + quantity
+            self._renew(cart_id, now)
+            return True
+
+    def held_for(self, cart_id, sku):
+        """Return the units of a SKU currently held for a cart."""
+        with self.lock:
+            self._sweep(self.clock())
+            entry = self.holds.get((cart_id, sku))
+            return entry[0] if entry else 0
+
+    def available(self, sku, stock, cart_id=None):
+        """
+        Return the units of a SKU that can still be sold.
+
+        Parameters:
+        - sku: SKU of the phone variant
+        - stock: Units currently in stock
+        - cart_id: Optional cart whose own holds count as available to it
+
+        Returns:
+        - Stock minus the units held for other carts, never negative
+        """
+        with self.lock:
+            self._sweep(self.clock())
+            held = self.held.get(sku, 0)
+            if cart_id is not None:
+                entry = self.holds.get((cart_id, sku))
+                held -= entry[0] if entry else 0
+            return max(stock - held, 0)
+
+    def release(self, cart_id, sku=None, quantity=None):
+        """
+        Release held units, e.g. when a line is removed or the cart is checked out.
+
+        Parameters:
+        - cart_id: Identifier of the cart
+        - sku: SKU to release; all of the cart's holds when None
+        - quantity: Units to release; the whole hold when None
+        """
+        with self.lock:
+            skus = [sku] if sku is not None else list(self.by_cart.get(cart_id, ()))
+            for sku in skus:
+                entry = self.holds.get((cart_id, sku))
+                if entry is not None:
+                    self._drop(cart_id, sku, entry, entry[0] if quantity is None else min(quantity, entry[0]))
+
+    def sweep(self):
+        """Release expired holds; returns the number of holds released."""
+        with self.lock:
+            return self._sweep(self.clock())
+
+    def _renew(self, cart_id, now):
+        expires = now + self.ttl
+        for sku in self.by_cart.get(cart_id, ()):
+            self.holds[cart_id, sku][1] = expires
+            heapq.heappush(self.expiry, (expires, cart_id, sku))
+
+    def _sweep(self, now):
+        released = 0
+        while self.expiry and self.expiry[0][0] <= now:
+            expires, cart_id, sku = heapq.heappop(self.expiry)
+            entry = self.holds.get((cart_id, sku))
+            # Skip entries superseded by a renewal or for holds already released
+            if entry is not None and entry[1] == expires:
+                self._drop(cart_id, sku, entry, entry[0])
+                released += 1
+        return released
+
+    def _drop(self, cart_id, sku, entry, quantity):
+        entry[0] -= quantity
+        self.held[sku] -= quantity
+        if not self.held[sku]:
+            del self.held[sku]
+        if not entry[0]:
+            del self.holds[cart_id, sku]
+            skus = self.by_cart[cart_id]
+            skus.discard(sku)
+            if not skus:
+                del self.by_cart[cart_id]
+
+
+@lru_cache(maxsize=None)
+def get_stock_holds():
+    """
+    Return this process's stock holds, shared by every app session in it (and by
+    an InvoiceService created in the same process).
+
+    Set STOCK_HOLD_SECONDS to change how long an untouched cart keeps its units.
+    """
+    return StockHolds(int(os.environ.get("STOCK_HOLD_SECONDS", DEFAULT_HOLD_SECONDS)))
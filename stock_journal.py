@@ -0,0 +1,297 @@
+"""
+Stock movement journal for the mobile shop invoice generator.
+Every stock change (sale, return, receipt or adjustment) is appended to a JSON Lines
+journal before it is applied, so shrinkage can be audited and the stock rebuilt after
+a crash. Periodically the current stock is written as a snapshot and a new journal
+segment is started. On startup only the latest snapshot and the movements after it
+are read, so startup time does not grow with years of history; older segments are
+kept for auditing.
+
+Layout of a journal directory:
+    snapshot.json                   {"seq": N, "stock": {branch: {sku: units}}}
+    journal-000000000001.jsonl      movements 1..M, one JSON object per line
+    journal-<M+1>.jsonl             movements after the snapshot at M, and so on
+
+A sale is written as pending until its invoice is queued, and a "confirm" movement
+with the invoice number follows it; no snapshot is taken while a sale is pending. A
+pending sale that a crash left unconfirmed is found on load, so the stock it took can
+be put back with a compensating return.
+
+Only one process can write to a journal directory: load() takes an exclusive lock on
+the directory, held until close(), and fails if another process holds it. Auditing only
+reads the segments and needs no lock.
+
+Audit with:
+    python stock_journal.py journal-dir --sku "Samsung|Galaxy S23|128GB|Green"
+    python stock_journal.py journal-dir --shrinkage
+"""
+import argparse
+import datetime
+import fcntl
+import json
+import os
+
+# "confirm" marks the pending sale with the same ref as final; it changes no stock
+MOVEMENT_KINDS = ("sale", "return", "receipt", "adjustment", "confirm")
+
+# Movements between automatic snapshots
+DEFAULT_COMPACT_EVERY = 5000
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class JournalLockedError(RuntimeError):
+    """Raised when another process already writes to the journal directory."""
+
+
+class StockJournal:
+    """
+    Append-only journal of stock movements with snapshot compaction.
+
+    A movement is a dictionary with a sequence number, a timestamp, the kind,
+    the branch, the SKU, the signed change in units and an optional reference
+    such as an invoice number or the reason for an adjustment.
+    """
+    def __init__(self, directory, compact_every=DEFAULT_COMPACT_EVERY, durable=True):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.durable = durable
+        self.seq = 0
+        self.since_snapshot = 0
+        self.segment = None
+        self.lock_fd = None
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """
+        Lock the directory for writing, then rebuild the stock from the latest
+        snapshot and the movements after it.
+
+        Returns:
+        - Tuple of (stock as {branch: {sku: units}} or None when there is no
+          snapshot yet, list of movements after the snapshot in order)
+
+        Raises:
+        - JournalLockedError: If another process has the journal open for writing
+        """
+        self._lock()
+        stock = None
+        snapshot_seq = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            stock, snapshot_seq = snapshot["stock"], snapshot["seq"]
+
+        tail = []
+        segments = self._segments()
+        if segments:
+            # The next append may reopen the last segment, so a torn last line must not stay in it
+            _truncate_torn_tail(segments[-1][1])
+        for i, (start, path) in enumerate(segments):
+            # A segment ends where the next one starts; skip those wholly before the snapshot
+            if i + 1 < len(segments) and segments[i + 1][0] <= snapshot_seq + 1:
+                continue
+            tail.extend(movement for movement in _read_segment(path) if movement["seq"] > snapshot_seq)
+
+        self.seq = tail[-1]["seq"] if tail else snapshot_seq
+        self.since_snapshot = len(tail)
+        return stock, tail
+
+    def append(self, kind, branch, sku, change, ref=None, pending=False):
+        """
+        Write a movement to the journal.
+
+        Parameters:
+        - kind: One of MOVEMENT_KINDS
+        - branch: Branch code
+        - sku: SKU of the phone variant
+        - change: Signed change in units (negative for sales)
+        - ref: Optional invoice number, delivery note or adjustment reason
+        - pending: For a sale, whether it stays pending until a "confirm" movement with its ref
+
+        Returns:
+        - The movement dictionary as written
+        """
+        if kind not in MOVEMENT_KINDS:
+            raise ValueError(f"Unknown stock movement kind {kind!r}")
+        self.seq += 1
+        movement = {
+            "seq": self.seq,
+            "ts": datetime.datetime.now().isoformat(timespec="seconds"),
+            "kind": kind,
+            "branch": branch,
+            "sku": sku,
+            "change": change,
+        }
+        if ref:
+            movement["ref"] = ref
+        if pending:
+            movement["pending"] = True
+        if self.segment is None:
+            self.segment = open(self._segment_path(self.seq), "a", encoding="utf-8")
+        self.segment.write(json.dumps(movement) + "\n")
+        self.segment.flush()
+        if self.durable:
+            os.fsync(self.segment.fileno())
+        self.since_snapshot += 1
+        return movement
+
+    def unconfirmed(self, tail):
+        """
+        Find the pending sales in the movements after the snapshot that were never confirmed.
+
+        Parameters:
+        - tail: Movements after the snapshot, as returned by load()
+
+        Returns:
+        - {ref: {(branch, sku): units}} with the net stock change of each unconfirmed
+          sale's movements, returns included; sales already returned in full are left out
+        """
+        pending = {}
+        for movement in tail:
+            ref = movement.get("ref")
+            if movement.get("pending"):
+                pending.setdefault(ref, {})
+            elif movement["kind"] == "confirm":
+                pending.pop(ref, None)
+        changes = {}
+        for movement in tail:
+            ref = movement.get("ref")
+            if ref in pending and movement["kind"] != "confirm":
+                key = (movement["branch"], movement["sku"])
+                pending[ref][key] = pending[ref].get(key, 0) + movement["change"]
+        for ref, units in pending.items():
+            units = {key: change for key, change in units.items() if change}
+            if units:
+                changes[ref] = units
+        return changes
+
+    def needs_compaction(self):
+        return self.since_snapshot >= self.compact_every
+
+    def compact(self, stock):
+        """
+        Write a snapshot of the current stock and start a new journal segment.
+
+        Parameters:
+        - stock: Current stock as {branch: {sku: units}}, including every movement appended so far
+        """
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "stock": stock}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        self.since_snapshot = 0
+
+    def movements(self, sku=None, branch=None, kinds=None):
+        """
+        Iterate over the full movement history, oldest first, for auditing.
+
+        Parameters:
+        - sku, branch: Optional filters
+        - kinds: Optional collection of movement kinds to include
+        """
+        for _, path in self._segments():
+            for movement in _read_segment(path):
+                if ((sku is None or movement["sku"] == sku) and
+                    (branch is None or movement["branch"] == branch) and
+                    (kinds is None or movement["kind"] in kinds)):
+                    yield movement
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        if self.lock_fd is not None:
+            # Closing the descriptor releases the lock
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
+    def _lock(self):
+        """Take the exclusive writer lock on the directory, without waiting for it."""
+        if self.lock_fd is not None:
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise JournalLockedError(
+                f"Stock journal {self.directory} is open in another process; "
+                "only the process that owns the stock may write to it"
+            ) from None
+        self.lock_fd = fd
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        """Return (first seq, path) of every journal segment in order."""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                segments.append((int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+
+def _truncate_torn_tail(path):
+    """Cut a partly written last line, left by a crash, back to the last complete one."""
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            f.truncate(position)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_segment(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # A crash can leave a partly written last line; it was never applied
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit a stock movement journal.")
+    parser.add_argument("directory", help="Stock journal directory")
+    parser.add_argument("--sku", default=None, help="Only movements of this SKU")
+    parser.add_argument("--branch", default=None, help="Only movements at this branch")
+    parser.add_argument("--shrinkage", action="store_true", help="Summarize negative adjustments per branch and SKU")
+    args = parser.parse_args()
+
+    journal = StockJournal(args.directory)
+    if args.shrinkage:
+        losses = {}
+        for movement in journal.movements(args.sku, args.branch, kinds=("adjustment",)):
+            if movement["change"] < 0:
+                key = (movement["branch"], movement["sku"])
+                losses[key] = losses.get(key, 0) - movement["change"]
+        for (branch, sku), units in sorted(losses.items(), key=lambda entry: -entry[1]):
+            print(f"{branch:<10} {sku:<60} {units:>6} units")
+        return
+    for movement in journal.movements(args.sku, args.branch):
+        print(f"{movement['seq']:>8} {movement['ts']} {movement['kind']:<10} {movement['branch']:<10} "
+              f"{movement['change']:>+5} {movement['sku']} {movement.get('ref', '')}")
+
+
+if __name__ == "__main__":
+    main()
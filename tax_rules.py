@@ -0,0 +1,105 @@
+"""
+GST rate table for the mobile shop.
+The rules below map HSN codes to GST rates. At startup they are compiled into a lookup
+keyed by (HSN code, seller state, place of supply), so resolving the taxes of an invoice
+line is a single dict access. Intra-state supplies split the rate into CGST and SGST;
+inter-state supplies carry the whole rate as IGST.
+"""
+from collections import namedtuple
+
+from mobile_data import MOBILE_DATABASE
+from utils import STATE_CODES
+
+TaxRate = namedtuple("TaxRate", ["sgst_rate", "cgst_rate", "igst_rate"])
+
+# GST rate applied when no rule matches an HSN code
+DEFAULT_GST_RATE = 18
+
+# (HSN prefix, GST rate %, description). The longest matching prefix wins, so
+# a specific 6 or 8 digit code can override the rate of its 4 digit heading.
+TAX_RULES = [
+    ("8517", 18, "Mobile phones and smartphones"),
+    ("8504", 18, "Chargers and power adapters"),
+    ("8507", 18, "Batteries and power banks"),
+    ("8518", 18, "Earphones, headphones and speakers"),
+    ("8523", 18, "Memory cards and storage media"),
+    ("8544", 18, "Data and charging cables"),
+    ("3926", 18, "Plastic covers and cases"),
+    ("4202", 18, "Leather and fabric pouches"),
+    ("7007", 18, "Tempered glass screen guards"),
+    ("9987", 18, "Repair and maintenance services"),
+]
+
+
+def gst_rate_for_hsn(hsn_code, rules=TAX_RULES):
+    """
+    Evaluate the rules for one HSN code.
+
+    Parameters:
+    - hsn_code: HSN or SAC code of the goods or service
+    - rules: (prefix, rate, description) rules
+
+    Returns:
+    - GST rate in percent
+    """
+    best_prefix, best_rate = "", DEFAULT_GST_RATE
+    for prefix, rate, _ in rules:
+        if hsn_code.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix, best_rate = prefix, rate
+    return best_rate
+
+
+def split_rate(gst_rate, seller_state, place_of_supply):
+    """Split a GST rate into SGST, CGST and IGST for a supply between two states."""
+    if seller_state != place_of_supply:
+        return TaxRate(0, 0, gst_rate)
+    half = gst_rate / 2
+    # Keep whole-number rates as ints so they print as "9%" rather than "9.0%"
+    if half == int(half):
+        half = int(half)
+    return TaxRate(half, half, 0)
+
+
+def compile_tax_table(hsn_codes, states=STATE_CODES, rules=TAX_RULES):
+    """
+    Compile the rules into a (HSN code, seller state, place of supply) lookup.
+
+    Parameters:
+    - hsn_codes: HSN codes to precompute, e.g. every code in the catalog
+    - states: State codes used both as seller state and place of supply
+    - rules: (prefix, rate, description) rules
+
+    Returns:
+    - Dictionary mapping (hsn_code, seller_state, place_of_supply) to a TaxRate
+    """
+    table = {}
+    for hsn_code in hsn_codes:
+        gst_rate = gst_rate_for_hsn(hsn_code, rules)
+        for seller_state in states:
+            for place_of_supply in states:
+                table[hsn_code, seller_state, place_of_supply] = split_rate(gst_rate, seller_state, place_of_supply)
+    return table
+
+
+# Compiled once on import for every HSN code in the catalog
+TAX_TABLE = compile_tax_table({phone["hsn_code"] for models in MOBILE_DATABASE.values() for phone in models})
+
+
+def get_tax_rate(hsn_code, seller_state, place_of_supply):
+    """
+    Look up the tax rates for an invoice line.
+
+    Parameters:
+    - hsn_code: HSN code of the item
+    - seller_state: State code of the seller's GSTIN
+    - place_of_supply: State code of the place of supply
+
+    Returns:
+    - TaxRate(sgst_rate, cgst_rate, igst_rate) in percent
+    """
+    key = (hsn_code, seller_state, place_of_supply)
+    rate = TAX_TABLE.get(key)
+    if rate is None:
+        # Codes added after startup are resolved once and then served from the table
+        rate = TAX_TABLE[key] = split_rate(gst_rate_for_hsn(hsn_code), seller_state, place_of_supply)
+    return rate
@@ -0,0 +1,72 @@
+"""
+Artifact store: memory use stays within the global and per-session budgets by spilling the
+least recently used artifacts, and spilled files are deleted to stay within the disk budget.
+"""
+import os
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+KB = 1024
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArtifactStore(memory_budget=10 * KB, session_budget=4 * KB, disk_budget=8 * KB,
+                          spill_dir=str(tmp_path / "spill"))
+    yield store
+    store.close()
+
+
+def artifact(n):
+    return bytes([n]) * KB
+
+
+def disk_usage(store):
+    return sum(os.path.getsize(os.path.join(store.spill_dir, name)) for name in os.listdir(store.spill_dir))
+
+
+def test_session_budget_spills_its_own_oldest_artifacts(store):
+    busy = [store.put("busy", artifact(i)) for i in range(6)]
+    quiet = store.put("quiet", artifact(9))
+
+    assert store.session_bytes == {"busy": 4 * KB, "quiet": KB}
+    assert list(store.disk) == busy[:2]
+    # Spilled artifacts are still served, from disk
+    assert store.get(busy[0]) == artifact(0)
+    assert store.get(quiet) == artifact(9)
+
+
+def test_memory_budget_spills_the_least_recently_used(store):
+    handles = [store.put(f"session-{i}", artifact(i)) for i in range(10)]
+    store.get(handles[0])
+    handles.append(store.put("session-10", artifact(10)))
+
+    assert store.memory_bytes <= store.memory_budget
+    # The first artifact was read last, so the second one went instead
+    assert list(store.disk) == [handles[1]]
+
+
+def test_eviction_keeps_memory_and_disk_within_budget(store):
+    handles = [store.put(f"session-{i % 5}", artifact(i)) for i in range(40)]
+
+    stats = store.stats()
+    assert stats["memory_bytes"] <= store.memory_budget
+    assert stats["disk_bytes"] <= store.disk_budget
+    assert disk_usage(store) == stats["disk_bytes"]
+    assert stats["spills"] == 30
+    # The oldest spilled artifacts were deleted; callers regenerate them on a miss
+    assert store.get(handles[0]) is None
+    assert store.get(handles[-1]) == artifact(39)
+
+
+def test_release_session_frees_memory_and_files(store):
+    for i in range(6):
+        store.put("busy", artifact(i))
+    kept = store.put("other", artifact(9))
+    store.release_session("busy")
+
+    assert store.stats()["memory_bytes"] == KB
+    assert disk_usage(store) == 0
+    assert store.get(kept) == artifact(9)
@@ -0,0 +1,40 @@
+"""
+Monthly bulk re-render: busy months split into volumes, and output is only reused for the same job.
+"""
+import datetime
+import json
+
+import pytest
+
+from bulk_render import input_description, read_invoices, render_monthly
+from invoice_generator import Invoice, InvoiceItem
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / "invoices.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for day, month in [(3, 4), (9, 4), (21, 4), (2, 5)]:
+            invoice = Invoice("Ravi Kumar", "12 MG Road, Bangalore", "9876543210")
+            invoice.add_item(InvoiceItem("Apple", "iPhone 15", "128GB", "Black", 79900, "85171290"))
+            f.write(json.dumps(dict(invoice.to_dict(), date=f"{day:02d}-{month:02d}-2024")) + "\n")
+    return str(path)
+
+
+def test_months_split_into_volumes(export, tmp_path):
+    output = tmp_path / "reprints"
+    job = input_description(export)
+    assert render_monthly(read_invoices(export), str(output), workers=2, volume_size=2, job=job) == 4
+    assert sorted(p.name for p in output.glob("*.pdf")) == ["2024-04-001.pdf", "2024-04-002.pdf", "2024-05-001.pdf"]
+
+    # A rerun of the same job finds every volume written
+    assert render_monthly(read_invoices(export), str(output), workers=2, volume_size=2, job=job) == 0
+
+
+def test_rerun_with_other_dates_is_refused(export, tmp_path):
+    output = str(tmp_path / "reprints")
+    render_monthly(read_invoices(export), output, workers=1, job=input_description(export))
+
+    start = datetime.date(2024, 4, 10)
+    with pytest.raises(ValueError, match="different job"):
+        render_monthly(read_invoices(export, start), output, workers=1, job=input_description(export, start))
@@ -0,0 +1,82 @@
+"""
+Shopping cart: lines keyed by SKU, running totals kept right as units are added and
+removed, and taxes re-rated when the place of supply changes.
+"""
+import pytest
+
+from cart import Cart
+from invoice_generator import SELLER_STATE, Invoice, InvoiceItem
+
+PHONE = {
+    "brand": "Samsung", "model": "Galaxy S23", "storage": "256GB", "color": "Black",
+    "price": 74999, "hsn_code": "85171290", "description": "Samsung Galaxy S23 (256GB, Black)",
+}
+OTHER = dict(PHONE, model="Galaxy A54", price=38999, description="Samsung Galaxy A54 (256GB, Black)")
+
+
+def invoice_totals(cart, customer_gstin=None):
+    """Totals of an invoice billing the same lines, to check the running totals against."""
+    invoice = Invoice("Ravi Kumar", "12 MG Road, Bangalore", "9876543210", customer_gstin=customer_gstin)
+    for line in cart:
+        invoice.add_item(InvoiceItem(line["brand"], line["model"], line["storage"], line["color"],
+                                     line["price"], line["hsn_code"], line["quantity"]))
+    return invoice.sub_total, invoice.total_sgst + invoice.total_cgst + invoice.total_igst, invoice.grand_total
+
+
+def test_adding_the_same_phone_merges_lines():
+    cart = Cart()
+    sku = cart.add(PHONE)
+    assert cart.add(PHONE, 2) == sku
+    cart.add(OTHER)
+
+    assert len(cart) == 2
+    assert cart.item_count == 4
+    assert cart.subtotal == 3 * 74999 + 38999
+    assert (cart.subtotal, cart.tax_total, cart.grand_total) == pytest.approx(invoice_totals(cart))
+    assert cart.tax_amounts == pytest.approx({("SGST", 9): cart.subtotal * 0.09, ("CGST", 9): cart.subtotal * 0.09})
+
+
+def test_removing_units_updates_the_totals():
+    cart = Cart()
+    sku = cart.add(PHONE, 3)
+    cart.add(OTHER)
+    cart.remove(sku, 2)
+
+    assert cart.lines[sku]["quantity"] == 1
+    assert cart.item_count == 2
+    assert (cart.subtotal, cart.tax_total, cart.grand_total) == pytest.approx(invoice_totals(cart))
+
+    # Removing more than the line holds removes the line
+    cart.remove(sku, 5)
+    assert sku not in cart.lines
+    assert cart.item_count == 1
+
+
+def test_emptied_cart_starts_from_zero():
+    cart = Cart()
+    sku = cart.add(PHONE, 3)
+    cart.add(OTHER)
+    cart.remove(sku)
+    cart.remove(cart.add(OTHER))
+
+    assert not cart
+    assert (cart.item_count, cart.subtotal, cart.tax_total, cart.tax_amounts) == (0, 0, 0, {})
+
+
+def test_removing_an_unknown_line_is_ignored():
+    cart = Cart()
+    cart.add(PHONE)
+    cart.remove("no-such-sku")
+    assert cart.item_count == 1
+
+
+def test_inter_state_supply_switches_to_igst():
+    cart = Cart()
+    cart.add(PHONE, 2)
+    cart.set_place_of_supply("27")
+
+    assert cart.tax_amounts == pytest.approx({("IGST", 18): 2 * 74999 * 0.18})
+    assert (cart.subtotal, cart.tax_total, cart.grand_total) == pytest.approx(invoice_totals(cart, "27AAPFU0939F1ZV"))
+
+    cart.set_place_of_supply(SELLER_STATE)
+    assert set(cart.tax_amounts) == {("SGST", 9), ("CGST", 9)}
@@ -0,0 +1,57 @@
+"""
+Catalog image: every catalog row reads back from the built image, lookups by SKU, brand and
+substring match the catalog, and a rebuilt image does not disturb a reader of the old one.
+"""
+import pytest
+
+from catalog_image import CatalogImage, build_catalog_image
+from mobile_data import MOBILE_DATABASE, phone_sku
+
+FIELDS = ("model", "storage", "color", "price", "hsn_code", "description")
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = str(tmp_path / "catalog.img")
+    build_catalog_image(MOBILE_DATABASE, path)
+    image = CatalogImage(path)
+    yield image
+    image.close()
+
+
+def test_every_row_reads_back(image):
+    rows = [(brand, phone) for brand, models in MOBILE_DATABASE.items() for phone in models]
+    assert len(image) == len(rows)
+    for brand, phone in rows:
+        row = image.get(phone_sku(brand, phone["model"], phone["storage"], phone["color"]))
+        assert row == dict({field: phone[field] for field in FIELDS}, brand=brand)
+
+
+def test_lookups_match_the_catalog(image):
+    assert image.get("Nokia|3310|16MB|Blue") is None
+    assert image.brand_names() == list(MOBILE_DATABASE)
+    for brand, models in MOBILE_DATABASE.items():
+        assert [row["model"] for row in image.brand_records(brand)] == [phone["model"] for phone in models]
+
+    expected = [
+        (brand, phone["model"], phone["color"]) for brand, models in MOBILE_DATABASE.items() for phone in models
+        if any("black" in text.lower() for text in (brand, phone["model"], phone["description"], phone["color"]))
+    ]
+    assert [(row["brand"], row["model"], row["color"]) for row in image.search("Black")] == expected
+
+
+def test_rebuild_leaves_open_readers_on_the_old_image(image, tmp_path):
+    brand = next(iter(MOBILE_DATABASE))
+    build_catalog_image({brand: MOBILE_DATABASE[brand][:1]}, image.path)
+
+    assert len(image) == sum(len(models) for models in MOBILE_DATABASE.values())
+    rebuilt = CatalogImage(image.path)
+    assert len(rebuilt) == 1
+    rebuilt.close()
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "not-an-image.img"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError, match="not a version"):
+        CatalogImage(str(path))
@@ -0,0 +1,30 @@
+"""
+Catalog search: unfinished last words, units and "+" are searchable, and numbers are never fuzzy.
+"""
+import pytest
+
+from mobile_data import search_phones
+
+
+@pytest.mark.parametrize("query, model", [
+    ("Galaxy S", "Galaxy S23"),
+    ("Galaxy A", "Galaxy A54"),
+    ("redmi n", "Note 13"),
+    ("galxy s23", "Galaxy S23"),
+])
+def test_best_match_first(query, model):
+    assert search_phones(query)[0]["model"] == model
+
+
+def test_storage_is_matched_exactly():
+    results = search_phones("128GB")
+    assert results and {row["storage"] for row in results} == {"128GB"}
+
+
+def test_unit_and_plus_on_their_own():
+    assert search_phones("GB")
+    assert all(row["model"].endswith("+") for row in search_phones("+")[:4])
+
+
+def test_only_the_last_word_is_a_short_prefix():
+    assert search_phones("s galaxy") == []
@@ -0,0 +1,101 @@
+"""
+Customer directory: prefix lookup by phone and name, and one directory file shared by
+several processes, which see each other's customers and survive a compaction.
+"""
+import json
+import multiprocessing
+
+import pytest
+
+from customer_directory import CustomerDirectory
+
+
+def customer(phone, name="Ravi Kumar", **fields):
+    return dict(fields, phone=phone, name=name)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "customers.jsonl")
+
+
+def test_prefix_search_by_phone_and_name():
+    directory = CustomerDirectory()
+    directory.upsert(customer("9876543210", "Ravi Kumar"))
+    directory.upsert(customer("9876500000", "Anita Rao"))
+    directory.upsert(customer("9123456789", "Kumar Stores"))
+
+    assert [c["name"] for c in directory.search("98765")] == ["Anita Rao", "Ravi Kumar"]
+    assert [c["phone"] for c in directory.search("+91 91234")] == ["9123456789"]
+    assert {c["name"] for c in directory.search("kum")} == {"Ravi Kumar", "Kumar Stores"}
+    assert directory.search("") == []
+
+
+def test_update_replaces_the_name_keys():
+    directory = CustomerDirectory()
+    directory.upsert(customer("9876543210", "Ravi Kumar"))
+    directory.upsert(customer("+91 98765 43210", "Ravi Sharma", gstin="27aapfu0939f1zv"))
+
+    assert len(directory) == 1
+    assert directory.search("kumar") == []
+    assert directory.get("9876543210")["gstin"] == "27AAPFU0939F1ZV"
+
+
+def test_invalid_phone_is_not_stored():
+    directory = CustomerDirectory()
+    assert directory.upsert(customer("12345")) is None
+    assert directory.import_customers([customer("12345"), customer("9876543210")]) == (1, 1)
+
+
+def test_directories_on_one_file_see_each_others_customers(path):
+    app, service = CustomerDirectory(path), CustomerDirectory(path)
+    app.upsert(customer("9876543210", "Ravi Kumar"))
+    service.upsert(customer("9123456789", "Anita Rao"))
+    service.import_customers([customer("9876543210", "Ravi K. Kumar")])
+
+    assert app.get("9123456789")["name"] == "Anita Rao"
+    assert [c["name"] for c in app.search("ravi")] == ["Ravi K. Kumar"]
+    assert len(CustomerDirectory(path)) == 2
+
+
+def test_compaction_is_followed_by_other_directories(path):
+    app, service = CustomerDirectory(path), CustomerDirectory(path)
+    for name in ("Ravi", "Ravi Kumar", "Ravi Kumar Sharma"):
+        app.upsert(customer("9876543210", name))
+    service.compact()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+    app.upsert(customer("9123456789", "Anita Rao"))
+    assert service.get("9123456789")["name"] == "Anita Rao"
+    assert service.get("9876543210")["name"] == "Ravi Kumar Sharma"
+
+
+def test_torn_last_line_is_skipped(path):
+    CustomerDirectory(path).upsert(customer("9876543210"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(customer("9123456789"))[:20])
+
+    directory = CustomerDirectory(path)
+    assert len(directory) == 1
+    directory.upsert(customer("9000000000", "Anita Rao"))
+    assert len(CustomerDirectory(path)) == 2
+
+
+def _add_customers(path, first_phone, count):
+    directory = CustomerDirectory(path)
+    for phone in range(first_phone, first_phone + count):
+        directory.upsert(customer(str(phone), f"Customer {phone}"))
+
+
+def test_processes_append_without_losing_customers(path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_add_customers, args=(path, first, 50))
+               for first in (9000000000, 8000000000, 7000000000)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len(CustomerDirectory(path)) == 150
@@ -0,0 +1,40 @@
+"""
+e-Invoice QR codes: what the encoder draws must scan back to the exact payload.
+"""
+import pytest
+import zxingcpp
+from PIL import Image
+
+from e_invoice import QR_QUIET_ZONE, e_invoice_details, qr_modules, verify_signed_qr
+
+KEY = b"test-signing-key"
+
+
+def scan(text, box=4):
+    """Draw text with qr_modules onto an image and decode it."""
+    count, runs = qr_modules(text)
+    side = (count + 2 * QR_QUIET_ZONE) * box
+    image = Image.new("L", (side, side), 255)
+    for row, column, length in runs:
+        left, top = (column + QR_QUIET_ZONE) * box, (row + QR_QUIET_ZONE) * box
+        image.paste(0, (left, top, left + length * box, top + box))
+    results = zxingcpp.read_barcodes(image, formats=zxingcpp.BarcodeFormat.QRCode)
+    assert len(results) == 1
+    return results[0].text
+
+
+# Lengths around the version and length-field boundaries, from one character up
+@pytest.mark.parametrize("length", [1, 2, 13, 14, 15, 25, 26, 62, 63, 170, 213, 214, 471, 1000, 2331])
+def test_payload_round_trips(length):
+    text = ("eyJhbGciOiJIUzI1NiJ9.-_" * 200)[:length]
+    assert scan(text) == text
+
+
+def test_signed_invoice_qr_round_trips():
+    invoice_data = {
+        "seller_gstin": "29ABCDE1234F1Z5", "customer_gstin": "27AAPFU0939F1ZV",
+        "invoice_number": "INV-20240403-A1B2C3", "date": "03-04-2024", "time": "11:30:00",
+        "grand_total": 147498.82, "items": [{"amount": 124999.0, "hsn_code": "85171290"}],
+    }
+    details = e_invoice_details(invoice_data, KEY)
+    assert verify_signed_qr(scan(details["signed_qr"]), KEY)["Irn"] == details["irn"]
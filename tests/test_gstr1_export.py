@@ -0,0 +1,69 @@
+"""
+GSTR-1 export: B2B invoices grouped by buyer, large inter-state B2C invoices reported one by one
+in B2CL, the rest of B2C summed in B2CS, and malformed return periods refused.
+"""
+import datetime
+import io
+import json
+
+import pytest
+
+from gstr1_export import b2cl_limit, export_gstr1, parse_period
+from invoice_generator import SELLER_GSTIN, Invoice, InvoiceItem
+
+
+def make_invoice(price, day=10, customer_gstin=None, place_of_supply=None, quantity=1):
+    invoice = Invoice("Ravi Kumar", "12 MG Road, Bangalore", "9876543210", customer_gstin=customer_gstin)
+    invoice.date = datetime.datetime(2025, 3, day)
+    if place_of_supply:
+        # A walk-in buyer whose phone is delivered to another state
+        invoice.place_of_supply = place_of_supply
+    invoice.add_item(InvoiceItem("Apple", "iPhone 15", "128GB", "Black", price, "85171290", quantity))
+    return invoice.to_dict()
+
+
+def export(invoices, period="032025"):
+    out = io.StringIO()
+    summary = export_gstr1(invoices, out, SELLER_GSTIN, period)
+    return json.loads(out.getvalue()), summary
+
+
+def test_b2c_invoices_split_between_b2cl_and_b2cs():
+    large_inter_state = make_invoice(150000, place_of_supply="27")
+    small_inter_state = make_invoice(50000, place_of_supply="27")
+    large_local = make_invoice(150000)
+    registered = make_invoice(150000, customer_gstin="27AAPFU0939F1ZV")
+    gstr1, summary = export([large_inter_state, small_inter_state, large_local, registered])
+
+    assert gstr1["b2cl"] == [{"pos": "27", "inv": [{
+        "inum": large_inter_state["invoice_number"], "idt": "10-03-2025", "val": 177000.0,
+        "itms": [{"num": 1, "itm_det": {"rt": 18, "txval": 150000.0, "iamt": 27000.0, "csamt": 0}}],
+    }]}]
+    # The B2CL invoice is not counted again in the B2CS totals
+    assert {(row["sply_ty"], row["pos"], row["txval"]) for row in gstr1["b2cs"]} == {
+        ("INTER", "27", 50000.0), ("INTRA", "29", 150000.0),
+    }
+    assert [group["ctin"] for group in gstr1["b2b"]] == ["27AAPFU0939F1ZV"]
+    assert (summary["b2b"], summary["b2c"], summary["b2cl"]) == (1, 3, 1)
+    # Every invoice is still in the HSN summary
+    assert gstr1["hsn"]["data"][0]["qty"] == 4
+
+
+def test_b2cl_limit_follows_the_invoice_date():
+    assert b2cl_limit(datetime.date(2024, 7, 31)) == 250000
+    assert b2cl_limit(datetime.date(2024, 8, 1)) == 100000
+
+
+def test_only_invoices_in_the_period_are_exported():
+    _, summary = export([make_invoice(1000, day=1), make_invoice(1000, day=31)], period="022025")
+    assert (summary["invoices"], summary["skipped"]) == (0, 2)
+
+
+@pytest.mark.parametrize("period", ["3-2025", "132025", "002025", "03-2025", "march", "", "032025x"])
+def test_malformed_period_is_refused(period):
+    with pytest.raises(ValueError, match="Return period"):
+        export([make_invoice(1000)], period=period)
+
+
+def test_period_covers_the_whole_month():
+    assert parse_period("022024") == (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))
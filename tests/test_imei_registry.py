@@ -0,0 +1,116 @@
+"""
+IMEI registry: a unit can be sold only once, also when two processes share the registry
+directory, and lookups follow the index as another process grows it.
+"""
+import multiprocessing
+
+import pytest
+
+from imei_registry import RETIRED, ImeiRegistry
+
+SKU = ("Samsung", "Galaxy S23 Ultra", "256GB", "Phantom Black")
+
+
+def invoice(number, *imeis):
+    return {
+        "invoice_number": number, "date": "01-04-2024",
+        "items": [dict(zip(("brand", "model", "storage", "color"), SKU), imeis=list(imeis))],
+    }
+
+
+def imei(n):
+    return f"35693803{n:07d}"
+
+
+@pytest.fixture(params=["memory", "disk"])
+def registry(request, tmp_path):
+    registry = ImeiRegistry(None if request.param == "memory" else str(tmp_path), durable=False)
+    yield registry
+    registry.close()
+
+
+def test_unit_is_sold_once(registry):
+    assert registry.register_invoice(invoice("INV-1", imei(1), imei(2)), "BLR-MG") == 2
+    with pytest.raises(ValueError, match=imei(2)):
+        registry.register_invoice(invoice("INV-2", imei(3), imei(2)))
+
+    # Nothing of the refused invoice was registered
+    assert registry.lookup(imei(3)) is None
+    assert len(registry) == 2
+    assert registry.lookup("35-693803-000000-2")["invoice_number"] == "INV-1"
+
+
+def test_imei_twice_on_one_invoice_is_refused(registry):
+    with pytest.raises(ValueError, match="more than once"):
+        registry.register_invoice(invoice("INV-1", imei(1), imei(1)))
+    assert len(registry) == 0
+
+
+def test_registries_on_one_directory_share_sales(tmp_path):
+    app, service = ImeiRegistry(str(tmp_path), durable=False), ImeiRegistry(str(tmp_path), durable=False)
+    app.register_invoice(invoice("INV-1", imei(1)))
+    with pytest.raises(ValueError, match="already sold"):
+        service.register_invoice(invoice("INV-2", imei(1)))
+
+    # Enough units to grow the index, which replaces its file
+    for n in range(2, 1500):
+        service.register_invoice(invoice(f"INV-{n}", imei(n)))
+    assert len(app) == 1499
+    assert app.lookup(imei(1400))["invoice_number"] == "INV-1400"
+    with pytest.raises(ValueError, match="already sold"):
+        app.register_invoice(invoice("INV-X", imei(1499)))
+    app.close()
+    service.close()
+
+
+def test_lost_index_is_rebuilt_on_open(tmp_path):
+    registry = ImeiRegistry(str(tmp_path), durable=False)
+    registry.register_invoice(invoice("INV-1", imei(1), imei(2)))
+    registry.close()
+    (tmp_path / "index.bin").unlink()
+
+    registry = ImeiRegistry(str(tmp_path), durable=False)
+    assert registry.lookup(imei(2))["invoice_number"] == "INV-1"
+    registry.close()
+
+
+def test_index_retired_by_a_crashed_writer_stays_in_use(tmp_path):
+    registry = ImeiRegistry(str(tmp_path), durable=False)
+    registry.register_invoice(invoice("INV-1", imei(1)))
+    # The writer flagged the index as replaced, then died before renaming the new one over it
+    registry.index[6] = RETIRED
+
+    other = ImeiRegistry(str(tmp_path), durable=False)
+    assert registry.lookup(imei(1))["invoice_number"] == "INV-1"
+    assert other.index[6] == 0
+    other.register_invoice(invoice("INV-2", imei(2)))
+    assert registry.lookup(imei(2))["invoice_number"] == "INV-2"
+    registry.close()
+    other.close()
+
+
+def _sell_all(directory, name):
+    """Try to sell every unit; returns the numbers of the units this process sold."""
+    registry = ImeiRegistry(directory, durable=False)
+    sold = []
+    for n in range(300):
+        try:
+            registry.register_invoice(invoice(f"{name}-{n}", imei(n)))
+            sold.append(n)
+        except ValueError:
+            pass
+    registry.close()
+    return sold
+
+
+def test_two_processes_never_sell_a_unit_twice(tmp_path):
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        app, service = pool.starmap(_sell_all, [(str(tmp_path), "APP"), (str(tmp_path), "SVC")])
+
+    assert not set(app) & set(service)
+    assert sorted(app + service) == list(range(300))
+    registry = ImeiRegistry(str(tmp_path))
+    assert len(registry) == 300
+    with open(tmp_path / "units.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 300
+    registry.close()
@@ -0,0 +1,92 @@
+"""
+Request validation in the HTTP service: malformed JSON values and headers are reported as 400s.
+"""
+import socket
+import threading
+
+import pytest
+
+from invoice_service import InvoiceService, ServiceError, create_server
+from job_queue import JobQueue
+
+ITEM = {"brand": "Samsung", "model": "Galaxy S23 Ultra", "storage": "256GB", "color": "Phantom Black"}
+CUSTOMER = {"name": "Ravi Kumar", "address": "12 MG Road, Bangalore", "phone": "9876543210"}
+
+
+@pytest.fixture
+def service(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    yield InvoiceService(queue)
+    queue.close()
+
+
+def assert_bad_request(call, message):
+    with pytest.raises(ServiceError) as error:
+        call()
+    assert error.value.status == 400
+    assert message in error.value.message
+
+
+@pytest.mark.parametrize("quantity", [None, "two", "1.5", 1.5, True, [1], 0, -2, float("inf"), float("nan"), "1e999"])
+def test_bad_quantity(service, quantity):
+    item = dict(ITEM, quantity=quantity)
+    assert_bad_request(lambda: service.check_stock(item), "Quantity")
+    assert_bad_request(lambda: service.create_invoice({"customer": CUSTOMER, "items": [item]}), "Quantity")
+
+
+def test_bad_quantity_in_query(service):
+    assert_bad_request(lambda: service.find_stock({"model": "Galaxy", "quantity": "many"}), "Quantity")
+
+
+@pytest.mark.parametrize("field", ["phone", "gstin", "email", "name", "address"])
+def test_non_string_customer_field(service, field):
+    customer = dict(CUSTOMER, **{field: 9876543210})
+    assert_bad_request(lambda: service.create_invoice({"customer": customer, "items": [ITEM]}),
+                       f"Customer {field} must be a string")
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"customer": "Ravi", "items": [ITEM]}, "Customer must be a JSON object"),
+    ({"customer": CUSTOMER, "items": {"brand": "Samsung"}}, "Items must be a list"),
+    ({"customer": CUSTOMER, "items": ["Galaxy S23"]}, "Each item must be a JSON object"),
+    ({"customer": CUSTOMER, "items": [dict(ITEM, model=23)]}, "Item field model must be a string"),
+    ({"customer": CUSTOMER, "items": [dict(ITEM, imeis=[490154203237518])]}, "one IMEI per unit"),
+    ({"customer": CUSTOMER, "items": [ITEM], "branch": ["main"]}, "Unknown branch"),
+])
+def test_malformed_invoice(service, payload, message):
+    assert_bad_request(lambda: service.create_invoice(payload), message)
+
+
+@pytest.fixture
+def server():
+    server, _ = create_server(port=0, workers=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def exchange(address, request):
+    """Send raw request bytes and return everything the server answers before closing."""
+    with socket.create_connection(address, timeout=5) as connection:
+        connection.sendall(request)
+        response = b""
+        while chunk := connection.recv(65536):
+            response += chunk
+    return response
+
+
+@pytest.mark.parametrize("length", [b"-1", b"many"])
+def test_bad_content_length(server, length):
+    response = exchange(server, b"POST /invoices HTTP/1.1\r\nHost: x\r\nContent-Length: " + length + b"\r\n\r\n")
+    assert response.startswith(b"HTTP/1.1 400")
+    assert b"Content-Length" in response
+
+
+def test_oversized_body_closes_the_connection(server):
+    # The unread body would otherwise be parsed as a second request
+    body = b"GET /catalog/search?q=galaxy HTTP/1.1\r\nHost: x\r\n\r\n"
+    response = exchange(server, b"POST /invoices HTTP/1.1\r\nHost: x\r\nContent-Length: 999999999\r\n\r\n" + body)
+    assert response.startswith(b"HTTP/1.1 413")
+    assert response.count(b"HTTP/1.1 ") == 1
@@ -0,0 +1,90 @@
+"""
+Job queue: leases decide who may finish a job, attempts are capped, and a dead pool process is survived.
+"""
+import os
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, JobWorkers
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0)
+    yield queue
+    queue.close()
+
+
+def test_only_the_current_lease_finishes_a_job(queue):
+    queue.enqueue("render", {}, key="render:INV-1")
+    first = queue.claim()
+    # The first lease has run out, so another worker takes the job over
+    second = queue.claim()
+    assert (first["id"], second["attempts"]) == (second["id"], 2)
+
+    assert queue.complete(first, b"stale") is False
+    assert queue.fail(first, "stale") is False
+    assert queue.complete(second, b"pdf") is True
+    assert queue.complete(second, b"again") is False
+    job = queue.get("render:INV-1")
+    assert (job["status"], job["result"]) == ("done", b"pdf")
+
+
+def test_expired_last_attempt_is_not_reclaimed(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2, lease_seconds=0)
+    queue.enqueue_many([("render", {}, "render:INV-1", None), ("deliver", {}, "deliver:INV-1", "render:INV-1")])
+    assert queue.claim()["attempts"] == 1
+    assert queue.claim()["attempts"] == 2
+    assert queue.claim() is None
+    assert queue.counts() == {"failed": 2}
+    assert queue.get("render:INV-1")["last_error"] == "Lease expired on attempt 2"
+    queue.close()
+
+
+def test_jobs_are_discarded_when_the_work_fails(queue):
+    with pytest.raises(ValueError):
+        with queue.enqueue_with([("render", {}, "render:INV-1", None)]):
+            raise ValueError("IMEI already sold")
+    assert queue.get("render:INV-1") is None
+
+
+def test_purge_keeps_the_invoice_renders(queue):
+    queue.enqueue_many([("render", {"invoice_number": "INV-1"}, "render:INV-1", None),
+                        ("deliver", {}, "deliver:INV-1", "render:INV-1")])
+    for _ in range(2):
+        assert queue.complete(queue.claim(), b"pdf") is True
+    assert queue.purge(-1) == 1
+    assert queue.get("deliver:INV-1") is None
+    # The invoice and its PDF are served from the render job
+    assert queue.get("render:INV-1")["payload"] == {"invoice_number": "INV-1"}
+
+
+def crash(payload):
+    os._exit(1)
+
+
+def succeed(payload):
+    return b"pdf"
+
+
+def wait_for(queue, key, status):
+    deadline = time.monotonic() + 30
+    while queue.get(key)["status"] != status:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_workers_replace_a_broken_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "HANDLERS", {"crash": crash, "render": succeed})
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=1)
+    workers = JobWorkers(queue, 1, processes=1)
+    try:
+        queue.enqueue("crash", {}, key="crash")
+        wait_for(queue, "crash", "failed")
+        queue.enqueue("render", {}, key="render:INV-1")
+        wait_for(queue, "render:INV-1", "done")
+    finally:
+        workers.shutdown()
+        queue.close()
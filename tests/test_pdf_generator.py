@@ -0,0 +1,104 @@
+"""
+A4 invoice layout: the fixed canvas page starts every line of text where the flowable layout
+does and reads back as the same lines, and invoices it cannot plan fall back to the flowables.
+"""
+import io
+
+import pytest
+from pypdf import PdfReader
+from pypdf.generic import ContentStream
+
+from invoice_generator import Invoice, InvoiceItem
+from pdf_fonts import get_invoice_fonts
+from pdf_generator import (
+    _fixed_layout, _invoice_content, _invoice_doc, _invoice_flowables, create_invoice_pdf, create_invoices_pdf,
+)
+
+
+def make_invoice(lines=3, customer_name="Ravi Kumar", customer_gstin=None):
+    invoice = Invoice(customer_name, "12 MG Road, Bangalore", "9876543210", customer_gstin=customer_gstin)
+    for i in range(lines):
+        invoice.add_item(InvoiceItem("Samsung", f"Galaxy S{20 + i}", "256GB", "Phantom Black", 24999 + i, "85171290"))
+    return invoice.to_dict()
+
+
+def flowable_pdf(invoice_data):
+    fonts = get_invoice_fonts()
+    buffer = io.BytesIO()
+    _invoice_doc(buffer, fonts, False).build(_invoice_flowables(_invoice_content(invoice_data, fonts), fonts))
+    return buffer.getvalue()
+
+
+def _multiply(a, b):
+    return [
+        a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+        a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3],
+        a[4] * b[0] + a[5] * b[2] + b[4], a[4] * b[1] + a[5] * b[3] + b[5],
+    ]
+
+
+def text_starts(pdf_bytes):
+    """
+    Read where each line of text in a PDF starts, following the graphics and text state operators.
+
+    Returns:
+    - Per page, the sorted start points of the lines of text, rounded to a tenth of a point
+    """
+    pages = []
+    for page in PdfReader(io.BytesIO(pdf_bytes)).pages:
+        ctm, saved, line, leading, starts = [1, 0, 0, 1, 0, 0], [], None, 0, []
+        for operands, operator in ContentStream(page.get_contents(), page.pdf).operations:
+            if operator == b"q":
+                saved.append(ctm)
+            elif operator == b"Q":
+                ctm = saved.pop()
+            elif operator == b"cm":
+                ctm = _multiply([float(value) for value in operands], ctm)
+            elif operator == b"BT":
+                line = [1, 0, 0, 1, 0, 0]
+            elif operator == b"Tm":
+                line = [float(value) for value in operands]
+            elif operator == b"Td":
+                line = _multiply([1, 0, 0, 1, float(operands[0]), float(operands[1])], line)
+            elif operator == b"TL":
+                leading = float(operands[0])
+            elif operator in (b"T*", b"'"):
+                line = _multiply([1, 0, 0, 1, 0, -leading], line)
+            if operator in (b"Tj", b"TJ", b"'"):
+                start = _multiply(line, ctm)
+                starts.append((round(start[4], 1), round(start[5], 1)))
+        # A line drawn in several pieces shows its start once
+        pages.append(sorted(set(starts)))
+    return pages
+
+
+def text_lines(pdf_bytes):
+    return [line.strip() for page in PdfReader(io.BytesIO(pdf_bytes)).pages for line in page.extract_text().splitlines()]
+
+
+@pytest.mark.parametrize("invoice_data", [
+    make_invoice(1),
+    make_invoice(8),
+    make_invoice(3, customer_gstin="27AAPFU0939F1ZV"),
+    make_invoice(3, customer_gstin="29AABCU9603R1ZM"),
+    make_invoice(3, customer_name="A & B Traders <Wholesale>"),
+])
+def test_fixed_page_matches_flowable_layout(invoice_data):
+    fonts = get_invoice_fonts()
+    assert _fixed_layout(_invoice_content(invoice_data, fonts), fonts) is not None
+    fixed, flowable = create_invoice_pdf(invoice_data).getvalue(), flowable_pdf(invoice_data)
+    assert text_starts(fixed) == text_starts(flowable)
+    assert text_lines(fixed) == text_lines(flowable)
+
+
+def test_long_invoice_falls_back_to_flowables():
+    invoice_data = make_invoice(30)
+    fonts = get_invoice_fonts()
+    assert _fixed_layout(_invoice_content(invoice_data, fonts), fonts) is None
+    assert len(PdfReader(create_invoice_pdf(invoice_data)).pages) == 2
+
+
+def test_batch_mixes_fixed_and_flowable_invoices():
+    batch = [make_invoice(2), make_invoice(30), make_invoice(5)]
+    expected = sum(len(PdfReader(create_invoice_pdf(data)).pages) for data in batch)
+    assert len(PdfReader(create_invoices_pdf(batch)).pages) == expected
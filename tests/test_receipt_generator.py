@@ -0,0 +1,89 @@
+"""
+Counter receipts: the ESC/POS receipt prints the same totals as the A4 invoice PDF,
+and the HTTP service serves both receipt formats.
+"""
+import io
+import re
+
+import pytest
+from pypdf import PdfReader
+
+from invoice_generator import Invoice, InvoiceItem
+from invoice_service import InvoiceService, ServiceError
+from job_queue import JobQueue, enqueue_invoice
+from pdf_generator import create_invoice_pdf
+from receipt_generator import create_receipt_escpos, create_receipt_pdf
+
+ESCPOS_COMMAND = re.compile(rb"\x1b@|\x1b[aE].|\x1d!.|\x1dV..", re.S)
+RECEIPT_TOTAL = re.compile(r"^(Subtotal|[SCI]GST [\d.]+%|TOTAL)\s+Rs\.([\d,]+\.\d{2})$")
+PDF_AMOUNT = re.compile(r"^₹([\d,]+\.\d{2})$")
+
+PHONES = [
+    ("Samsung", "Galaxy S23 Ultra", "256GB", "Phantom Black", 124999, 2),
+    ("Apple", "iPhone 15", "128GB", "Black", 79900, 1),
+    ("Xiaomi", "Redmi Note 13 Pro", "256GB", "Midnight Black", 25999, 3),
+]
+
+
+def make_invoice(customer_gstin=None):
+    invoice = Invoice("Ravi Kumar", "12 MG Road, Bangalore", "9876543210", customer_gstin=customer_gstin)
+    for brand, model, storage, color, price, quantity in PHONES:
+        invoice.add_item(InvoiceItem(brand, model, storage, color, price, "85171290", quantity))
+    return invoice.to_dict()
+
+
+def pdf_totals(invoice_data):
+    """Read the total row of the A4 invoice's item table: subtotal, tax totals, grand total."""
+    reader = PdfReader(io.BytesIO(create_invoice_pdf(invoice_data).getvalue()))
+    lines = reader.pages[0].extract_text().splitlines()
+    # "Total:", the quantity, then one amount per column
+    totals = []
+    for line in lines[lines.index("Total:") + 2:]:
+        amount = PDF_AMOUNT.match(line)
+        if not amount:
+            break
+        totals.append(amount.group(1))
+    return totals
+
+
+def receipt_totals(invoice_data):
+    """Read the subtotal, tax and grand total lines back out of an ESC/POS receipt."""
+    totals = []
+    for raw_line in create_receipt_escpos(invoice_data).split(b"\n"):
+        match = RECEIPT_TOTAL.match(ESCPOS_COMMAND.sub(b"", raw_line).decode("cp858").strip())
+        if match:
+            totals.append(match.group(2))
+    return totals
+
+
+@pytest.mark.parametrize("customer_gstin", [None, "27AAPFU0939F1ZV"], ids=["cgst-sgst", "igst"])
+def test_receipt_totals_match_invoice_pdf(customer_gstin):
+    invoice_data = make_invoice(customer_gstin)
+    totals = receipt_totals(invoice_data)
+
+    assert len(totals) == (4 if customer_gstin is None else 3)
+    assert pdf_totals(invoice_data) == totals
+
+
+def test_receipt_pdf_is_one_page():
+    reader = PdfReader(create_receipt_pdf(make_invoice()))
+    assert len(reader.pages) == 1
+    assert "TOTAL" in reader.pages[0].extract_text()
+
+
+def test_service_receipt_formats(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    service = InvoiceService(queue)
+    invoice_data = make_invoice()
+    enqueue_invoice(queue, invoice_data)
+
+    escpos, content_type = service.get_receipt(invoice_data["invoice_number"], "escpos")
+    assert content_type == "application/octet-stream"
+    assert escpos == create_receipt_escpos(invoice_data)
+    pdf, content_type = service.get_receipt(invoice_data["invoice_number"])
+    assert content_type == "application/pdf" and pdf.startswith(b"%PDF")
+
+    with pytest.raises(ServiceError) as error:
+        service.get_receipt(invoice_data["invoice_number"], "png")
+    assert error.value.status == 400
+    queue.close()
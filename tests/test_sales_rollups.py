@@ -0,0 +1,54 @@
+"""
+Sales rollups: processes recording into the same database add up rather than overwrite.
+"""
+import datetime
+import multiprocessing
+
+import pytest
+
+from invoice_generator import Invoice, InvoiceItem
+from sales_rollups import SalesRollups
+
+
+def make_invoice(lines, customer_gstin=None, date=datetime.datetime(2024, 4, 3, 11, 30)):
+    invoice = Invoice("Ravi Kumar", "12 MG Road, Bangalore", "9876543210", customer_gstin=customer_gstin)
+    invoice.date = date
+    for brand, model, price, quantity in lines:
+        invoice.add_item(InvoiceItem(brand, model, "128GB", "Black", price, "85171290", quantity))
+    return invoice
+
+
+def record_many(path, count):
+    rollups = SalesRollups(path)
+    for _ in range(count):
+        rollups.record_invoice(make_invoice([("Apple", "iPhone 15", 1000, 1)]))
+    rollups.close()
+
+
+def test_buckets_count_each_invoice_once():
+    rollups = SalesRollups()
+    rollups.record_invoice(make_invoice([("Apple", "iPhone 15", 1000, 2), ("Apple", "iPhone 14", 500, 1)]))
+    rollups.record_invoice(make_invoice([("Samsung", "Galaxy S23", 800, 1)], customer_gstin="27AAPFU0939F1ZV"))
+
+    summary = rollups.summary()
+    assert (summary["invoices"], summary["quantity"], summary["sales"]) == (2, 4, 3300)
+    assert summary["sgst_collected"] == pytest.approx(225)
+    assert summary["igst_collected"] == pytest.approx(144)
+    assert [(row["key"], row["invoices"], row["sales"]) for row in rollups.top("brand")] == [
+        ("Apple", 1, 2500), ("Samsung", 1, 800)]
+    assert rollups.top("model", limit=1)[0]["key"] == "Apple iPhone 15"
+    assert [row["key"] for row in rollups.daily()] == ["2024-04-03"]
+    assert rollups.hourly()[11]["invoices"] == 2
+
+
+def test_processes_share_the_database(tmp_path):
+    path = str(tmp_path / "rollups.db")
+    processes = [multiprocessing.Process(target=record_many, args=(path, 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    summary = SalesRollups(path).summary()
+    assert (summary["invoices"], summary["sales"]) == (100, 100000)
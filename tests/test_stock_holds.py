@@ -0,0 +1,91 @@
+"""
+Stock holds: carts cannot hold more units than are in stock, holds expire unless the
+cart is touched, and releasing a hold twice (or after it expired) changes nothing.
+"""
+import pytest
+
+from stock_holds import StockHolds
+
+SKU = "Samsung|Galaxy S23|256GB|Black"
+OTHER = "Apple|iPhone 15|128GB|Black"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def holds(clock):
+    return StockHolds(ttl=60, clock=clock)
+
+
+def test_hold_cannot_exceed_the_stock(holds):
+    assert holds.hold("cart-1", SKU, 2, stock=3)
+    assert not holds.hold("cart-2", SKU, 2, stock=3)
+    assert holds.hold("cart-2", SKU, 1, stock=3)
+
+    assert holds.available(SKU, 3) == 0
+    assert holds.available(SKU, 3, cart_id="cart-1") == 2
+    assert holds.held_for("cart-2", SKU) == 1
+
+
+def test_untouched_holds_expire(holds, clock):
+    holds.hold("cart-1", SKU, 2, stock=2)
+    clock.now = 59
+    assert holds.available(SKU, 2) == 0
+
+    clock.now = 60
+    assert holds.available(SKU, 2) == 2
+    assert holds.held_for("cart-1", SKU) == 0
+    assert holds.hold("cart-2", SKU, 2, stock=2)
+
+
+def test_adding_to_a_cart_renews_its_other_holds(holds, clock):
+    holds.hold("cart-1", SKU, 1, stock=1)
+    clock.now = 50
+    holds.hold("cart-1", OTHER, 1, stock=5)
+
+    clock.now = 100
+    assert holds.held_for("cart-1", SKU) == 1
+    assert holds.sweep() == 0
+    clock.now = 110
+    assert holds.sweep() == 2
+    assert holds.held == {}
+
+
+def test_releasing_twice_changes_nothing(holds):
+    holds.hold("cart-1", SKU, 2, stock=3)
+    holds.hold("cart-2", SKU, 1, stock=3)
+
+    holds.release("cart-1", SKU)
+    holds.release("cart-1", SKU)
+    holds.release("cart-1")
+    assert holds.available(SKU, 3) == 2
+    assert holds.held_for("cart-2", SKU) == 1
+
+
+def test_release_after_expiry_changes_nothing(holds, clock):
+    holds.hold("cart-1", SKU, 2, stock=3)
+    clock.now = 60
+    holds.hold("cart-2", SKU, 3, stock=3)
+
+    holds.release("cart-1")
+    assert holds.available(SKU, 3) == 0
+    assert holds.held_for("cart-2", SKU) == 3
+
+
+def test_partial_release(holds):
+    holds.hold("cart-1", SKU, 3, stock=3)
+    holds.release("cart-1", SKU, quantity=2)
+    assert holds.held_for("cart-1", SKU) == 1
+    holds.release("cart-1", SKU, quantity=5)
+    assert holds.held == {} and holds.by_cart == {}
@@ -0,0 +1,80 @@
+"""
+Stock journal: a line torn by a crash is dropped on load and never merged with the next movement,
+and only one process at a time can load a journal directory for writing.
+"""
+import multiprocessing
+
+import pytest
+
+from stock_journal import JournalLockedError, StockJournal
+
+SKU = "Samsung|Galaxy S23 Ultra|256GB|Phantom Black"
+
+
+def test_torn_last_line_is_cut_on_load(tmp_path):
+    journal = StockJournal(str(tmp_path), durable=False)
+    journal.load()
+    journal.append("receipt", "MAIN", SKU, 5)
+    journal.append("sale", "MAIN", SKU, -1, ref="INV-1")
+    journal.close()
+    segment = journal._segment_path(1)
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "ts": "2024-04-03T11:30:00", "kind": "sa')
+
+    journal = StockJournal(str(tmp_path), durable=False)
+    _, tail = journal.load()
+    assert [movement["seq"] for movement in tail] == [1, 2]
+    journal.append("sale", "MAIN", SKU, -2, ref="INV-2")
+    journal.close()
+
+    _, tail = StockJournal(str(tmp_path)).load()
+    assert [(movement["seq"], movement["change"]) for movement in tail] == [(1, 5), (2, -1), (3, -2)]
+
+
+def test_segment_holding_only_a_torn_line(tmp_path):
+    journal = StockJournal(str(tmp_path), durable=False)
+    journal.load()
+    journal.append("receipt", "MAIN", SKU, 5)
+    journal.compact({"MAIN": {SKU: 5}})
+    # The crash hit the first write of the new segment, which the next append reopens
+    with open(journal._segment_path(2), "w", encoding="utf-8") as f:
+        f.write('{"seq": 2, "ts"')
+    # The crash ended the process, which released its lock on the journal
+    journal.close()
+
+    journal = StockJournal(str(tmp_path), durable=False)
+    stock, tail = journal.load()
+    assert (stock, tail) == ({"MAIN": {SKU: 5}}, [])
+    journal.append("sale", "MAIN", SKU, -1, ref="INV-1")
+    journal.close()
+
+    _, tail = StockJournal(str(tmp_path)).load()
+    assert [movement["ref"] for movement in tail] == ["INV-1"]
+
+
+def _load_journal(directory):
+    try:
+        StockJournal(directory).load()
+    except JournalLockedError:
+        raise SystemExit(3)
+
+
+def test_second_writer_is_refused(tmp_path):
+    journal = StockJournal(str(tmp_path), durable=False)
+    journal.load()
+    journal.append("receipt", "MAIN", SKU, 5)
+
+    context = multiprocessing.get_context("spawn")
+    other = context.Process(target=_load_journal, args=(str(tmp_path),))
+    other.start()
+    other.join()
+    assert other.exitcode == 3
+    with pytest.raises(JournalLockedError):
+        StockJournal(str(tmp_path)).load()
+
+    # Auditing reads the segments without the lock
+    assert [movement["change"] for movement in StockJournal(str(tmp_path)).movements()] == [5]
+
+    journal.close()
+    _, tail = StockJournal(str(tmp_path)).load()
+    assert len(tail) == 1
@@ -0,0 +1,126 @@
+"""
+Committing a sale's stock: every line or none, and none when the sale is refused or cannot be queued
+afterwards, even when the process stops before its jobs are queued.
+"""
+import sqlite3
+
+import pytest
+
+import mobile_data
+from imei_registry import get_imei_registry
+from invoice_service import InvoiceService, ServiceError
+from job_queue import JobQueue
+from job_queue import get_job_queue, invoice_jobs
+from mobile_data import DEFAULT_BRANCH, confirm_sale, get_stock, open_stock_journal, sell_stock
+from stock_journal import StockJournal
+
+S23 = ("Samsung", "Galaxy S23 Ultra", "256GB", "Phantom Black")
+IPHONE = ("Apple", "iPhone 15", "128GB", "Blue")
+
+
+@pytest.fixture(autouse=True)
+def restore_stock():
+    stock = {branch: dict(units) for branch, units in mobile_data.BRANCH_STOCK.items()}
+    yield
+    for branch, units in stock.items():
+        for sku, count in units.items():
+            mobile_data._set_branch_stock(branch, sku, count)
+
+
+def test_sell_stock_takes_every_line():
+    s23, iphone = get_stock(*S23), get_stock(*IPHONE)
+    assert sell_stock([S23 + (1,), IPHONE + (2,)], ref="INV-1") is None
+    assert (get_stock(*S23), get_stock(*IPHONE)) == (s23 - 1, iphone - 2)
+
+
+def test_sell_stock_takes_nothing_when_a_line_is_short():
+    s23, iphone = get_stock(*S23), get_stock(*IPHONE)
+    assert sell_stock([S23 + (1,), IPHONE + (iphone + 1,)], ref="INV-2") == IPHONE + (iphone + 1,)
+    assert (get_stock(*S23), get_stock(*IPHONE)) == (s23, iphone)
+
+
+def test_sell_stock_adds_up_repeated_skus():
+    s23 = get_stock(*S23)
+    assert sell_stock([S23 + (s23,), S23 + (1,)], ref="INV-3") == S23 + (s23,)
+    assert get_stock(*S23) == s23
+
+
+def test_service_puts_stock_back_when_an_imei_is_already_sold(tmp_path, monkeypatch):
+    monkeypatch.setenv("IMEI_REGISTRY_DIR", str(tmp_path / "imei"))
+    get_imei_registry.cache_clear()
+    imei = "356938035643809"
+    get_imei_registry().register_invoice({
+        "invoice_number": "INV-EARLIER", "date": "01-04-2024",
+        "items": [dict(zip(("brand", "model", "storage", "color"), S23), imeis=[imei])],
+    }, DEFAULT_BRANCH)
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    service = InvoiceService(queue)
+    s23 = get_stock(*S23)
+
+    with pytest.raises(ServiceError) as error:
+        service.create_invoice({
+            "customer": {"name": "Ravi Kumar", "address": "12 MG Road, Bangalore", "phone": "9876543210"},
+            "items": [dict(zip(("brand", "model", "storage", "color"), S23), quantity=1, imeis=[imei])],
+        })
+    assert error.value.status == 409
+    assert get_stock(*S23) == s23
+    assert queue.counts() == {}
+    queue.close()
+    get_imei_registry().close()
+    get_imei_registry.cache_clear()
+
+
+def test_service_puts_stock_back_when_the_render_cannot_be_queued(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.close()
+    service = InvoiceService(queue)
+    s23 = get_stock(*S23)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        service.create_invoice({
+            "customer": {"name": "Ravi Kumar", "address": "12 MG Road, Bangalore", "phone": "9876543210"},
+            "items": [dict(zip(("brand", "model", "storage", "color"), S23), quantity=1)],
+        })
+    assert get_stock(*S23) == s23
+
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOB_QUEUE_PATH", str(tmp_path / "jobs.db"))
+    get_job_queue.cache_clear()
+    yield str(tmp_path / "journal")
+    mobile_data._journal.close()
+    mobile_data._journal = None
+    mobile_data._pending_sales.clear()
+    get_job_queue().close()
+    get_job_queue.cache_clear()
+
+
+def test_sale_left_pending_by_a_crash_is_returned(journal_dir):
+    s23 = get_stock(*S23)
+    open_stock_journal(journal_dir)
+    assert sell_stock([S23 + (2,)], ref="INV-4", pending=True) is None
+    # The process stops before the jobs are queued; its successor reopens the journal
+    open_stock_journal(journal_dir)
+    assert get_stock(*S23) == s23
+    mobile_data._journal.close()
+    movements = StockJournal(journal_dir).movements(kinds=("sale", "return"))
+    assert [(movement["kind"], movement["change"]) for movement in movements] == [("sale", -2), ("return", 2)]
+    # The compensating return is journalled, so it is not applied twice
+    open_stock_journal(journal_dir)
+    assert get_stock(*S23) == s23
+
+
+def test_sale_left_pending_after_its_jobs_are_queued_stands(journal_dir):
+    s23 = get_stock(*S23)
+    open_stock_journal(journal_dir)
+    assert sell_stock([S23 + (1,)], ref="INV-5", pending=True) is None
+    with get_job_queue().enqueue_with(invoice_jobs({"invoice_number": "INV-5"})):
+        pass
+    # The process stops before confirm_sale
+    open_stock_journal(journal_dir)
+    assert get_stock(*S23) == s23 - 1
+    assert sell_stock([S23 + (1,)], ref="INV-6", pending=True) is None
+    confirm_sale("INV-6")
+    open_stock_journal(journal_dir)
+    assert get_stock(*S23) == s23 - 2
@@ -0,0 +1,80 @@
+"""
+Customer identifier checks: the GSTIN mod-36 check digit, the IMEI Luhn digit,
+Indian mobile numbers, and the batch validators used for customer master files.
+"""
+import pytest
+
+from validation import (
+    check_gstin, check_gstins, check_imei, check_phone, check_phones, gstin_check_digit, imei_check_digit,
+    normalize_imei, normalize_phone, parse_imeis, validate_customers,
+)
+
+VALID_GSTIN = "27AAPFU0939F1ZV"
+VALID_IMEI = "490154203237518"
+
+
+def test_valid_gstin_passes():
+    assert gstin_check_digit(VALID_GSTIN) == "V"
+    assert check_gstin(VALID_GSTIN) is None
+    assert check_gstin(f"  {VALID_GSTIN.lower()} ") is None
+
+
+def test_changed_check_digit_is_caught():
+    assert "check digit" in check_gstin(VALID_GSTIN[:-1] + "W")
+
+
+@pytest.mark.parametrize("gstin, problem", [
+    ("", "15 characters"),
+    ("27AAPFU0939F1Z", "15 characters"),
+    ("27AAPFU0939F1XV", "format"),
+    ("00AAPFU0939F1ZV", "state code"),
+])
+def test_malformed_gstin_is_explained(gstin, problem):
+    assert problem in check_gstin(gstin)
+
+
+def test_valid_imei_passes():
+    assert imei_check_digit(VALID_IMEI) == "8"
+    assert check_imei(VALID_IMEI) is None
+    assert check_imei("49-015420-323751-8") is None
+
+
+def test_changed_imei_digit_is_caught():
+    assert "check digit" in check_imei(VALID_IMEI[:-1] + "9")
+    assert "15 digits" in check_imei(VALID_IMEI[:-1])
+    assert normalize_imei("49015420323751X") is None
+
+
+def test_imei_list_accepts_lines_and_commas():
+    assert parse_imeis(f"{VALID_IMEI}\n 356938035643809 ,\n\n35-209900-176148-1") == [
+        VALID_IMEI, "356938035643809", "35-209900-176148-1",
+    ]
+
+
+@pytest.mark.parametrize("phone", ["9876543210", "+91 98765 43210", "0 98765-43210", "919876543210"])
+def test_phone_prefixes_and_separators_are_accepted(phone):
+    assert normalize_phone(phone) == "9876543210"
+    assert check_phone(phone) is None
+
+
+@pytest.mark.parametrize("phone", ["5876543210", "987654321", "98765432100", None])
+def test_invalid_phone_is_refused(phone):
+    assert check_phone(phone) is not None
+
+
+def test_batch_results_follow_input_order():
+    bad_gstin = VALID_GSTIN[:-1] + "W"
+    gstin_results = check_gstins([VALID_GSTIN, bad_gstin, VALID_GSTIN])
+    assert gstin_results[0] is None and gstin_results[2] is None
+    assert "check digit" in gstin_results[1]
+    assert check_phones(["9876543210", "12345", "9876543210"]) == [None, check_phone("12345"), None]
+
+
+def test_customer_records_list_each_problem():
+    errors = validate_customers([
+        {"phone": "9876543210", "gstin": VALID_GSTIN},
+        {"phone": "9876543210"},
+        {"phone": "12345", "gstin": VALID_GSTIN[:-1] + "W"},
+    ])
+    assert errors[:2] == [[], []]
+    assert len(errors[2]) == 2
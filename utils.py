@@ -11,24 +11,6 @@ def generate_invoice_number():
     random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
     return f"INV-{date_prefix}-{random_suffix}"
 
-def calculate_gst(price, rate=18):
-    """
-    Calculate GST amount based on price and rate.
-    
-    Parameters:
-    - price: Base price before tax
-    - rate: GST rate in percentage (default is 18%)
-    
-    Returns a tuple containing (SGST, CGST, total)
-    """
-    # GST in India is split equally between SGST (State) and CGST (Central)
-    gst_amount = (price * rate) / 100
-    sgst = gst_amount / 2
-    cgst = gst_amount / 2
-    total = price + gst_amount
-    
-    return (sgst, cgst, total)
-
 def format_currency(amount):
     """Format amount as Indian Rupees."""
     return f"₹{amount:,.2f}"
@@ -38,20 +20,19 @@ def generate_hsn_code():
     return "85171290"  # Default HSN code for mobile phones
 
 def validate_phone_number(phone):
-    """Validate if the phone number is in correct Indian format."""
-    if phone and phone.isdigit() and len(phone) == 10:
-        return True
-    return False
+    """Validate if the phone number is an Indian mobile number (10 digits starting with 6-9)."""
+    # validation imports STATE_CODES from this module, so import it on first use
+    from validation import check_phone
+    return check_phone(phone) is None
 
 def validate_gstin(gstin):
     """
-    Validate if the GSTIN (Goods and Services Tax Identification Number) is in correct format.
+    Validate a GSTIN (Goods and Services Tax Identification Number).
     
-    Basic validation for 15-character GSTIN
+    Checks the format, the state code and the mod-36 check digit.
     """
-    if gstin and len(gstin) == 15 and gstin[:2].isdigit() and gstin[2:12].isalnum():
-        return True
-    return False
+    from validation import check_gstin
+    return check_gstin(gstin) is None
 
 def validate_email(email):
     """Basic email validation."""
@@ -65,48 +46,50 @@ def state_code_from_gstin(gstin):
         return gstin[:2]
     return "00"  # Default state code
 
+# GST state codes, as used in the first two digits of a GSTIN
+STATE_CODES = {
+    "01": "Jammu & Kashmir",
+    "02": "Himachal Pradesh",
+    "03": "Punjab",
+    "04": "Chandigarh",
+    "05": "Uttarakhand",
+    "06": "Haryana",
+    "07": "Delhi",
+    "08": "Rajasthan",
+    "09": "Uttar Pradesh",
+    "10": "Bihar",
+    "11": "Sikkim",
+    "12": "Arunachal Pradesh",
+    "13": "Nagaland",
+    "14": "Manipur",
+    "15": "Mizoram",
+    "16": "Tripura",
+    "17": "Meghalaya",
+    "18": "Assam",
+    "19": "West Bengal",
+    "20": "Jharkhand",
+    "21": "Odisha",
+    "22": "Chhattisgarh",
+    "23": "Madhya Pradesh",
+    "24": "Gujarat",
+    "25": "Daman & Diu",
+    "26": "Dadra & Nagar Haveli",
+    "27": "Maharashtra",
+    "28": "Andhra Pradesh (Before bifurcation)",
+    "29": "Karnataka",
+    "30": "Goa",
+    "31": "Lakshadweep",
+    "32": "Kerala",
+    "33": "Tamil Nadu",
+    "34": "Puducherry",
+    "35": "Andaman & Nicobar Islands",
+    "36": "Telangana",
+    "37": "Andhra Pradesh (After bifurcation)",
+    "38": "Ladakh",
+    "97": "Other Territory",
+    "99": "Centre Jurisdiction"
+}
+
 def get_state_name(state_code):
     """Get state name from state code."""
-    state_codes = {
-        "01": "Jammu & Kashmir",
-        "02": "Himachal Pradesh",
-        "03": "Punjab",
-        "04": "Chandigarh",
-        "05": "Uttarakhand",
-        "06": "Haryana",
-        "07": "Delhi",
-        "08": "Rajasthan",
-        "09": "Uttar Pradesh",
-        "10": "Bihar",
-        "11": "Sikkim",
-        "12": "Arunachal Pradesh",
-        "13": "Nagaland",
-        "14": "Manipur",
-        "15": "Mizoram",
-        "16": "Tripura",
-        "17": "Meghalaya",
-        "18": "Assam",
-        "19": "West Bengal",
-        "20": "Jharkhand",
-        "21": "Odisha",
-        "22": "Chhattisgarh",
-        "23": "Madhya Pradesh",
-        "24": "Gujarat",
-        "25": "Daman & Diu",
-        "26": "Dadra & Nagar Haveli",
-        "27": "Maharashtra",
-        "28": "Andhra Pradesh (Before bifurcation)",
-        "29": "Karnataka",
-        "30": "Goa",
-        "31": "Lakshadweep",
-        "32": "Kerala",
-        "33": "Tamil Nadu",
-        "34": "Puducherry",
-        "35": "Andaman & Nicobar Islands",
-        "36": "Telangana",
-        "37": "Andhra Pradesh (After bifurcation)",
-        "38": "Ladakh",
-        "97": "Other Territory",
-        "99": "Centre Jurisdiction"
-    }
-    return state_codes.get(state_code, "Unknown State")
+    return STATE_CODES.get(state_code, "Unknown State")
@@ -0,0 +1,193 @@
+"""
+Validation of customer identifiers for the mobile shop invoice generator.
+Checks GSTINs in full (layout, state code and mod-36 check digit), Indian mobile
+numbers (length and 6-9 prefix) and handset IMEIs (15 digits with a Luhn check digit).
+Results are cached for repeat customers, and the batch functions validate whole customer
+master files with each distinct value checked once.
+"""
+import re
+from functools import lru_cache
+
+from utils import STATE_CODES
+
+GSTIN_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# State code, PAN (5 letters, 4 digits, 1 letter), entity number, 'Z', check digit
+GSTIN_PATTERN = re.compile(r"[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]")
+
+# Indian mobile numbers are 10 digits starting with 6, 7, 8 or 9, optionally
+# written with a +91, 91 or 0 prefix and spaces or dashes
+PHONE_SEPARATORS = str.maketrans("", "", " -()")
+PHONE_PATTERN = re.compile(r"(?:\+?91|0)?([6-9][0-9]{9})")
+
+# Per-character contribution to the check digit sum at even and odd positions.
+# Each character's value is multiplied by 1 or 2 alternately, and the product
+# contributes its base-36 digit sum.
+_CHECKSUM_WEIGHTS = [
+    {char: (value * factor) // 36 + (value * factor) % 36 for value, char in enumerate(GSTIN_CHARSET)}
+    for factor in (1, 2)
+]
+
+# IMEIs are printed in groups ("35-209900-176148-1"); entered lists are one per line
+IMEI_SEPARATORS = str.maketrans("", "", " -/")
+IMEI_LIST_SEPARATORS = re.compile(r"[\n,;]+")
+
+CACHE_SIZE = 65536
+
+
+def gstin_check_digit(gstin):
+    """
+    Compute the check digit for the first 14 characters of a GSTIN.
+
+    Parameters:
+    - gstin: GSTIN (at least 14 characters, upper case)
+
+    Returns:
+    - The expected 15th character
+    """
+    even, odd = _CHECKSUM_WEIGHTS
+    total = sum(even[char] for char in gstin[0:14:2]) + sum(odd[char] for char in gstin[1:14:2])
+    return GSTIN_CHARSET[-total % 36]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def check_gstin(gstin):
+    """
+    Validate a GSTIN.
+
+    Parameters:
+    - gstin: GSTIN as entered (surrounding spaces and lower case are accepted)
+
+    Returns:
+    - None when valid, otherwise a message describing the problem
+    """
+    gstin = (gstin or "").strip().upper()
+    if len(gstin) != 15:
+        return "GSTIN must be 15 characters"
+    if not GSTIN_PATTERN.fullmatch(gstin):
+        return "GSTIN format is invalid"
+    if gstin[:2] not in STATE_CODES:
+        return f"GSTIN state code {gstin[:2]} is not a valid state code"
+    if gstin_check_digit(gstin) != gstin[14]:
+        return "GSTIN check digit does not match; please re-check the number"
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_phone(phone):
+    """
+    Reduce an Indian mobile number to its 10 digits.
+
+    Returns:
+    - The 10-digit number, or None when it is not a valid Indian mobile number
+    """
+    match = PHONE_PATTERN.fullmatch((phone or "").translate(PHONE_SEPARATORS))
+    return match.group(1) if match else None
+
+
+def check_phone(phone):
+    """
+    Validate an Indian mobile number.
+
+    Returns:
+    - None when valid, otherwise a message describing the problem
+    """
+    if normalize_phone(phone) is None:
+        return "Valid 10-digit mobile number starting with 6-9 is required"
+    return None
+
+
+def imei_check_digit(imei):
+    """
+    Compute the Luhn check digit for the first 14 digits of an IMEI.
+
+    Returns:
+    - The expected 15th digit as a string
+    """
+    total = 0
+    for i, digit in enumerate(imei[:14]):
+        value = int(digit) * (2 if i % 2 else 1)
+        total += value // 10 + value % 10
+    return str(-total % 10)
+
+
+def normalize_imei(imei):
+    """
+    Strip the separators from an IMEI as entered.
+
+    Returns:
+    - The 15 digits, or None when it is not 15 digits long
+    """
+    imei = (imei or "").translate(IMEI_SEPARATORS)
+    return imei if len(imei) == 15 and imei.isdigit() else None
+
+
+def check_imei(imei):
+    """
+    Validate a handset IMEI.
+
+    Returns:
+    - None when valid, otherwise a message describing the problem
+    """
+    digits = normalize_imei(imei)
+    if digits is None:
+        return f"IMEI {imei} must be 15 digits"
+    if imei_check_digit(digits) != digits[14]:
+        return f"IMEI {imei} check digit does not match; please re-check the number"
+    return None
+
+
+def parse_imeis(text):
+    """Split a list of IMEIs entered one per line (or comma separated) into entries."""
+    return [entry.strip() for entry in IMEI_LIST_SEPARATORS.split(text or "") if entry.strip()]
+
+
+def check_gstins(gstins):
+    """
+    Validate many GSTINs at once, checking each distinct value only once.
+
+    Parameters:
+    - gstins: Iterable of GSTIN strings
+
+    Returns:
+    - List with None or an error message for each input, in input order
+    """
+    return _check_batch(check_gstin, gstins)
+
+
+def check_phones(phones):
+    """
+    Validate many mobile numbers at once, checking each distinct value only once.
+
+    Parameters:
+    - phones: Iterable of phone number strings
+
+    Returns:
+    - List with None or an error message for each input, in input order
+    """
+    return _check_batch(check_phone, phones)
+
+
+def validate_customers(customers):
+    """
+    Validate the phone number and GSTIN of customer records, e.g. a master file import.
+
+    Parameters:
+    - customers: List of dictionaries with 'phone' and optional 'gstin' keys
+
+    Returns:
+    - List of error message lists, one per customer (empty when valid)
+    """
+    phone_errors = check_phones([customer.get("phone") for customer in customers])
+    gstins = [customer.get("gstin") for customer in customers]
+    gstin_errors = check_gstins(gstins)
+    return [
+        [error for error in (phone_error, gstin_error if gstin else None) if error]
+        for phone_error, gstin, gstin_error in zip(phone_errors, gstins, gstin_errors)
+    ]
+
+
+def _check_batch(check, values):
+    values = list(values)
+    results = {value: check(value) for value in dict.fromkeys(values)}
+    return [results[value] for value in values]